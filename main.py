@@ -1,15 +1,189 @@
+"""
+Launcher of the Streamlit app
+"""
+
+import argparse
 import os
+import sys
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+APP_FILEPATH = Path(__file__).parent.resolve() / "web" / "🏠_Homepage.py"
+
+
+def get_args():
+    """
+    Get arguments from command line
+
+    :return: Arguments from command line
+    """
+    parser = argparse.ArgumentParser(description="Run the Streamlit app")
+
+    parser.add_argument(
+        "--host", type=str, default="localhost", help="Address to listen on"
+    )
+    parser.add_argument("--port", type=int, default=8501, help="Port to listen on")
+    parser.add_argument(
+        "--max-upload-size",
+        type=int,
+        default=2048,
+        help="Max size of each uploaded file in MB",
+    )
+    parser.add_argument(
+        "--websocket-compression",
+        action="store_true",
+        help="Compress messages to browsers. "
+        "Saves bandwidth on slow networks but costs CPU on large messages",
+    )
+    parser.add_argument(
+        "--dev",
+        action="store_true",
+        help="Watch source files and rerun pages when they change",
+    )
+    parser.add_argument(
+        "--result-dir",
+        type=str,
+        default=None,
+        help="Directory of results shared by all processes of the app. "
+        "Processes behind a reverse proxy should use the same one",
+    )
+    parser.add_argument(
+        "--result-size",
+        type=int,
+        default=None,
+        help="Size limit of the result directory in MB",
+    )
+    parser.add_argument(
+        "--scan-root",
+        type=str,
+        action="append",
+        default=None,
+        help="Folder of the server that the Duplicate Finder may scan, "
+        "repeat it for several folders. Without it, scanning is disabled, "
+        "since any visitor could read files of the server",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check if the app running at host and port is ready, then exit. "
+        "Exit code is 0 if ready, 1 otherwise",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=0,
+        help="Time in seconds to wait for the app to be ready, with --check",
+    )
+
+    return parser.parse_args()
+
+
+def get_flag_options(args) -> dict:
+    """
+    Get Streamlit config options from arguments
+
+    :param args: Arguments from command line
+    :return: Config options, named like the flags of "streamlit run"
+    """
+    return {
+        "server_address": args.host,
+        "server_port": args.port,
+        "server_headless": True,
+        "server_maxUploadSize": args.max_upload_size,
+        "server_enableWebsocketCompression": args.websocket_compression,
+        # Watching files costs CPU and reloads modules, only useful in development
+        "server_fileWatcherType": "auto" if args.dev else "none",
+        "server_runOnSave": args.dev,
+        "browser_gatherUsageStats": False,
+        # Resources are created before the server starts, which is intended here
+        "global_showWarningOnDirectExecution": False,
+    }
+
+
+def preload():
+    """
+    Import heavy modules and create shared resources before accepting connections,
+    so the first visit of each page is not slow
+    """
+    start = time.time()
+
+    # pylint: disable=import-outside-toplevel,unused-import
+    from PIL import Image
+
+    import personal_tools.file_tools.cleaning.check_duplicated  # noqa: F401
+    import personal_tools.file_tools.conversion.convert_base64  # noqa: F401
+    import personal_tools.file_tools.conversion.convert_image  # noqa: F401
+    from web.utils.jobs import get_job_queue
+    from web.utils.render import get_mime_detector
+    from web.utils.store import get_result_store
+
+    # Register all image plugins, Pillow loads them lazily on first open
+    Image.init()
+
+    get_mime_detector()
+    get_job_queue()
+    get_result_store()
+
+    print(f"Preloaded modules in {time.time() - start:.2f}s")
+
+
+def is_ready(host: str, port: int, timeout: float = 0) -> bool:
+    """
+    Check if the app is ready to serve pages, using the health endpoint of Streamlit
+
+    :param host: Address of app
+    :param port: Port of app
+    :param timeout: Time in seconds to wait for the app to be ready
+    :return: True if the app is ready
+    """
+    url = f"http://{host}:{port}/_stcore/health"
+    deadline = time.time() + timeout
+
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+
+        if time.time() >= deadline:
+            return False
+
+        time.sleep(0.5)
+
 
 def main():
     """
     Run Streamlit app
     """
-    current_dir = Path(__file__).parent.resolve()
-    app_filepath = current_dir / "src" / "ui" / "🏠_Homepage.py"
+    args = get_args()
+
+    if args.check:
+        sys.exit(0 if is_ready(args.host, args.port, args.timeout) else 1)
+
+    # pylint: disable=import-outside-toplevel
+    from streamlit.web import bootstrap
+
+    from web.utils.files import SCAN_ROOTS_ENV
+    from web.utils.store import RESULT_DIR_ENV, RESULT_SIZE_ENV
+
+    if args.result_dir:
+        os.environ[RESULT_DIR_ENV] = args.result_dir
+    if args.result_size:
+        os.environ[RESULT_SIZE_ENV] = str(args.result_size)
+    if args.scan_root:
+        os.environ[SCAN_ROOTS_ENV] = os.pathsep.join(args.scan_root)
+
+    flag_options = get_flag_options(args)
+    bootstrap.load_config_options(flag_options)
+
+    # The server only listens once modules are loaded, so it is ready when healthy
+    preload()
 
-    os.system(f'streamlit run "{app_filepath}"')
+    bootstrap.run(str(APP_FILEPATH), False, [], flag_options)
 
 
 if __name__ == "__main__":
@@ -6,16 +6,23 @@ import argparse
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, List, Set, Tuple, Union
 
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 from personal_tools.data_analysis.label_studio.managers.base import (
     BaseManager,
     BaseManagerConfig,
 )
 from personal_tools.data_analysis.label_studio.utilities.storage import standardize_path
+from personal_tools.utilities.profiler import (
+    add_profile_args,
+    profile_from_args,
+)
+from personal_tools.utilities.timer import Stopwatch
 
 # Define default location to store temporary files
 TEMP_DIR = "/tmp/kokoroou-cached"
@@ -48,20 +55,79 @@ def get_args():
         action="store_true",
         help="Force to get all data sources from Label Studio again.",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=8,
+        help="Number of projects to get tasks of at the same time.",
+    )
+
+    add_profile_args(parser)
 
     return parser.parse_args()
 
 
+def get_task_sources(tasks: List[dict]) -> Set[str]:
+    """
+    Get data sources used by tasks.
+
+    :param tasks: Tasks of a project.
+    :return: Set of data sources.
+    """
+    ls_sources: set = set([])
+
+    for task in tasks:
+        data: dict = task["data"]
+
+        for key in data.keys():
+            ls_sources.add(standardize_path(data[key]))
+
+    return ls_sources
+
+
 class StorageManager(BaseManager):
     """
     Manager to handle storages of Label Studio data
     """
 
+    def set_pool_size(self, pool_size: int):
+        """
+        Keep enough connections to Label Studio alive for concurrent requests.
+
+        :param pool_size: Number of connections to keep alive.
+        """
+        session = self.client.session
+        adapter = session.get_adapter(self.client.url)
+
+        pooled_adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=adapter.max_retries,
+        )
+        session.mount("http://", pooled_adapter)
+        session.mount("https://", pooled_adapter)
+
+    @staticmethod
+    def get_project_tasks(project) -> Tuple[List[dict], float]:
+        """
+        Get all tasks of a project.
+
+        :param project: Project of Label Studio.
+        :return: Tasks of the project and time taken in seconds.
+        """
+        start = time.time()
+        with Stopwatch(desc="label_studio.get_tasks", verbose=False):
+            tasks = project.get_tasks()
+
+        return tasks, time.time() - start
+
     def get_all_sources(
         self,
         return_dict=False,
         force_update: bool = False,
         cache_file: str = f"{TEMP_DIR}/ls_storage.json",
+        workers: int = 8,
     ) -> Union[List[str], Dict[str, List[str]]]:
         """
         Get all data sources in Label Studio.
@@ -70,7 +136,10 @@ class StorageManager(BaseManager):
             Key is the data source and value is the list of projects that use the data source.
         :param force_update: Whether to force to get all data sources from Label Studio again.
         :param cache_file: Path to the cache file to store the data sources.
+        :param workers: Number of projects to get tasks of at the same time.
         :return: List of all data sources or a dictionary of data sources.
+        :raises RuntimeError: If tasks of some projects cannot be fetched,
+            since their data sources would be missing.
         """
         ls_sources_dict: dict = {}
 
@@ -86,32 +155,51 @@ class StorageManager(BaseManager):
             projects = self.client.list_projects()
             print(f"Done in {time.time() - start:.2f} seconds.")
 
-            for proj_idx, project in enumerate(projects):
-                # Add upload folder of the project to the list of data sources
+            # Add upload folder of each project to the list of data sources
+            for project in projects:
                 ls_sources_dict[f"media/upload/{project.id}"] = {project.id}
 
-                # Get all tasks of the project
-                start = time.time()
-                print(
-                    f"[{proj_idx + 1}/{len(projects)}] "
-                    f"Getting tasks of project {project.id}...",
-                    end="",
-                    flush=True,
-                )
-                tasks = project.get_tasks()
-                print(f"Done in {time.time() - start:.2f} seconds.")
-
-                # Extract data sources from tasks
-                for task in tasks:
-                    data: dict = task["data"]
-
-                    for key in data.keys():
-                        source = standardize_path(data[key])
+            # Get tasks of several projects at the same time
+            start = time.time()
+            failed_projects = {}
+            self.set_pool_size(workers)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self.get_project_tasks, project): project
+                    for project in projects
+                }
+
+                for proj_idx, future in enumerate(as_completed(futures)):
+                    project = futures[future]
+                    progress = f"[{proj_idx + 1}/{len(projects)}] Project {project.id}"
+
+                    try:
+                        tasks, elapsed = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        failed_projects[project.id] = e
+                        print(f"{progress}: Failed to get tasks. {e}")
+                        continue
+
+                    print(
+                        f"{progress}: Got {len(tasks)} tasks in {elapsed:.2f} seconds."
+                    )
+
+                    # Extract data sources from tasks
+                    for source in get_task_sources(tasks):
                         if source in ls_sources_dict:
                             ls_sources_dict[source].add(project.id)
                         else:
                             ls_sources_dict[source] = {project.id}
 
+            print(f"Got tasks of all projects in {time.time() - start:.2f} seconds.")
+
+            if failed_projects:
+                # Incomplete data sources would show used folders as unused or missing
+                raise RuntimeError(
+                    f"Failed to get tasks of projects {sorted(failed_projects)}."
+                ) from next(iter(failed_projects.values()))
+
             # Order the IDs of the projects that use the same data source
             for source in ls_sources_dict:
                 ls_sources_dict[source] = sorted(list(ls_sources_dict[source]))
@@ -128,6 +216,7 @@ class StorageManager(BaseManager):
 
         return list(ls_sources_dict.keys())
 
+    @Stopwatch(desc="label_studio.get_all_folders", verbose=False)
     def get_all_folders(self) -> List[str]:
         """
         Get all data folders in Label Studio Server.
@@ -173,16 +262,21 @@ class StorageManager(BaseManager):
 
         return ls_sources
 
-    def get_missing_sources(self, force_update: bool = False) -> List[str]:
+    def get_missing_sources(
+        self, force_update: bool = False, workers: int = 8
+    ) -> List[str]:
         """
         Get data sources that are missing in Label Studio server.
 
         :param force_update: Whether to force to get all data sources from Label Studio again.
+        :param workers: Number of projects to get tasks of at the same time.
         :return: List of missing data sources.
         """
         # Get all data folders and sources
         ls_sources = self.get_all_folders()
-        used_sources = self.get_all_sources(return_dict=True, force_update=force_update)
+        used_sources = self.get_all_sources(
+            return_dict=True, force_update=force_update, workers=workers
+        )
 
         # Filter out sources that are not in the server
         ls_sources = [
@@ -197,16 +291,19 @@ class StorageManager(BaseManager):
 
         return ls_sources
 
-    def get_unused_sources(self, force_update: bool = False) -> List[str]:
+    def get_unused_sources(
+        self, force_update: bool = False, workers: int = 8
+    ) -> List[str]:
         """
         Get data sources that are not used in any project.
 
         :param force_update: Whether to force to get all data sources from Label Studio again.
+        :param workers: Number of projects to get tasks of at the same time.
         :return: List of unused data sources.
         """
         # Get all data folders and sources
         ls_sources = self.get_all_folders()
-        used_sources = self.get_all_sources(force_update=force_update)
+        used_sources = self.get_all_sources(force_update=force_update, workers=workers)
 
         # Filter out folders that are used for projects
         ls_sources = [source for source in ls_sources if source not in used_sources]
@@ -220,8 +317,6 @@ class StorageManager(BaseManager):
         :param project_id: ID of the project to get data sources.
         :return: List of data sources of the project.
         """
-        ls_sources: set = set([])
-
         # Get the project
         project = self.client.get_project(project_id)
 
@@ -232,50 +327,51 @@ class StorageManager(BaseManager):
         print(f"Done in {time.time() - start:.2f} seconds.")
 
         # Extract data sources from tasks
-        for task in tasks:
-            data: dict = task["data"]
-            data_keys = data.keys()
-
-            for key in data_keys:
-                ls_sources.add(standardize_path(data[key]))
-
-        return sorted(list(ls_sources))
+        return sorted(list(get_task_sources(tasks)))
 
 
 if __name__ == "__main__":
     args = get_args()
-    load_dotenv(dotenv_path=args.env)
-    assert Path(args.env).exists(), f"File {args.env} does not exist."
-
-    LS_URL = os.getenv("LS_URL")
-    LS_API_KEY = os.getenv("LS_API_KEY")
-    LS_IP = os.getenv("LS_IP")
-    LS_USER = os.getenv("LS_USER")
-    LS_PASSWORD = os.getenv("LS_PASSWORD")
-
-    assert LS_URL is not None, f"LS_URL is not set in {args.env} file."
-    assert LS_API_KEY is not None, f"LS_API_KEY is not set in {args.env} file"
-
-    # Initialize a Label Studio Manager
-    manager = StorageManager(
-        BaseManagerConfig(
-            url=LS_URL, key=LS_API_KEY, ip=LS_IP, user=LS_USER, password=LS_PASSWORD
+
+    with profile_from_args(args, "label_studio_storage"):
+        load_dotenv(dotenv_path=args.env)
+        assert Path(args.env).exists(), f"File {args.env} does not exist."
+
+        LS_URL = os.getenv("LS_URL")
+        LS_API_KEY = os.getenv("LS_API_KEY")
+        LS_IP = os.getenv("LS_IP")
+        LS_USER = os.getenv("LS_USER")
+        LS_PASSWORD = os.getenv("LS_PASSWORD")
+
+        assert LS_URL is not None, f"LS_URL is not set in {args.env} file."
+        assert LS_API_KEY is not None, f"LS_API_KEY is not set in {args.env} file"
+
+        # Initialize a Label Studio Manager
+        manager = StorageManager(
+            BaseManagerConfig(
+                url=LS_URL, key=LS_API_KEY, ip=LS_IP, user=LS_USER, password=LS_PASSWORD
+            )
         )
-    )
 
-    # Get data sources
-    if args.project:
-        sources = manager.get_sources_by_project(project_id=args.project)
-    else:
-        if args.type == "all":
-            sources = manager.get_all_sources(force_update=args.force)
-        elif args.type == "missing":
-            sources = manager.get_missing_sources(force_update=args.force)
-        elif args.type == "unused":
-            sources = manager.get_unused_sources(force_update=args.force)
+        # Get data sources
+        if args.project:
+            sources = manager.get_sources_by_project(project_id=args.project)
         else:
-            raise ValueError(f"Invalid type: {args.type}")
+            if args.type == "all":
+                sources = manager.get_all_sources(
+                    force_update=args.force, workers=args.workers
+                )
+            elif args.type == "missing":
+                sources = manager.get_missing_sources(
+                    force_update=args.force, workers=args.workers
+                )
+            elif args.type == "unused":
+                sources = manager.get_unused_sources(
+                    force_update=args.force, workers=args.workers
+                )
+            else:
+                raise ValueError(f"Invalid type: {args.type}")
 
-    print("\nData sources:")
-    for src in sources:
-        print(src)
+        print("\nData sources:")
+        for src in sources:
+            print(src)
@@ -1,12 +1,18 @@
 import argparse
 import hashlib
 import shutil
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import Callable, Iterator, List, Tuple, Union
 
-import cv2
-import imutils
-import pandas as pd
+from personal_tools.utilities.profiler import (
+    add_profile_args,
+    profile_from_args,
+)
+from personal_tools.utilities.timer import Stopwatch
+
+# Size of each read when calculating checksums
+CHUNK_SIZE = 1024 * 1024
 
 
 def get_args():
@@ -41,6 +47,8 @@ def get_args():
         "--move", action="store_true", help="Move duplicated files to new folder"
     )
 
+    add_profile_args(parser)
+
     return parser.parse_args()
 
 
@@ -66,7 +74,14 @@ class DuplicatingChecker:
         self.is_show = is_show
         self.is_move = is_move
 
+        # Progress of the current scan of iter_duplicates
+        self.total_files = 0
+        self.total_bytes = 0
+        self.scanned_files = 0
+        self.scanned_bytes = 0
+
     @staticmethod
+    @Stopwatch(desc="check_duplicated.checksum", verbose=False)
     def calculate_checksum(filepath: Union[str, Path]) -> str:
         """
         Calculate MD5 checksum of a file
@@ -74,10 +89,13 @@ class DuplicatingChecker:
         :param filepath: Path to file
         :return: MD5 checksum of file
         """
+        checksum = hashlib.md5()
+
         with open(filepath, "rb") as f:
-            checksum = hashlib.md5(f.read()).hexdigest()
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                checksum.update(chunk)
 
-        return checksum
+        return checksum.hexdigest()
 
     @staticmethod
     def extract_name(filepath: Union[str, Path]) -> str:
@@ -156,6 +174,72 @@ class DuplicatingChecker:
 
         return duplicate_indexes, original_indexes
 
+    def iter_duplicates(
+        self, folders: List[str], on_progress: Callable[[], None] = None
+    ) -> Iterator[Tuple[str, str, List[Path]]]:
+        """
+        Find duplicated files in folders, yielding each group of duplicated files
+        as soon as it is found. Progress is kept in the scanned_* attributes.
+
+        Only files sharing their size with another file are hashed, since a file
+        with a unique size cannot have the same checksum as any other file.
+
+        :param folders: Folders to check. Priority increases from left to right
+        :param on_progress: Function called after each file is hashed
+        :return: Iterator of (method, key, group). The group lists the files with
+            the same key found so far, the one in the folder of highest priority
+            first. It is yielded again each time a file is added to it.
+        """
+        assert all(
+            Path(folder).is_dir() for folder in folders
+        ), "All paths must be folders"
+
+        # Files of folders with higher priority come first
+        filepaths = [
+            filepath
+            for folder in reversed(folders)
+            for filepath in sorted(Path(folder).glob("*"))
+            if filepath.is_file()
+        ]
+
+        if "name" in self.methods:
+            name_groups = defaultdict(list)
+
+            for filepath in filepaths:
+                name = self.extract_name(filepath)
+                name_groups[name].append(filepath)
+
+                if len(name_groups[name]) > 1:
+                    yield "name", name, name_groups[name]
+
+        if "checksum" in self.methods:
+            sizes = {filepath: filepath.stat().st_size for filepath in filepaths}
+            size_counts = defaultdict(int)
+            for size in sizes.values():
+                size_counts[size] += 1
+
+            candidates = [
+                filepath for filepath in filepaths if size_counts[sizes[filepath]] > 1
+            ]
+            self.total_files = len(candidates)
+            self.total_bytes = sum(sizes[filepath] for filepath in candidates)
+            self.scanned_files = 0
+            self.scanned_bytes = 0
+
+            checksum_groups = defaultdict(list)
+
+            for filepath in candidates:
+                checksum = self.calculate_checksum(filepath)
+                checksum_groups[checksum].append(filepath)
+
+                self.scanned_files += 1
+                self.scanned_bytes += sizes[filepath]
+                if on_progress:
+                    on_progress()
+
+                if len(checksum_groups[checksum]) > 1:
+                    yield "checksum", checksum, checksum_groups[checksum]
+
     def check(self, folders: List[str], aliases: List[str] = None):
         """
         Check duplicated files in folders
@@ -210,6 +294,14 @@ class DuplicatingChecker:
                     self.extract_name(filepath) for filepath in folder_filepaths[alias]
                 ]
 
+        # pylint: disable=import-outside-toplevel
+        # Only needed by this report, so iter_duplicates() works without them
+        import pandas as pd
+
+        if self.is_show:
+            import cv2
+            import imutils
+
         # Check duplicated files
         summary = []
         for i, alias_1 in enumerate(aliases):
@@ -287,7 +379,9 @@ class DuplicatingChecker:
 
 if __name__ == "__main__":
     args = get_args()
-    checker = DuplicatingChecker(
-        methods=args.methods, is_show=args.show, is_move=args.move
-    )
-    checker.check(args.folders, args.aliases)
+
+    with profile_from_args(args, "check_duplicated"):
+        checker = DuplicatingChecker(
+            methods=args.methods, is_show=args.show, is_move=args.move
+        )
+        checker.check(args.folders, args.aliases)
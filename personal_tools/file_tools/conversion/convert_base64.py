@@ -3,6 +3,12 @@ Set of tools for base64 encoding and decoding.
 """
 
 import base64
+import binascii
+from typing import BinaryIO
+
+# Size of each read when converting files, a multiple of 3 and 4 so that
+# encoded chunks join without padding
+CHUNK_SIZE = 3 * 4 * 256 * 1024
 
 
 class Base64Converter:
@@ -32,3 +38,41 @@ class Base64Converter:
             data = self.last_base64
 
         return base64.b64decode(data)
+
+    def encode_file(self, source: BinaryIO, target: BinaryIO):
+        """
+        Encode a file using base64 encoding, chunk by chunk.
+
+        :param source: File object to read data from
+        :param target: File object to write base64 data to
+        """
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            target.write(base64.b64encode(chunk))
+
+    def decode_file(self, source: BinaryIO, target: BinaryIO):
+        """
+        Decode a file using base64 encoding, chunk by chunk.
+        Whitespace like line breaks is ignored.
+
+        :param source: File object to read base64 data from
+        :param target: File object to write data to
+        """
+        remainder = b""
+
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            # Only decode complete groups of 4 characters
+            data = remainder + b"".join(chunk.split())
+            end = len(data) - len(data) % 4
+            target.write(base64.b64decode(data[:end], validate=True))
+            remainder = data[end:]
+
+        if remainder:
+            raise binascii.Error("Incorrect padding")
@@ -2,9 +2,207 @@
 Set of tools for converting images to different formats.
 """
 
+import argparse
+import os
+import tempfile
+import warnings
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
 from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+from zipfile import ZIP_DEFLATED, ZipFile
 
-from PIL import Image
+from PIL import (
+    BmpImagePlugin,
+    GifImagePlugin,
+    Image,
+    ImageSequence,
+    PpmImagePlugin,
+    TgaImagePlugin,
+    TiffImagePlugin,
+)
+
+from personal_tools.file_tools.conversion.image_streaming import (
+    RegionReader,
+    reduce_by_region,
+    write_png_by_region,
+    write_tiff_by_region,
+)
+from personal_tools.utilities.profiler import (
+    add_profile_args,
+    profile_from_args,
+)
+from personal_tools.utilities.timer import (
+    Stopwatch,
+    call_recorded,
+    get_failed_spans,
+    recorder,
+)
+
+# Name of the journal file stored in the output folder of a folder conversion
+JOURNAL_FILENAME = ".convert_image.journal"
+
+# Plugins of formats storing pixels uncompressed, tried to open images over
+# Pillow's decompression bomb limit, which can still be converted region by region
+RAW_IMAGE_PLUGINS = [
+    TiffImagePlugin.TiffImageFile,
+    BmpImagePlugin.BmpImageFile,
+    PpmImagePlugin.PpmImageFile,
+    TgaImagePlugin.TgaImageFile,
+]
+
+
+def get_args():
+    """
+    Get arguments from command line
+
+    :return: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert all images in a folder tree to another format"
+    )
+    parser.add_argument(
+        "--input", type=str, required=True, help="Folder of images to convert"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Folder to store converted images, mirroring the input folder tree",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        required=True,
+        choices=sorted(
+            ImageConverter.supported_formats + list(ImageConverter.extensions_map)
+        ),
+        help="Format to convert to",
+    )
+    parser.add_argument(
+        "--max-width", type=int, default=0, help="Maximum width of converted images"
+    )
+    parser.add_argument(
+        "--max-height", type=int, default=0, help="Maximum height of converted images"
+    )
+    parser.add_argument(
+        "--quality", type=int, help="Encoder quality (1-100) for JPEG and WEBP"
+    )
+    parser.add_argument(
+        "--optimize", action="store_true", help="Spend more time to compress better"
+    )
+    parser.add_argument(
+        "--progressive", action="store_true", help="Save JPEG images as progressive"
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=0,
+        metavar="KB",
+        help="Lower the quality of JPEG and WEBP images until they fit under this size. "
+        "Animated WEBP images are fitted as a whole",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=512,
+        metavar="MB",
+        help="Memory budget of each process. Larger images are converted by region "
+        "if stored uncompressed, and rejected otherwise",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes converting images in parallel",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all images again, ignoring the journal and existing outputs",
+    )
+
+    add_profile_args(parser)
+
+    return parser.parse_args()
+
+
+@dataclass
+class OutputOptions:
+    """
+    Options for size and quality of converted images
+
+    :param max_width: Maximum width. Larger images are shrunk, keeping aspect ratio.
+        0 means no limit.
+    :param max_height: Maximum height. Larger images are shrunk, keeping aspect ratio.
+        0 means no limit.
+    :param quality: Encoder quality (1-100) for JPEG and WEBP. None means Pillow default.
+    :param optimize: Spend more time to compress better (JPEG, PNG, GIF and WEBP).
+    :param progressive: Save JPEG images as progressive.
+    :param max_size_kb: Maximum size of JPEG and WEBP images in KB.
+        The highest quality that fits is searched. 0 means no limit.
+    """
+
+    max_width: int = 0
+    max_height: int = 0
+    quality: int = None
+    optimize: bool = False
+    progressive: bool = False
+    max_size_kb: int = 0
+
+
+def open_image(fp) -> Image.Image:
+    """
+    Open an image, even over Pillow's decompression bomb limit if it can be
+    converted region by region. Pillow's limit itself is left unchanged:
+    ImageConverter checks it again for images it has to decode as a whole.
+
+    :param fp: Path or seekable file object of image
+    :return: Opened image
+    :raises Image.DecompressionBombError: If the image is over the limit
+        and cannot be read by region
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            return Image.open(fp)
+        except Image.DecompressionBombError:
+            image = open_raw_image(fp)
+            if image is None:
+                raise
+
+            return image
+
+
+def open_raw_image(fp) -> Optional[Image.Image]:
+    """
+    Open an image stored uncompressed, without Pillow's decompression bomb check
+
+    :param fp: Path or seekable file object of image
+    :return: Opened image, or None if it cannot be read by region
+    """
+    is_path = isinstance(fp, (str, Path))
+
+    for plugin in RAW_IMAGE_PLUGINS:
+        if not is_path:
+            fp.seek(0)
+
+        try:
+            image = plugin(fp)
+        except SyntaxError:
+            continue
+
+        if RegionReader.is_supported(image):
+            return image
+
+        # Only close the file opened by the plugin, not the caller's file object
+        if is_path:
+            image.close()
+        return None
+
+    return None
 
 
 class ImageConverter:
@@ -12,53 +210,469 @@ class ImageConverter:
     Convert images to different formats.
     """
 
-    def __init__(self):
+    # All formats fully supported by Pillow
+    supported_formats = [
+        "blp",
+        "bmp",
+        "dds",
+        "dib",
+        "eps",
+        "gif",
+        "icns",
+        "ico",
+        "im",
+        "jpeg",
+        "msp",
+        "pcx",
+        "png",
+        "ppm",
+        "sgi",
+        "spider",
+        "tga",
+        "tiff",
+        "webp",
+        "xbm",
+    ]
+    # Formats that can store several frames in one file.
+    # Multi-frame images converted to other formats are stored as a ZIP of frames.
+    multi_frame_formats = ["gif", "tiff", "webp"]
+    # Common file extensions that differ from the format name
+    extensions_map = {"jpg": "jpeg", "tif": "tiff"}
+    # Formats with a lossy encoder quality setting
+    quality_formats = ["jpeg", "webp"]
+    # Formats that large images can be written to region by region
+    region_formats = ["png", "tiff"]
+
+    def __init__(self, memory_budget_mb: int = 512):
         """
         Constructor.
+
+        :param memory_budget_mb: Memory budget to decode an image in MB.
+            Larger images stored uncompressed are converted region by region,
+            other larger images are rejected.
         """
+        self.memory_budget = memory_budget_mb * 1024 * 1024
         self.last_image = None
 
-    def convert(self, image: Image.Image, img_format: str):
+    def convert(
+        self, image: Image.Image, img_format: str, options: OutputOptions = None
+    ):
         """
         Convert image to different format.
 
         :param image: Image to convert
         :param img_format: Format to convert to.
             Supported formats: All formats fully supported by Pillow
-        :return: Converted image
-        """
-        self.last_image = image.convert("RGB")
-
-        if img_format.lower() in [
-            "blp",
-            "bmp",
-            "dds",
-            "dib",
-            "eps",
-            "gif",
-            "icns",
-            "ico",
-            "im",
-            "jpeg",
-            "msp",
-            "pcx",
-            "png",
-            "ppm",
-            "sgi",
-            "spider",
-            "tga",
-            "tiff",
-            "webp",
-            "xbm",
-        ]:
+        :param options: Options for size and quality of converted image
+        :return: Converted image. If image has several frames and the format
+            supports only one frame, a ZIP archive of converted frames is returned.
+        """
+        with BytesIO() as new_file:
+            self.write(image, img_format, new_file, options)
+
+            return new_file.getvalue()
+
+    @Stopwatch(desc="convert_image.write", verbose=False)
+    def write(
+        self,
+        image: Image.Image,
+        img_format: str,
+        fp: BinaryIO,
+        options: OutputOptions = None,
+    ):
+        """
+        Convert image to different format and write it to a file object.
+
+        Frames of multi-frame images (animated GIF, multi-page TIFF,...) are decoded
+        and encoded one by one, so only a few frames are kept in memory at a time.
+
+        :param image: Image to convert
+        :param img_format: Format to convert to.
+            Supported formats: All formats fully supported by Pillow
+        :param fp: Seekable file object to write converted image to
+        :param options: Options for size and quality of converted image
+        """
+        if img_format.lower() in self.supported_formats:
             img_format = img_format.upper()
         else:
             raise ValueError(f"Unsupported format: {img_format}")
 
-        with BytesIO() as new_file:
-            self.last_image.save(new_file, format=img_format)
+        if options is None:
+            options = OutputOptions()
+        self.check_options(img_format, options)
 
-            return new_file.getvalue()
+        if not self.is_multi_frame(image):
+            target_size = self.get_target_size(image.size, options)
+
+            if self.is_large(image) and RegionReader.is_supported(image):
+                reader = RegionReader(image)
+                factor = min(
+                    image.width // target_size[0], image.height // target_size[1]
+                )
+
+                if factor > 1:
+                    # Shrink by region, then finish resizing in memory
+                    image = reduce_by_region(reader, factor, self.memory_budget)
+                elif img_format.lower() in self.region_formats:
+                    # Image is too large to keep as the last image
+                    self.last_image = None
+                    self._write_by_region(reader, img_format, fp)
+                    return
+                else:
+                    self.check_image_size(image)
+            else:
+                if target_size != image.size:
+                    # Let decoders like JPEG decode at a reduced scale when shrinking
+                    image.draft("RGB", target_size)
+                self.check_image_size(image)
+
+            self.last_image = self.resize(image.convert("RGB"), options)
+            self.save_image(self.last_image, img_format, fp, options)
+            return
+
+        self.check_image_size(image)
+        if img_format == "GIF":
+            self._write_gif(image, fp, options)
+        elif img_format == "TIFF":
+            self._write_tiff(image, fp, options)
+        elif img_format == "WEBP":
+            self._write_webp(image, fp, options)
+        else:
+            self._write_frame_archive(image, img_format, fp, options)
+
+    @classmethod
+    def check_options(cls, img_format: str, options: OutputOptions):
+        """
+        Check that options apply to a format.
+
+        :param img_format: Format to convert to
+        :param options: Options for size and quality of converted image
+        :raises ValueError: If a maximum size is asked for a format without quality
+        """
+        if options.max_size_kb and img_format.lower() not in cls.quality_formats:
+            raise ValueError(
+                f"Maximum size only applies to {', '.join(cls.quality_formats)}, "
+                f"not to {img_format.lower()}."
+            )
+
+    @staticmethod
+    def get_target_size(
+        size: Tuple[int, int], options: OutputOptions
+    ) -> Tuple[int, int]:
+        """
+        Get size of image after shrinking it to the maximum dimensions.
+
+        :param size: Size of image
+        :param options: Options with maximum dimensions
+        :return: Size of shrunk image
+        """
+        width, height = size
+        scale = min(
+            options.max_width / width if options.max_width else 1,
+            options.max_height / height if options.max_height else 1,
+        )
+
+        if scale >= 1:
+            return size
+
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def resize(self, image: Image.Image, options: OutputOptions) -> Image.Image:
+        """
+        Shrink image to the maximum dimensions, keeping aspect ratio.
+
+        :param image: Image to shrink
+        :param options: Options with maximum dimensions
+        :return: Shrunk image, or the same image if it is already small enough
+        """
+        target_size = self.get_target_size(image.size, options)
+
+        if target_size != image.size:
+            image = image.resize(target_size, Image.Resampling.LANCZOS)
+
+        return image
+
+    @classmethod
+    def get_save_params(cls, img_format: str, options: OutputOptions) -> dict:
+        """
+        Get encoder parameters of a format for the options.
+
+        :param img_format: Format to save in upper case
+        :param options: Options for quality of converted image
+        :return: Keyword arguments for Image.save
+        """
+        params = {}
+
+        if options.quality and img_format.lower() in cls.quality_formats:
+            params["quality"] = options.quality
+        if options.optimize:
+            if img_format in ["JPEG", "PNG", "GIF"]:
+                params["optimize"] = True
+            elif img_format == "WEBP":
+                params["method"] = 6  # Slowest method with the best compression
+        if options.progressive and img_format == "JPEG":
+            params["progressive"] = True
+
+        return params
+
+    @Stopwatch(desc="convert_image.save_image", verbose=False)
+    def save_image(
+        self,
+        image: Image.Image,
+        img_format: str,
+        fp: BinaryIO,
+        options: OutputOptions,
+    ):
+        """
+        Save a single-frame image with the options.
+
+        :param image: Decoded image to save
+        :param img_format: Format to save in upper case
+        :param fp: File object to write to
+        :param options: Options for quality of converted image
+        """
+        params = self.get_save_params(img_format, options)
+
+        if options.max_size_kb and img_format.lower() in self.quality_formats:
+            fp.write(
+                self.encode_under_size(
+                    image, img_format, params, options.max_size_kb * 1024
+                )
+            )
+        else:
+            image.save(fp, format=img_format, **params)
+
+    @staticmethod
+    def encode_under_size(
+        image: Image.Image, img_format: str, params: dict, max_size: int
+    ) -> bytes:
+        """
+        Encode image with the highest quality whose output fits under a size.
+        Quality is binary searched, encoding the same decoded image in memory.
+
+        :param image: Decoded image to encode
+        :param img_format: Format with a quality setting, in upper case
+        :param params: Encoder parameters. "quality" is used as the highest quality
+        :param max_size: Maximum size of output in bytes
+        :return: Encoded image. If no quality fits, the lowest quality output
+        """
+
+        def encode(quality: int) -> bytes:
+            with BytesIO() as buffer:
+                image.save(buffer, format=img_format, **{**params, "quality": quality})
+
+                return buffer.getvalue()
+
+        # Most images already fit with the highest quality
+        high = params.get("quality", 95)
+        data = encode(high)
+        if len(data) <= max_size:
+            return data
+
+        low, high = 1, high - 1
+        best_data = None
+        while low <= high:
+            quality = (low + high) // 2
+            data = encode(quality)
+
+            if len(data) <= max_size:
+                best_data = data
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        # The last attempt is the lowest quality if nothing fits
+        return best_data if best_data is not None else data
+
+    def is_large(self, image: Image.Image) -> bool:
+        """
+        Check if decoding image as RGB exceeds the memory budget.
+
+        :param image: Image to check
+        :return: True if image is larger than the memory budget
+        """
+        return image.width * image.height * 3 > self.memory_budget
+
+    def check_image_size(self, image: Image.Image):
+        """
+        Check that an image can be decoded as a whole: within Pillow's
+        decompression bomb limit, skipped by open_image(), and the memory budget.
+
+        :param image: Image to check
+        :raises Image.DecompressionBombError: If the image is too large
+        """
+        # pylint: disable-next=protected-access
+        Image._decompression_bomb_check(image.size)
+
+        if self.is_large(image):
+            raise Image.DecompressionBombError(
+                f"Image size ({image.width}x{image.height} pixels) exceeds "
+                f"the memory budget of {self.memory_budget // (1024 * 1024)} MB, "
+                "and it cannot be converted region by region."
+            )
+
+    def _write_by_region(self, reader: RegionReader, img_format: str, fp: BinaryIO):
+        """
+        Write a large image region by region, within the memory budget.
+
+        :param reader: Reader of image to convert
+        :param img_format: Format to convert to, one of region formats in upper case
+        :param fp: Seekable file object to write to
+        """
+        if img_format == "TIFF":
+            write_tiff_by_region(reader, fp, self.memory_budget)
+        else:
+            write_png_by_region(reader, fp, self.memory_budget)
+
+    @staticmethod
+    def is_multi_frame(image: Image.Image) -> bool:
+        """
+        Check if image has more than one frame.
+
+        :param image: Image to check
+        :return: True if image has more than one frame
+        """
+        return getattr(image, "n_frames", 1) > 1
+
+    @classmethod
+    def is_archive_output(cls, image: Image.Image, img_format: str) -> bool:
+        """
+        Check if converting image to format produces a ZIP archive of frames.
+
+        :param image: Image to convert
+        :param img_format: Format to convert to
+        :return: True if the output is a ZIP archive
+        """
+        return (
+            cls.is_multi_frame(image)
+            and img_format.lower() not in cls.multi_frame_formats
+        )
+
+    def iter_frames(
+        self, image: Image.Image, options: OutputOptions
+    ) -> Iterator[Image.Image]:
+        """
+        Iterate frames of image, each converted to RGB and shrunk to the options.
+        Only the current frame is decoded, previous frames are released.
+
+        :param image: Image to iterate
+        :param options: Options with maximum dimensions
+        :return: Iterator of converted frames
+        """
+        try:
+            for index, frame in enumerate(ImageSequence.Iterator(image)):
+                rgb_frame = self.resize(frame.convert("RGB"), options)
+                if index == 0:
+                    self.last_image = rgb_frame
+
+                yield rgb_frame
+        finally:
+            image.seek(0)
+
+    def _write_gif(self, image: Image.Image, fp: BinaryIO, options: OutputOptions):
+        """
+        Write frames as an animated GIF, encoding each frame right after decoding it.
+
+        :param image: Multi-frame image to convert
+        :param fp: File object to write to
+        :param options: Options for size of converted frames
+        """
+        info = {"loop": image.info.get("loop", 0)}
+
+        for index, frame in enumerate(self.iter_frames(image, options)):
+            params = {"duration": frame.info.get("duration", 0)}
+            frame = frame.convert("P", palette=Image.Palette.ADAPTIVE)
+
+            if index == 0:
+                header, _ = GifImagePlugin.getheader(frame, info=info)
+                for data in header:
+                    fp.write(data)
+            else:
+                # Every frame after the first one has its own palette
+                params["include_color_table"] = True
+
+            for data in GifImagePlugin.getdata(frame, **params):
+                fp.write(data)
+
+        fp.write(b";")  # GIF trailer
+
+    def _write_tiff(self, image: Image.Image, fp: BinaryIO, options: OutputOptions):
+        """
+        Write frames as a multi-page TIFF, appending each page right after decoding it.
+
+        :param image: Multi-frame image to convert
+        :param fp: Seekable file object to write to
+        :param options: Options for size of converted frames
+        """
+        with TiffImagePlugin.AppendingTiffWriter(fp) as tiff_file:
+            for frame in self.iter_frames(image, options):
+                frame.save(tiff_file, format="TIFF")
+                tiff_file.newFrame()
+
+    def _write_webp(self, image: Image.Image, fp: BinaryIO, options: OutputOptions):
+        """
+        Write frames as an animated WebP.
+        Pillow seeks and encodes source frames one by one for this format.
+        With a maximum size, the whole animation is encoded with the highest
+        quality that fits.
+
+        :param image: Multi-frame image to convert
+        :param fp: File object to write to
+        :param options: Options for size and quality of converted frames
+        """
+        durations = [
+            frame.info.get("duration", 0) for frame in ImageSequence.Iterator(image)
+        ]
+        image.seek(0)
+        params = self.get_save_params("WEBP", options)
+        params.update(save_all=True, duration=durations, loop=image.info.get("loop", 0))
+
+        if self.get_target_size(image.size, options) == image.size:
+            self.last_image = image.convert("RGB")
+            first_frame = image
+        else:
+            # Pillow only accepts resized frames as a list, so they are all kept
+            # in memory. They are smaller than the source frames.
+            frames = self.iter_frames(image, options)
+            first_frame = next(frames)
+            params["append_images"] = list(frames)
+
+        if options.max_size_kb:
+            fp.write(
+                self.encode_under_size(
+                    first_frame, "WEBP", params, options.max_size_kb * 1024
+                )
+            )
+        else:
+            first_frame.save(fp, format="WEBP", **params)
+
+        image.seek(0)
+
+    def _write_frame_archive(
+        self,
+        image: Image.Image,
+        img_format: str,
+        fp: BinaryIO,
+        options: OutputOptions,
+    ):
+        """
+        Write frames as a ZIP archive of single-frame images, one file per frame.
+
+        :param image: Multi-frame image to convert
+        :param img_format: Format of each frame in upper case
+        :param fp: File object to write to
+        :param options: Options for size and quality of each converted frame
+        """
+        extension = img_format.lower()
+
+        with ZipFile(fp, "w", compression=ZIP_DEFLATED) as archive:
+            for index, frame in enumerate(self.iter_frames(image, options)):
+                # Some encoders need a seekable file, so encode in memory first
+                with BytesIO() as frame_file:
+                    self.save_image(frame, img_format, frame_file, options)
+                    archive.writestr(
+                        f"frame_{index:04d}.{extension}", frame_file.getvalue()
+                    )
 
     def get_last_image(self) -> Image.Image:
         """
@@ -67,3 +681,314 @@ class ImageConverter:
         :return: Last image
         """
         return self.last_image
+
+
+def convert_file(
+    source: Union[str, Path],
+    target: Union[str, Path],
+    img_format: str,
+    options: OutputOptions = None,
+    memory_budget_mb: int = 512,
+) -> Path:
+    """
+    Convert an image file to different format and write it atomically.
+    The image is written to a temporary file next to the target, then renamed
+    to the target, so an interrupted conversion never leaves a partial file.
+
+    :param source: Path to image file
+    :param target: Path to converted file. Its suffix is changed to ".zip"
+        if the image is converted to a ZIP archive of frames
+    :param img_format: Format to convert to
+    :param options: Options for size and quality of converted image
+    :param memory_budget_mb: Memory budget to decode the image in MB
+    :return: Path to converted file
+    """
+    target = Path(target)
+
+    with open_image(source) as image:
+        if ImageConverter.is_archive_output(image, img_format):
+            target = target.with_suffix(".zip")
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(
+            dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w+b") as temp_file:
+                converter = ImageConverter(memory_budget_mb=memory_budget_mb)
+                converter.write(image, img_format, temp_file, options)
+            os.replace(temp_path, target)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    return target
+
+
+class FolderConverter:
+    """
+    Convert all images in a folder tree into a mirrored output folder tree.
+
+    Each conversion is recorded in a journal in the output folder, with the
+    modification time of its source. Images converted successfully from an
+    unchanged source, whose output still exists, are skipped. So are images
+    missing from the journal whose output is newer than the source. Failed
+    conversions are retried.
+    This makes interrupted runs resumable and re-runs only convert new images.
+
+    Images of a folder differing only by their extension, like a.png and a.bmp,
+    keep their extension in the name of their output, like a_png.jpg and a_bmp.jpg,
+    so each output always belongs to the same source.
+    """
+
+    def __init__(
+        self,
+        img_format: str,
+        options: OutputOptions = None,
+        memory_budget_mb: int = 512,
+        workers: int = None,
+        force: bool = False,
+    ):
+        """
+        Initialize FolderConverter class
+
+        :param img_format: Format to convert to. Common extensions like "jpg" are accepted
+        :param options: Options for size and quality of converted images
+        :param memory_budget_mb: Memory budget of each process in MB
+        :param workers: Number of processes converting images in parallel
+        :param force: Convert all images again, ignoring the journal and existing outputs
+        """
+        self.extension = img_format.lower()
+        self.img_format = ImageConverter.extensions_map.get(
+            self.extension, self.extension
+        )
+        self.options = options or OutputOptions()
+        self.memory_budget_mb = memory_budget_mb
+        self.workers = workers or os.cpu_count()
+        self.force = force
+
+        ImageConverter.check_options(self.img_format, self.options)
+
+        Image.init()
+        self.input_extensions = set(Image.registered_extensions())
+
+    def find_images(self, input_dir: Path, output_dir: Path) -> Iterator[Path]:
+        """
+        Find image files in a folder tree, in a stable order
+
+        :param input_dir: Folder to search
+        :param output_dir: Output folder, skipped if it is inside the input folder
+        :return: Iterator of image file paths
+        """
+        for root, dirs, files in os.walk(input_dir):
+            root = Path(root)
+
+            dirs[:] = sorted(
+                name
+                for name in dirs
+                if not name.startswith(".") and root / name != output_dir
+            )
+
+            for name in sorted(files):
+                filepath = root / name
+                if (
+                    not name.startswith(".")
+                    and filepath.suffix.lower() in self.input_extensions
+                ):
+                    yield filepath
+
+    @staticmethod
+    def load_journal(journal_path: Path) -> Dict[str, Tuple[int, str]]:
+        """
+        Load the journal of a previous run
+
+        :param journal_path: Path to journal file
+        :return: Dictionary with relative source path as key
+            and (source modification time, status) as value
+        """
+        journal = {}
+
+        if journal_path.exists():
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t", 2)
+
+                    # Skip the last line if it was cut by an interruption
+                    if len(parts) != 3 or not parts[0].isdigit():
+                        continue
+
+                    journal[parts[2]] = (int(parts[0]), parts[1])
+
+        return journal
+
+    @staticmethod
+    def save_journal(journal_path: Path, journal: Dict[str, Tuple[int, str]]):
+        """
+        Rewrite the journal atomically, keeping only one line per source
+
+        :param journal_path: Path to journal file
+        :param journal: Dictionary with relative source path as key
+            and (source modification time, status) as value
+        """
+        temp_path = journal_path.with_name(journal_path.name + ".tmp")
+
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for relative_path, (mtime, status) in journal.items():
+                f.write(f"{mtime}\t{status}\t{relative_path}\n")
+
+        os.replace(temp_path, journal_path)
+
+    @staticmethod
+    def output_exists(target: Path) -> bool:
+        """
+        Check if the output of an image exists
+
+        :param target: Path to converted file
+        :return: True if the converted file or its ZIP archive variant exists
+        """
+        return target.exists() or target.with_suffix(".zip").exists()
+
+    @staticmethod
+    def is_output_newer(mtime: int, target: Path) -> bool:
+        """
+        Check if the output of an image is newer than its source
+
+        :param mtime: Modification time of source in nanoseconds
+        :param target: Path to converted file
+        :return: True if the converted file or its ZIP archive variant is newer
+        """
+        for filepath in (target, target.with_suffix(".zip")):
+            try:
+                if filepath.stat().st_mtime_ns >= mtime:
+                    return True
+            except FileNotFoundError:
+                continue
+
+        return False
+
+    def convert(self, input_dir: Union[str, Path], output_dir: Union[str, Path]):
+        """
+        Convert all images in a folder tree
+
+        :param input_dir: Folder of images to convert
+        :param output_dir: Folder to store converted images
+        """
+        input_dir = Path(input_dir).resolve()
+        output_dir = Path(output_dir).resolve()
+        assert input_dir.is_dir(), "Input path must be a folder"
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        journal_path = output_dir / JOURNAL_FILENAME
+        old_journal = {} if self.force else self.load_journal(journal_path)
+        new_journal = {}
+        counts = {"converted": 0, "skipped": 0, "failed": 0}
+
+        sources = list(self.find_images(input_dir, output_dir))
+        stem_counts = Counter(source.with_suffix("") for source in sources)
+
+        def record(future, relative_path: str, mtime: int):
+            if future.exception() is None:
+                status = "done"
+                _, spans = future.result()
+            else:
+                status = "failed"
+                spans = get_failed_spans(future.exception())
+                print(f"Cannot convert {relative_path}: {future.exception()}")
+
+            # Add time spans recorded by the worker process, failed or not
+            recorder.merge(spans)
+
+            counts["converted" if status == "done" else "failed"] += 1
+            new_journal[relative_path] = (mtime, status)
+            journal_file.write(f"{mtime}\t{status}\t{relative_path}\n")
+
+            processed = counts["converted"] + counts["failed"]
+            if processed % 100 == 0:
+                print(f"Processed {processed} images...", flush=True)
+
+        # Journal is line buffered so finished conversions survive an interruption
+        with open(journal_path, "a", encoding="utf-8", buffering=1) as journal_file:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                pending = {}
+
+                for source in sources:
+                    relative_path = source.relative_to(input_dir).as_posix()
+                    mtime = source.stat().st_mtime_ns
+
+                    # Keep all outputs if sources differ only by their extension,
+                    # naming them the same way whatever order they are found in
+                    target = (output_dir / relative_path).with_suffix(
+                        f".{self.extension}"
+                    )
+                    if stem_counts[source.with_suffix("")] > 1:
+                        target = target.with_name(
+                            f"{source.stem}_{source.suffix[1:]}.{self.extension}"
+                        )
+
+                    if not self.force:
+                        if relative_path in old_journal:
+                            old_mtime, status = old_journal[relative_path]
+                            is_unchanged = (
+                                old_mtime == mtime
+                                and status == "done"
+                                and self.output_exists(target)
+                            )
+                        else:
+                            is_unchanged = self.is_output_newer(mtime, target)
+
+                        if is_unchanged:
+                            new_journal[relative_path] = old_journal.get(
+                                relative_path, (mtime, "done")
+                            )
+                            counts["skipped"] += 1
+                            continue
+
+                    future = executor.submit(
+                        call_recorded,
+                        convert_file,
+                        source,
+                        target,
+                        self.img_format,
+                        self.options,
+                        self.memory_budget_mb,
+                    )
+                    pending[future] = (relative_path, mtime)
+
+                    # Bound the number of queued conversions
+                    if len(pending) >= self.workers * 4:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future, *pending.pop(future))
+
+                done, _ = wait(pending)
+                for future in done:
+                    record(future, *pending.pop(future))
+
+        self.save_journal(journal_path, new_journal)
+
+        print(
+            f"Converted {counts['converted']} images, "
+            f"skipped {counts['skipped']} unchanged images, "
+            f"failed {counts['failed']} images."
+        )
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    with profile_from_args(args, "convert_image"):
+        converter = FolderConverter(
+            args.format,
+            options=OutputOptions(
+                max_width=args.max_width,
+                max_height=args.max_height,
+                quality=args.quality,
+                optimize=args.optimize,
+                progressive=args.progressive,
+                max_size_kb=args.max_size,
+            ),
+            memory_budget_mb=args.memory_budget,
+            workers=args.workers,
+            force=args.force,
+        )
+        converter.convert(args.input, args.output)
@@ -0,0 +1,352 @@
+"""
+Set of tools for converting large images region by region, without decoding
+the whole image in memory.
+"""
+
+import struct
+import zlib
+from typing import BinaryIO, Iterator, Tuple
+
+from PIL import Image, ImageChops
+
+# TIFF field types
+TIFF_SHORT = 3
+TIFF_LONG = 4
+TIFF_LONG8 = 16
+
+# Classic TIFF offsets are 32 bits, larger files are written as BigTIFF
+BIGTIFF_THRESHOLD = 2**32 - 2**24
+
+# Target size of each TIFF strip before compression
+TIFF_STRIP_SIZE = 64 * 1024
+
+# Target size of each PNG data chunk
+PNG_CHUNK_SIZE = 64 * 1024
+
+
+class RegionReader:
+    """
+    Read rows of an image directly from its file, without loading the whole image.
+
+    Only images stored as raw (uncompressed) tiles are supported, like
+    uncompressed TIFF, BMP, PPM or TGA. Compressed data must be decoded from the
+    beginning, so it cannot be read by region.
+    """
+
+    def __init__(self, image: Image.Image):
+        """
+        Initialize RegionReader class
+
+        :param image: Opened image which is not loaded yet
+        """
+        if not self.is_supported(image):
+            raise ValueError("Image cannot be read by region")
+
+        self.image = image
+        self.width, self.height = image.size
+        self.tiles = self.get_raw_tiles(image)
+
+    @staticmethod
+    def get_raw_tiles(image: Image.Image) -> list:
+        """
+        Get raw tiles of an image with their stride resolved
+
+        :param image: Opened image which is not loaded yet
+        :return: List of (extents, offset, rawmode, stride, orientation).
+            Empty if the image has other tiles than raw ones.
+        """
+        tiles = []
+
+        for decoder, extents, offset, args in getattr(image, "tile", None) or []:
+            if decoder != "raw":
+                return []
+
+            if isinstance(args, str):
+                args = (args,)
+            rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+
+            if not stride:
+                # Same as the raw decoder: the size of one packed row
+                try:
+                    row = Image.new(image.mode, (extents[2] - extents[0], 1))
+                    stride = len(row.tobytes("raw", rawmode))
+                except ValueError:
+                    return []
+
+            tiles.append((extents, offset, rawmode, stride, orientation))
+
+        return tiles
+
+    @classmethod
+    def is_supported(cls, image: Image.Image) -> bool:
+        """
+        Check if an image can be read by region
+
+        :param image: Opened image
+        :return: True if the image file is opened and stored as raw tiles
+        """
+        return (
+            getattr(image, "fp", None) is not None
+            and getattr(image, "n_frames", 1) == 1
+            and bool(cls.get_raw_tiles(image))
+        )
+
+    def read_rows(self, top: int, bottom: int) -> Image.Image:
+        """
+        Read a band of rows
+
+        :param top: First row to read
+        :param bottom: Row after the last row to read
+        :return: Band of rows converted to RGB
+        """
+        band = Image.new("RGB", (self.width, bottom - top))
+
+        for (x0, y0, x1, y1), offset, rawmode, stride, orientation in self.tiles:
+            first, last = max(top, y0), min(bottom, y1)
+            if first >= last:
+                continue
+
+            # Rows of a tile are stored bottom-up if orientation is negative
+            if orientation < 0:
+                start = offset + (y1 - last) * stride
+            else:
+                start = offset + (first - y0) * stride
+            size = (last - first) * stride
+
+            self.image.fp.seek(start)
+            data = self.image.fp.read(size).ljust(size, b"\0")
+
+            region = Image.frombytes(
+                self.image.mode,
+                (x1 - x0, last - first),
+                data,
+                "raw",
+                rawmode,
+                stride,
+                orientation,
+            )
+            if self.image.mode == "P":
+                # Palette parsed on open, getpalette() would load the whole image
+                region.putpalette(self.image.palette)
+
+            band.paste(region.convert("RGB"), (x0, first - top))
+
+        return band
+
+    def iter_bands(self, rows_per_band: int) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Iterate bands of rows from top to bottom
+
+        :param rows_per_band: Number of rows in each band
+        :return: Iterator of (first row, band converted to RGB)
+        """
+        for top in range(0, self.height, rows_per_band):
+            yield top, self.read_rows(top, min(top + rows_per_band, self.height))
+
+
+def get_rows_per_band(width: int, memory_budget: int, copies: int = 6) -> int:
+    """
+    Get number of rows of a band so that working on it fits in a memory budget
+
+    :param width: Width of image
+    :param memory_budget: Memory budget in bytes
+    :param copies: Number of RGB copies of a band kept while processing it
+    :return: Number of rows in each band
+    """
+    return max(1, memory_budget // (width * 3 * copies))
+
+
+def reduce_by_region(
+    reader: RegionReader, factor: int, memory_budget: int
+) -> Image.Image:
+    """
+    Shrink an image by an integer factor, reading it band by band.
+    Each block of factor x factor pixels is averaged, so bands join without seams.
+
+    :param reader: Reader of image to shrink
+    :param factor: Factor to shrink by
+    :param memory_budget: Memory budget in bytes
+    :return: Shrunk RGB image
+    """
+    rows_per_band = get_rows_per_band(reader.width, memory_budget)
+    rows_per_band = max(factor, rows_per_band - rows_per_band % factor)
+
+    reduced = Image.new("RGB", (reader.width // factor, reader.height // factor))
+
+    for top, band in reader.iter_bands(rows_per_band):
+        if band.height >= factor:
+            band = band.crop((0, 0, band.width, band.height - band.height % factor))
+            reduced.paste(band.reduce(factor), (0, top // factor))
+
+    return reduced
+
+
+def _write_tiff_ifd(fp: BinaryIO, base: int, entries: list, is_big: bool) -> int:
+    """
+    Write a TIFF image file directory with its out-of-line values
+
+    :param fp: File object to write to
+    :param base: Position of the TIFF header in file
+    :param entries: List of (tag, field type, values), sorted by tag
+    :param is_big: Whether the file is a BigTIFF
+    :return: Offset of the directory from the TIFF header
+    """
+    formats = {TIFF_SHORT: "H", TIFF_LONG: "L", TIFF_LONG8: "Q"}
+    inline_size = 8 if is_big else 4
+
+    # Directories start on a word boundary
+    if (fp.tell() - base) % 2:
+        fp.write(b"\0")
+    ifd_offset = fp.tell() - base
+
+    if is_big:
+        ifd_size = 8 + 20 * len(entries) + 8
+    else:
+        ifd_size = 2 + 12 * len(entries) + 4
+    extra_offset = ifd_offset + ifd_size
+
+    ifd = [struct.pack("<Q" if is_big else "<H", len(entries))]
+    extra = []
+    for tag, field_type, values in entries:
+        data = struct.pack(f"<{len(values)}{formats[field_type]}", *values)
+        count_format = "<HHQ" if is_big else "<HHL"
+        ifd.append(struct.pack(count_format, tag, field_type, len(values)))
+
+        if len(data) <= inline_size:
+            ifd.append(data.ljust(inline_size, b"\0"))
+        else:
+            ifd.append(struct.pack("<Q" if is_big else "<L", extra_offset))
+            extra.append(data)
+            extra_offset += len(data) + len(data) % 2
+            if len(data) % 2:
+                extra.append(b"\0")
+    ifd.append(b"\0" * inline_size)  # No next directory
+
+    fp.write(b"".join(ifd))
+    for data in extra:
+        fp.write(data)
+
+    return ifd_offset
+
+
+def write_tiff_by_region(reader: RegionReader, fp: BinaryIO, memory_budget: int):
+    """
+    Write an image as a striped RGB TIFF, reading and compressing it band by band.
+    Strips are compressed with Deflate and the horizontal differencing predictor.
+
+    :param reader: Reader of image to write
+    :param fp: Seekable file object to write to
+    :param memory_budget: Memory budget in bytes
+    """
+    width, height = reader.width, reader.height
+    stride = width * 3
+    rows_per_strip = max(1, TIFF_STRIP_SIZE // stride)
+    rows_per_band = get_rows_per_band(width, memory_budget)
+    rows_per_band = max(rows_per_strip, rows_per_band - rows_per_band % rows_per_strip)
+    is_big = stride * height > BIGTIFF_THRESHOLD
+
+    # Header with a placeholder for the offset of the directory
+    base = fp.tell()
+    if is_big:
+        fp.write(b"II" + struct.pack("<HHHQ", 43, 8, 0, 0))
+    else:
+        fp.write(b"II" + struct.pack("<HL", 42, 0))
+
+    strip_offsets = []
+    strip_byte_counts = []
+    for _, band in reader.iter_bands(rows_per_band):
+        # Horizontal differencing: subtract the previous pixel of each row
+        shifted = Image.new("RGB", band.size)
+        shifted.paste(band.crop((0, 0, band.width - 1, band.height)), (1, 0))
+        data = ImageChops.subtract_modulo(band, shifted).tobytes()
+
+        for start in range(0, len(data), rows_per_strip * stride):
+            strip = zlib.compress(data[start : start + rows_per_strip * stride])
+            strip_offsets.append(fp.tell() - base)
+            strip_byte_counts.append(len(strip))
+            fp.write(strip)
+
+    offset_type = TIFF_LONG8 if is_big else TIFF_LONG
+    entries = [
+        (256, TIFF_LONG, [width]),  # ImageWidth
+        (257, TIFF_LONG, [height]),  # ImageLength
+        (258, TIFF_SHORT, [8, 8, 8]),  # BitsPerSample
+        (259, TIFF_SHORT, [8]),  # Compression: Deflate
+        (262, TIFF_SHORT, [2]),  # PhotometricInterpretation: RGB
+        (273, offset_type, strip_offsets),  # StripOffsets
+        (277, TIFF_SHORT, [3]),  # SamplesPerPixel
+        (278, TIFF_LONG, [rows_per_strip]),  # RowsPerStrip
+        (279, offset_type, strip_byte_counts),  # StripByteCounts
+        (284, TIFF_SHORT, [1]),  # PlanarConfiguration: Chunky
+        (317, TIFF_SHORT, [2]),  # Predictor: Horizontal differencing
+    ]
+    ifd_offset = _write_tiff_ifd(fp, base, entries, is_big)
+
+    # Fill the offset of the directory in header
+    end = fp.tell()
+    fp.seek(base + (8 if is_big else 4))
+    fp.write(struct.pack("<Q" if is_big else "<L", ifd_offset))
+    fp.seek(end)
+
+
+def _write_png_chunk(fp: BinaryIO, chunk_type: bytes, data: bytes):
+    """
+    Write a PNG chunk
+
+    :param fp: File object to write to
+    :param chunk_type: Type of chunk
+    :param data: Data of chunk
+    """
+    crc = zlib.crc32(data, zlib.crc32(chunk_type))
+    fp.write(struct.pack(">I", len(data)) + chunk_type)
+    fp.write(data)
+    fp.write(struct.pack(">I", crc))
+
+
+def write_png_by_region(reader: RegionReader, fp: BinaryIO, memory_budget: int):
+    """
+    Write an image as an RGB PNG, reading and compressing it band by band.
+    Rows are filtered with the "Up" filter.
+
+    :param reader: Reader of image to write
+    :param fp: File object to write to
+    :param memory_budget: Memory budget in bytes
+    """
+    width = reader.width
+    stride = width * 3
+    rows_per_band = get_rows_per_band(width, memory_budget)
+
+    fp.write(b"\x89PNG\r\n\x1a\n")
+    _write_png_chunk(
+        fp,
+        b"IHDR",
+        # Bit depth 8, color type RGB, default compression, filtering and interlace
+        struct.pack(">IIBBBBB", width, reader.height, 8, 2, 0, 0, 0),
+    )
+
+    compressor = zlib.compressobj()
+    pending = []
+    pending_size = 0
+    previous_row = Image.new("RGB", (width, 1))
+
+    for _, band in reader.iter_bands(rows_per_band):
+        # "Up" filter: subtract the row above, the first row is compared to zeros
+        above = Image.new("RGB", band.size)
+        above.paste(previous_row, (0, 0))
+        above.paste(band.crop((0, 0, width, band.height - 1)), (0, 1))
+        previous_row = band.crop((0, band.height - 1, width, band.height))
+        data = ImageChops.subtract_modulo(band, above).tobytes()
+
+        for start in range(0, len(data), stride):
+            compressed = compressor.compress(b"\x02" + data[start : start + stride])
+            if compressed:
+                pending.append(compressed)
+                pending_size += len(compressed)
+
+        if pending_size >= PNG_CHUNK_SIZE:
+            _write_png_chunk(fp, b"IDAT", b"".join(pending))
+            pending, pending_size = [], 0
+
+    pending.append(compressor.flush())
+    _write_png_chunk(fp, b"IDAT", b"".join(pending))
+    _write_png_chunk(fp, b"IEND", b"")
@@ -0,0 +1,385 @@
+"""
+This module contains the class to profile a whole run of a command-line tool
+
+For example:
+
+with Profiler(name="check_duplicated", mode="sample"):
+    checker.check(folders)
+
+It writes to the output directory:
+
+- <name>-<time>.pstats: cProfile stats, to open with pstats or snakeviz (cprofile mode)
+- <name>-<time>.collapsed: collapsed stacks, to draw with flamegraph.pl or speedscope
+- <name>-<time>.txt: summary of the slowest functions
+
+cProfile only traces the thread that starts it, so in "cprofile" mode work done
+in other threads shows as time waiting for them. Use "sample" mode to profile
+all threads.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+# Paths of cProfile call graph with less time than this are not written
+MIN_COLLAPSED_SECONDS = 1e-6
+
+# Deepest call path written from cProfile stats
+MAX_COLLAPSED_DEPTH = 64
+
+
+def add_profile_args(parser: argparse.ArgumentParser):
+    """
+    Add profiling options to the parser of a command-line tool
+
+    :param parser: Parser of tool
+    """
+    group = parser.add_argument_group("profiling")
+    group.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="cprofile",
+        choices=["cprofile", "sample"],
+        help="Profile the run. 'cprofile' traces every call of the main thread, "
+        "'sample' samples stacks of all threads periodically with low overhead "
+        "for long runs",
+    )
+    group.add_argument(
+        "--profile-dir",
+        type=str,
+        default="profiles",
+        help="Folder to write profiles to",
+    )
+    group.add_argument(
+        "--profile-interval",
+        type=float,
+        default=5,
+        help="Interval between stack samples in milliseconds, in 'sample' mode",
+    )
+    group.add_argument(
+        "--profile-top",
+        type=int,
+        default=30,
+        help="Number of functions in the summary",
+    )
+
+
+def profile_from_args(args: argparse.Namespace, name: str):
+    """
+    Get a profiler configured by the options of add_profile_args()
+
+    :param args: Parsed arguments
+    :param name: Name of tool, used in file names
+    :return: Profiler, or a context doing nothing if profiling is not asked
+    """
+    if not getattr(args, "profile", None):
+        return contextlib.nullcontext()
+
+    return Profiler(
+        name=name,
+        mode=args.profile,
+        output_dir=args.profile_dir,
+        interval=args.profile_interval / 1000,
+        top=args.profile_top,
+    )
+
+
+def get_frame_label(code) -> str:
+    """
+    Get label of a function in collapsed stacks
+
+    :param code: Code object of function
+    :return: Label of function
+    """
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Sample stacks of all threads periodically from a background thread
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Initialize StackSampler class
+
+        :param interval: Interval between samples in seconds
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        """
+        Take samples until stopped
+        """
+        own_id = threading.get_ident()
+
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            # pylint: disable-next=protected-access
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(get_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+
+                self.stacks[tuple(reversed(stack))] += 1
+
+            self.sample_count += 1
+
+    def get_top(self, top: int) -> str:
+        """
+        Get summary of the functions found in most samples
+
+        :param top: Number of functions
+        :return: Summary
+        """
+        self_counts = Counter()
+        total_counts = Counter()
+
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack[1:]):
+                total_counts[label] += count
+
+        lines = [
+            f"{self.sample_count} samples every {self.interval * 1000:g} ms",
+            "",
+            f"{'Total %':>8} {'Self %':>8}  Function",
+        ]
+        samples = max(sum(self.stacks.values()), 1)
+        for label, count in total_counts.most_common(top):
+            lines.append(
+                f"{100 * count / samples:>8.1f} "
+                f"{100 * self_counts[label] / samples:>8.1f}  {label}"
+            )
+
+        return "\n".join(lines)
+
+
+def get_call_cycles(stats: pstats.Stats) -> Dict[tuple, tuple]:
+    """
+    Group functions calling each other recursively, directly or not,
+    with Kosaraju's algorithm
+
+    :param stats: cProfile stats
+    :return: Dictionary of function: first function found of its group
+    """
+    callees: Dict[tuple, list] = {func: [] for func in stats.stats}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+
+    # Order functions by the end of their visit, following callees
+    order = []
+    visited = set()
+    for start in callees:
+        if start in visited:
+            continue
+        visited.add(start)
+        stack = [(start, iter(callees[start]))]
+        while stack:
+            func, children = stack[-1]
+            for child in children:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(callees.get(child, []))))
+                    break
+            else:
+                stack.pop()
+                order.append(func)
+
+    # Functions reached back from the last visited, following callers, form a cycle
+    cycles: Dict[tuple, tuple] = {}
+    for start in reversed(order):
+        if start in cycles:
+            continue
+        cycles[start] = start
+        stack = [start]
+        while stack:
+            func = stack.pop()
+            callers = stats.stats[func][4] if func in stats.stats else {}
+            for caller in callers:
+                if caller not in cycles:
+                    cycles[caller] = start
+                    stack.append(caller)
+
+    return cycles
+
+
+def collapse_stats(stats: pstats.Stats) -> Dict[Tuple[str, ...], int]:
+    """
+    Convert cProfile stats to collapsed stacks.
+    cProfile only records callers of each function, so the time of a function
+    is split between its call paths in proportion to the time of each call.
+
+    :param stats: cProfile stats
+    :return: Dictionary of call path: own time in microseconds
+    """
+    callees: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, {})[func] = cumulative
+
+    def get_label(func: tuple) -> str:
+        filename, line, name = func
+        return f"{name} ({Path(filename).name}:{line})"
+
+    stacks: Dict[Tuple[str, ...], int] = {}
+
+    def walk(func: tuple, path: tuple, funcs: tuple, fraction: float):
+        _, _, own_time, cumulative, _ = stats.stats[func]
+        path = path + (get_label(func),)
+
+        own_us = round(own_time * fraction * 1e6)
+        if own_us > 0:
+            stacks[path] = stacks.get(path, 0) + own_us
+
+        if len(path) >= MAX_COLLAPSED_DEPTH:
+            return
+
+        for callee, edge_cumulative in callees.get(func, {}).items():
+            callee_cumulative = stats.stats[callee][3]
+            if callee in funcs or callee_cumulative <= 0:
+                continue
+
+            callee_fraction = fraction * edge_cumulative / callee_cumulative
+            if edge_cumulative * fraction >= MIN_COLLAPSED_SECONDS:
+                walk(callee, path, funcs + (callee,), callee_fraction)
+
+    # Start from functions only called by themselves or their own recursion,
+    # one function for each cycle, the one with the most time
+    cycles = get_call_cycles(stats)
+    roots: Dict[tuple, tuple] = {}
+    for func, (_, _, _, cumulative, callers) in stats.stats.items():
+        cycle = cycles[func]
+        if any(cycles.get(caller) != cycle for caller in callers):
+            continue
+        if cycle not in roots or cumulative > stats.stats[roots[cycle]][3]:
+            roots[cycle] = func
+
+    for func in roots.values():
+        walk(func, (), (func,), 1.0)
+
+    return stacks
+
+
+class Profiler:
+    """
+    Profile a code block with cProfile or a stack sampler, and write the results
+    """
+
+    def __init__(
+        self,
+        name: str = "profile",
+        mode: str = "cprofile",
+        output_dir: Union[str, Path] = "profiles",
+        interval: float = 0.005,
+        top: int = 30,
+    ):
+        """
+        Initialize Profiler class
+
+        :param name: Name of profiled tool, used in file names
+        :param mode: "cprofile" to trace every call, or "sample" to sample stacks
+        :param output_dir: Folder to write results to
+        :param interval: Interval between samples in seconds, in "sample" mode
+        :param top: Number of functions in the summary
+        """
+        if mode not in ["cprofile", "sample"]:
+            raise ValueError(f"Invalid profile mode: {mode}")
+
+        self.name = name
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.top = top
+
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.sampler = StackSampler(interval) if mode == "sample" else None
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+
+        if self.profile is not None:
+            self.profile.enable()
+        else:
+            self.sampler.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self.sampler.stop()
+
+        self.write(time.perf_counter() - self.start_time)
+
+    def write(self, elapsed: float):
+        """
+        Write profile results and print the summary
+
+        :param elapsed: Duration of profiled run in seconds
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = self.output_dir / f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+        if self.profile is not None:
+            self.profile.dump_stats(f"{prefix}.pstats")
+
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            summary = stream.getvalue()
+            stacks = collapse_stats(stats)
+        else:
+            summary = self.sampler.get_top(self.top)
+            stacks = self.sampler.stacks
+
+        with open(f"{prefix}.collapsed", "w", encoding="utf-8") as file:
+            for stack, value in stacks.items():
+                file.write(f"{';'.join(stack)} {value}\n")
+
+        summary = f"Profiled {self.name} for {elapsed:.2f} seconds\n\n{summary}"
+        with open(f"{prefix}.txt", "w", encoding="utf-8") as file:
+            file.write(summary)
+
+        print("\n" + "-" * 50)
+        print(summary)
+        print(f"Profile written to {prefix}.*")
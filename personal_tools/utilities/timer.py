@@ -0,0 +1,449 @@
+"""
+This module contains the class to measure and manipulate the time taken by a code block
+
+Stopwatches only print their time when verbose. Their spans are also recorded,
+aggregated by name and exportable as JSON or Chrome trace events, once recording
+is enabled with `recorder.enabled = True` or these environment variables:
+
+- TOOLBOX_TIMER=1: record spans and print a summary at exit
+- TOOLBOX_TIMER_TRACE=<path>: record spans and write a Chrome trace at exit
+"""
+
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+TIMER_ENV = "TOOLBOX_TIMER"
+TIMER_TRACE_ENV = "TOOLBOX_TIMER_TRACE"
+
+# Histogram buckets grow by 2^(1/8), so percentiles are within about 9%
+BUCKETS_PER_DOUBLING = 8
+
+# Name of the innermost span of the current thread or asyncio task
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    """
+    Histogram of durations on a logarithmic scale, with constant memory
+    """
+
+    def __init__(self):
+        """
+        Initialize Histogram class
+        """
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, duration_ns: int):
+        """
+        Add a duration
+
+        :param duration_ns: Duration in nanoseconds
+        """
+        bucket = int(math.log2(max(duration_ns, 1)) * BUCKETS_PER_DOUBLING)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+
+    def percentile(self, percent: float) -> float:
+        """
+        Get an approximate percentile of durations
+
+        :param percent: Percentile from 0 to 100
+        :return: Duration in nanoseconds
+        """
+        if not self.count:
+            return 0.0
+
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for bucket in sorted(self.buckets):
+            cumulative += self.buckets[bucket]
+            if cumulative >= rank:
+                # Middle of bucket on the logarithmic scale
+                duration = 2 ** ((bucket + 0.5) / BUCKETS_PER_DOUBLING)
+                return min(max(duration, self.min_ns), self.max_ns)
+
+        return float(self.max_ns)
+
+    def to_dict(self) -> dict:
+        """
+        Get statistics of durations
+
+        :return: Count, and total, mean, min, max and percentiles in milliseconds
+        """
+        return {
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "mean_ms": self.total_ns / max(self.count, 1) / 1e6,
+            "min_ms": (self.min_ns or 0) / 1e6,
+            "p50_ms": self.percentile(50) / 1e6,
+            "p95_ms": self.percentile(95) / 1e6,
+            "p99_ms": self.percentile(99) / 1e6,
+            "max_ms": self.max_ns / 1e6,
+        }
+
+
+class Recorder:
+    """
+    Recorder of spans measured by stopwatches, shared by all threads
+    """
+
+    def __init__(self, max_spans: int = 100_000):
+        """
+        Initialize Recorder class
+
+        :param max_spans: Number of latest spans kept for export.
+            Histograms always count all spans.
+        """
+        self.enabled = False
+        self.histograms: Dict[str, Histogram] = {}
+        self.spans = deque(maxlen=max_spans)
+
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        parent: Optional[str],
+        start_ns: int,
+        duration_ns: int,
+        track: int,
+    ):
+        """
+        Record a span
+
+        :param name: Name of span
+        :param parent: Name of the span containing it
+        :param start_ns: Start time from time.perf_counter_ns()
+        :param duration_ns: Duration in nanoseconds
+        :param track: ID of the thread or asyncio task running the span
+        """
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].add(duration_ns)
+
+            self.spans.append((name, parent, start_ns, duration_ns, os.getpid(), track))
+
+    def merge(self, spans: List[tuple]):
+        """
+        Add spans recorded by another process, see call_recorded()
+
+        :param spans: Spans as stored in the spans attribute
+        """
+        with self._lock:
+            for span in spans:
+                name, duration_ns = span[0], span[3]
+                if name not in self.histograms:
+                    self.histograms[name] = Histogram()
+                self.histograms[name].add(duration_ns)
+
+                self.spans.append(span)
+
+    def reset(self):
+        """
+        Remove all recorded spans
+        """
+        with self._lock:
+            self.histograms.clear()
+            self.spans.clear()
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        Get statistics of spans by name
+
+        :return: Dictionary of name: statistics, slowest in total first
+        """
+        with self._lock:
+            stats = {name: hist.to_dict() for name, hist in self.histograms.items()}
+
+        return dict(sorted(stats.items(), key=lambda item: -item[1]["total_ms"]))
+
+    def export_json(self, path: Union[str, Path]):
+        """
+        Write statistics and spans to a JSON file
+
+        :param path: Path of JSON file
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        data = {
+            "stats": self.get_stats(),
+            "spans": [
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": start_ns / 1e6,
+                    "duration_ms": duration_ns / 1e6,
+                    "pid": pid,
+                    "track": track,
+                }
+                for name, parent, start_ns, duration_ns, pid, track in spans
+            ],
+        }
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+
+    def export_chrome_trace(self, path: Union[str, Path]):
+        """
+        Write spans to a file of Chrome trace events,
+        to open in chrome://tracing or https://ui.perfetto.dev
+
+        :param path: Path of trace file
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start_ns / 1e3,
+                "dur": duration_ns / 1e3,
+                "pid": pid,
+                "tid": track,
+                "args": {"parent": parent},
+            }
+            for name, parent, start_ns, duration_ns, pid, track in spans
+        ]
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def print_summary(self):
+        """
+        Print statistics of spans by name
+        """
+        print(
+            f"{'Span':<40} {'Count':>8} {'Total ms':>12} "
+            f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+        )
+        for name, stats in self.get_stats().items():
+            print(
+                f"{name[:40]:<40} {stats['count']:>8} {stats['total_ms']:>12.2f} "
+                f"{stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                f"{stats['p99_ms']:>10.3f}"
+            )
+
+
+# Recorder of all stopwatches
+recorder = Recorder()
+
+
+def _get_track() -> int:
+    """
+    Get ID of the current asyncio task, or of the current thread outside tasks
+
+    :return: ID of track
+    """
+    # Checking the running loop first is much faster than catching an error
+    # pylint: disable-next=protected-access
+    task = asyncio.current_task() if asyncio._get_running_loop() else None
+
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Stopwatch:
+    """
+    Class to measure the time taken by a code block to execute and log it
+
+    For example:
+
+    with Stopwatch(desc="Sleep", verbose=True):
+        time.sleep(2)
+
+    It also measures each call of a function, sync or async, as a decorator:
+
+    @Stopwatch(desc="Download", verbose=False)
+    async def download(url):
+        ...
+    """
+
+    def __init__(self, desc=None, verbose=True):
+        self.desc = desc
+        self.verbose = verbose
+
+        self.start_time = None
+        self.elapsed_ns = None
+
+        self._parent = None
+        self._token = None
+
+    def __enter__(self):
+        if recorder.enabled:
+            self._parent = _current_span.get()
+            self._token = _current_span.set(self.desc)
+
+        self.start_time = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed_ns = time.perf_counter_ns() - self.start_time
+
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+
+            recorder.add(
+                self.desc or "",
+                self._parent,
+                self.start_time,
+                self.elapsed_ns,
+                _get_track(),
+            )
+
+        if self.verbose:
+            description = self.desc
+
+            log_list = []
+
+            if description:
+                log_list.append(description)
+            log_list.append(f"Exec time {self.elapsed_ns / 1e6:.3f} ms")
+
+            print(". ".join(log_list))
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.__exit__(exc_type, exc_value, traceback)
+
+    def __call__(self, func):
+        """
+        Measure each call of a function with a new stopwatch.
+        Without recording and printing, the function is called directly.
+
+        :param func: Function or coroutine function
+        :return: Wrapped function
+        """
+        desc = self.desc or func.__qualname__
+        verbose = self.verbose
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not (recorder.enabled or verbose):
+                    return await func(*args, **kwargs)
+
+                with Stopwatch(desc, verbose):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (recorder.enabled or verbose):
+                return func(*args, **kwargs)
+
+            with Stopwatch(desc, verbose):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def call_recorded(func: Callable, *args, **kwargs) -> Tuple[object, List[tuple]]:
+    """
+    Call a function in a worker process, returning the spans it recorded with its
+    result, so the main process can add them with recorder.merge().
+    If the function fails, its spans are attached to the exception raised,
+    see get_failed_spans().
+
+    :param func: Function to call
+    :param args: Positional arguments of function
+    :param kwargs: Keyword arguments of function
+    :return: Tuple of result of function and recorded spans
+    """
+    if not recorder.enabled:
+        return func(*args, **kwargs), []
+
+    # Spans of previous calls were already returned
+    recorder.reset()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as exception:
+        # Attributes of exceptions are pickled with them back to the main process
+        exception.recorded_spans = list(recorder.spans)
+        raise
+
+    return result, list(recorder.spans)
+
+
+def get_failed_spans(exception: BaseException) -> List[tuple]:
+    """
+    Get spans recorded by a call of call_recorded() which raised an exception
+
+    :param exception: Exception raised by the call
+    :return: Recorded spans, empty if none were attached
+    """
+    return getattr(exception, "recorded_spans", [])
+
+
+def _report_at_exit():
+    """
+    Print or export recorded spans, as configured by environment variables
+    """
+    if os.environ.get(TIMER_ENV):
+        recorder.print_summary()
+
+    if os.environ.get(TIMER_TRACE_ENV):
+        recorder.export_chrome_trace(os.environ[TIMER_TRACE_ENV])
+        print(f"Chrome trace written to {os.environ[TIMER_TRACE_ENV]}")
+
+
+if os.environ.get(TIMER_ENV) or os.environ.get(TIMER_TRACE_ENV):
+    recorder.enabled = True
+
+    # Worker processes give their spans to the main process instead
+    if multiprocessing.parent_process() is None:
+        atexit.register(_report_at_exit)
+
+
+# class TimeDeceleration:
+#     """
+#     Class to slow down the execution of a code block by adding a delay between each line of code
+#
+#     For example: (Remove the backslashes before the quotes)
+#
+#     with TimeDeceleration(delay=0.5) as td:
+#         td(\"""
+#         print("Hello")
+#         print("World")
+#         \""")
+#     """
+#     def __init__(self, delay=0.5):
+#         self.delay = delay
+#
+#     def __enter__(self):
+#         return self
+#
+#     def __exit__(self, exc_type, exc_value, traceback):
+#         pass
+#
+#     def __call__(self, code_block):
+#         lines = code_block.strip().split('\n')
+#         for line in lines:
+#             eval(line)
+#             time.sleep(self.delay)
@@ -0,0 +1,154 @@
+"""
+Parser of mbasic Facebook pages, working on HTML from any client
+"""
+
+import json
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import lxml.html
+
+# Posts of mbasic pages, without the posts they share
+POST_XPATH = "//article[not(ancestor::article)]"
+
+# Link to the next page of posts, on groups, pages and profiles
+NEXT_PAGE_XPATH = (
+    "//div[@id='m_more_item']//a"
+    " | //a[contains(translate(string(.), 'SEMOP', 'semop'), 'see more posts')]"
+)
+
+# Parts of posts
+AUTHOR_SELECTOR = "header h3 a, h3 strong a"
+TIME_SELECTOR = "abbr"
+TEXT_SELECTOR = 'div[data-ft=\'{"tn":"*s"}\']'
+LINK_SELECTOR = "a[href]"
+IMAGE_SELECTOR = "a img"
+
+# Parts of URL of pages which only work in a browser
+BROWSER_ONLY_PATHS = ["/checkpoint/", "/login"]
+
+# Texts of pages shown when Facebook blocks an account for a while
+BLOCKED_TEXTS = [
+    "temporarily blocked",
+    "you can't use this feature right now",
+]
+
+# Text of a page outside its posts, where Facebook shows a block
+PAGE_TEXT_XPATH = "//text()[not(ancestor::article)][not(ancestor::script)]"
+
+
+def needs_browser(html: str, url: str) -> bool:
+    """
+    Check if a page fetched without browser cannot be parsed,
+    like security checkpoints or the login form shown once the session is lost
+
+    :param html: HTML of page
+    :param url: URL of page, after redirects
+    :return: True if the page must be opened in a browser instead
+    """
+    if any(path in url for path in BROWSER_ONLY_PATHS):
+        return True
+
+    # Every content page of mbasic is inside #root
+    return 'id="root"' not in html
+
+
+def is_blocked(html: str, url: str) -> bool:
+    """
+    Check if a page means that Facebook blocked the scraper,
+    with a security checkpoint or a temporary block
+
+    :param html: HTML of page
+    :param url: URL of page, after redirects
+    :return: True if blocked
+    """
+    if "/checkpoint/" in url:
+        return True
+
+    # Most pages have no blocked text at all, no need to parse them
+    if not any(blocked_text in html.lower() for blocked_text in BLOCKED_TEXTS):
+        return False
+
+    # Posts may talk about blocks too, only the page itself counts
+    document = lxml.html.fromstring(html)
+    text = " ".join(document.xpath(PAGE_TEXT_XPATH)).lower()
+    return any(blocked_text in text for blocked_text in BLOCKED_TEXTS)
+
+
+def parse_page(html: str, url: str, source: str) -> Tuple[List[dict], Optional[str]]:
+    """
+    Parse posts of a page, and the link to its next page
+
+    :param html: HTML of page
+    :param url: URL of page, to resolve relative links
+    :param source: Name of group, page or profile of posts
+    :return: Posts, and URL of next page or None if it is the last page
+    """
+    document = lxml.html.fromstring(html, base_url=url)
+    document.make_links_absolute(url)
+
+    posts = [parse_post(article, source) for article in document.xpath(POST_XPATH)]
+
+    next_links = document.xpath(NEXT_PAGE_XPATH)
+    next_url = next_links[0].get("href") if next_links else None
+
+    return posts, next_url
+
+
+def parse_post(article: lxml.html.HtmlElement, source: str) -> dict:
+    """
+    Parse a post of mbasic Facebook
+
+    :param article: Article element of post
+    :param source: Name of group, page or profile of post
+    :return: Post as a dictionary
+    """
+    try:
+        data_ft = json.loads(article.get("data-ft") or "{}")
+    except json.JSONDecodeError:
+        data_ft = {}
+
+    def get_text(selector: str) -> Optional[str]:
+        found = article.cssselect(selector)
+        return found[0].text_content().strip() if found else None
+
+    post_id = data_ft.get("top_level_post_id", data_ft.get("mf_story_key"))
+
+    links = [link.get("href") for link in article.cssselect(LINK_SELECTOR)]
+    story_urls = [
+        link for link in links if "/story.php" in link or "/permalink/" in link
+    ]
+
+    if any("/video_redirect/" in link for link in links):
+        media = "video"
+    elif any("/photo.php" in link or "/photos/" in link for link in links):
+        media = "photo"
+    elif any("lm.facebook.com/l.php" in link for link in links):
+        media = "link"
+    else:
+        media = "text"
+
+    return {
+        "id": None if post_id is None else str(post_id),
+        "source": source,
+        "url": story_urls[0] if story_urls else None,
+        "author": get_text(AUTHOR_SELECTOR),
+        "time": get_text(TIME_SELECTOR),
+        "text": get_text(TEXT_SELECTOR) or "",
+        "media": media,
+        "images": [image.get("src") for image in article.cssselect(IMAGE_SELECTOR)],
+        "videos": [get_video_url(link) for link in links if "/video_redirect/" in link],
+        "links": [link for link in links if "lm.facebook.com/l.php" in link],
+    }
+
+
+def get_video_url(link: str) -> str:
+    """
+    Get URL of video file from a video link of mbasic Facebook
+
+    :param link: Link to /video_redirect/?src=<URL of video>
+    :return: URL of video, or the link itself if it has no source
+    """
+    sources = parse_qs(urlparse(link).query).get("src")
+
+    return sources[0] if sources else link
@@ -3,16 +3,61 @@ Facebook Scraper
 """
 
 import argparse
+import copy
 import os
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from time import sleep
+from typing import Dict, Generator, Iterator, List, Optional, Tuple, Union
 
+import requests
 from dotenv import load_dotenv
+from selenium import webdriver
 from selenium.webdriver.common.by import By
 
-from personal_tools.web_scraping.utilities.driver import create_driver
+from personal_tools.utilities.profiler import (
+    add_profile_args,
+    profile_from_args,
+)
+from personal_tools.utilities.timer import Stopwatch
+from personal_tools.web_scraping.facebook_parser import (
+    is_blocked,
+    needs_browser,
+    parse_page,
+)
+from personal_tools.web_scraping.post_store import PostStore
+from personal_tools.web_scraping.utilities.checkpoint import CheckpointedJsonl
+from personal_tools.web_scraping.utilities.downloader import MediaDownloader
+from personal_tools.web_scraping.utilities.driver import DRIVER_PROFILES, create_driver
 from personal_tools.web_scraping.utilities.encoding import get_2fa_code
+from personal_tools.web_scraping.utilities.http_client import HttpClient
+from personal_tools.web_scraping.utilities.pool import DriverPool
+from personal_tools.web_scraping.utilities.replay import (
+    REPLAY_KEY_2FA,
+    PageRecorder,
+    ReplayServer,
+)
+from personal_tools.web_scraping.utilities.scheduler import Scheduler
+from personal_tools.web_scraping.utilities.session import load_cookies, save_cookies
+from personal_tools.web_scraping.utilities.wait import Waiter
+
+# Types of targets to scrape posts from
+SOURCES = ["group", "page", "profile"]
+
+# Time in seconds for a page to show an element, before a step fails
+LOAD_TIMEOUT = 15
+
+# Time in seconds to wait for elements which may not appear, like dialogs
+OPTIONAL_TIMEOUT = 3
+
+BASE_URL = "https://mbasic.facebook.com"
+
+
+class BlockedError(Exception):
+    """
+    Facebook blocked the scraper, with a checkpoint or a temporary block
+    """
 
 
 def get_args():
@@ -27,7 +72,6 @@ def get_args():
         "--source",
         type=str,
         help="Source of the data",
-        required=True,
         choices=["group", "page", "profile", "all"],
     )
     parser.add_argument(
@@ -51,7 +95,168 @@ def get_args():
         required=("--source" in ["group", "page", "profile"]),
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--targets",
+        type=str,
+        help="File of targets to scrape instead of --source and --id, "
+        'one "<group|page|profile> <id>" per line',
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of headless browsers scraping targets concurrently",
+    )
+
+    parser.add_argument(
+        "--fetch",
+        type=str,
+        default="http",
+        choices=["http", "browser"],
+        help="How to get pages. 'http' is much faster "
+        "and opens pages in the browser only when needed",
+    )
+
+    parser.add_argument(
+        "--download",
+        action="store_true",
+        help="Download photos and videos of scraped posts, as chosen by --media, "
+        "to the media folder inside the output folder",
+    )
+    parser.add_argument(
+        "--download-per-host",
+        type=int,
+        default=4,
+        help="Maximum number of downloads from the same host at a time",
+    )
+
+    parser.add_argument(
+        "--db",
+        type=str,
+        help="SQLite store of posts, searchable with post_store.py. "
+        "Once a target is fully scraped, next runs only scrape its new posts. "
+        "Default: posts.db in the output folder",
+    )
+    parser.add_argument(
+        "--no-db", action="store_true", help="Do not store posts in SQLite"
+    )
+
+    parser.add_argument(
+        "--driver-profile",
+        type=str,
+        default="default",
+        choices=list(DRIVER_PROFILES),
+        help="Settings of the browsers scraping targets. 'lean' skips "
+        "images, fonts, styles and media, loading pages faster with less memory, "
+        "in a headless browser even with one worker. "
+        "The browser used to login always shows pages fully",
+    )
+
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=30,
+        help="Maximum pages per minute of the account, 0 for no limit. "
+        "Rate is halved, with a pause, each time Facebook blocks the scraper",
+    )
+    parser.add_argument(
+        "--source-rate",
+        type=float,
+        default=None,
+        help="Maximum pages per minute of each type of target, same as --rate if not set",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="Time in minutes for each target. Unfinished targets resume on the next run",
+    )
+
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Scrape targets again from their first page, replacing their output "
+        "and checkpoint, even if they were fully scraped",
+    )
+
+    # Session
+    parser.add_argument(
+        "--session",
+        type=str,
+        default="./.facebook_session",
+        help="Encrypted file to save the login session to, and reuse it from",
+    )
+    parser.add_argument(
+        "--no-session",
+        action="store_true",
+        help="Always login, and logout at the end instead of saving the session",
+    )
+
+    # Offline runs
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument(
+        "--record",
+        type=str,
+        help="Folder to record visited pages to, to replay them offline later",
+    )
+    replay_group.add_argument(
+        "--replay",
+        type=str,
+        help="Folder of recorded pages to scrape instead of Facebook, "
+        "without credentials or network",
+    )
+
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+    if not args.targets and not (args.source and args.id):
+        parser.error("--source and --id, or --targets, are required")
+
+    return args
+
+
+def read_targets(path: str) -> List[Tuple[str, str]]:
+    """
+    Read targets to scrape from a file
+
+    :param path: Path of file, with one "<group|page|profile> <id>" per line.
+        Empty lines and lines starting with # are skipped.
+    :return: List of targets as (source, id), without duplicates
+    """
+    targets = []
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            parts = line.split()
+            if len(parts) != 2 or parts[0] not in SOURCES:
+                raise ValueError(f"Invalid target at line {line_number}: {line}")
+
+            if tuple(parts) not in targets:
+                targets.append(tuple(parts))
+
+    return targets
+
+
+def get_media_urls(post: dict, media_types: list) -> List[str]:
+    """
+    Get URLs of media files of a post to download
+
+    :param post: Post as parsed by parse_page()
+    :param media_types: Media types to download, or "all"
+    :return: URLs of images and videos
+    """
+    urls = []
+
+    if "all" in media_types or "photo" in media_types:
+        urls.extend(post["images"])
+    if "all" in media_types or "video" in media_types:
+        urls.extend(post["videos"])
+
+    return urls
 
 
 class FacebookScraper:
@@ -59,12 +264,56 @@ class FacebookScraper:
     Facebook Scraper
     """
 
-    def __init__(self, username: str, password: str, key_2fa: str):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        key_2fa: str,
+        session_file: Optional[str] = None,
+        driver_profile: str = "default",
+        base_url: str = BASE_URL,
+        recorder: Optional[PageRecorder] = None,
+        headless: bool = False,
+    ):
+        """
+        Initialize FacebookScraper class, reusing the saved session if still valid
+
+        :param username: Username of account
+        :param password: Password of account
+        :param key_2fa: Key to generate 2FA codes of account
+        :param session_file: Encrypted file of saved session, no session if None
+        :param driver_profile: Name of driver profile of the drivers scraping
+            targets, see DRIVER_PROFILES. The main driver, used to login and solve
+            checkpoints, always uses the default profile, so other profiles scrape
+            with headless drivers even with one worker.
+        :param base_url: URL of mbasic Facebook, or of a replay server
+        :param recorder: Recorder of visited pages, to replay them offline
+        :param headless: Whether to hide the main driver, when no one has to
+            see it, like when replaying a recording
+        """
         self.output_folder = None
-        self.web_driver = create_driver(headless=False, detach=False)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.driver_profile = driver_profile
+        self.web_driver = create_driver(headless=headless, detach=False)
+        self.wait = Waiter(self.web_driver, timeout=LOAD_TIMEOUT)
 
-        self.login(username, password, key_2fa)
+        self.downloader: Optional[MediaDownloader] = None
+        self.scheduler: Optional[Scheduler] = None
+        self.store: Optional[PostStore] = None
+        self.restart = False
+        self.http: Optional[HttpClient] = None
+        self.pool: Optional[DriverPool] = None
 
+        self.session_file = session_file
+        # Only the owner of the account can decrypt its session
+        self._session_secret = f"{username}:{password}:{key_2fa}"
+
+        if not self.restore_session():
+            self.login(username, password, key_2fa)
+            self.save_session()
+
+    @Stopwatch(desc="facebook.login", verbose=False)
     def login(self, username: str, password: str, key_2fa: str):
         """
         Login to Facebook
@@ -72,87 +321,133 @@ class FacebookScraper:
         print("\nLogin...")
 
         # Open Facebook login page
-        sleep(1)
-        self.web_driver.get("https://mbasic.facebook.com/login")
+        self.web_driver.get(f"{self.base_url}/login")
 
         # Input username
-        sleep(1)  # Wait for page load
-        user_name_element = self.web_driver.find_elements(
-            By.CSS_SELECTOR, "#m_login_email"
-        )
-        user_name_element[0].send_keys(username)
+        user_name_element = self.wait.element(By.CSS_SELECTOR, "#m_login_email")
+        self.record_page(f"{self.base_url}/login")
+        user_name_element.send_keys(username)
 
         # Input password
-        sleep(1)  # Wait for robot check
-        password_element = self.web_driver.find_elements(
+        password_element = self.wait.element(
             By.CSS_SELECTOR, "#login_form > ul > li:nth-child(2) > section > input"
         )
-        password_element[0].send_keys(password)
+        password_element.send_keys(password)
 
         # Click submit button
-        sleep(1)  # Wait for robot check
-        btn_submit = self.web_driver.find_elements(
-            By.CSS_SELECTOR, "#login_form > ul > li:nth-child(3) > input"
+        btn_submit = self.wait.element(
+            By.CSS_SELECTOR,
+            "#login_form > ul > li:nth-child(3) > input",
+            clickable=True,
         )
-        btn_submit[0].click()
+        self.wait.click(btn_submit)
 
         # Input 2fa code
-        code_2fa = get_2fa_code(key_2fa)
-        sleep(1)  # Wait for robot check
-        code_2fa_element = self.web_driver.find_elements(
-            By.CSS_SELECTOR, "#approvals_code"
-        )
-        code_2fa_element[0].send_keys(code_2fa)
+        code_2fa_element = self.wait.element(By.CSS_SELECTOR, "#approvals_code")
+        self.record_page()
+        code_2fa_element.send_keys(get_2fa_code(key_2fa))
 
         # Click submit button
-        sleep(1)  # Wait for robot check
-        btn_submit = self.web_driver.find_elements(
-            By.CSS_SELECTOR, "#checkpointSubmitButton-actual-button"
+        btn_submit = self.wait.element(
+            By.CSS_SELECTOR, "#checkpointSubmitButton-actual-button", clickable=True
         )
-        btn_submit[0].click()
+        self.wait.click(btn_submit)
 
-        # Do not save login info
-        sleep(1)  # Wait for new page load
-        btn_do_not_save_login_info = self.web_driver.find_elements(
+        # Do not save login info, if asked
+        btn_do_not_save_login_info = self.wait.optional_element(
             By.XPATH,
             '//*[starts-with(@id, "u_0_")]/section/section[2]/div[2]/div/div[2]/label',
+            timeout=OPTIONAL_TIMEOUT,
         )
-        if len(btn_do_not_save_login_info) > 0:
-            btn_do_not_save_login_info[0].click()
-        btn_continue = self.web_driver.find_elements(
-            By.XPATH, '//*[@id="checkpointSubmitButton-actual-button"]'
-        )
-        if len(btn_continue) > 0:
-            btn_continue[0].click()
+        if btn_do_not_save_login_info is not None:
+            self.record_page()
+            btn_do_not_save_login_info.click()
+
+            btn_continue = self.wait.optional_element(
+                By.XPATH,
+                '//*[@id="checkpointSubmitButton-actual-button"]',
+                timeout=OPTIONAL_TIMEOUT,
+            )
+            if btn_continue is not None:
+                self.wait.click(btn_continue)
 
         # # Skip save login info
-        # sleep(1)  # Wait for new page load
-        # btn_skip_save_login_info = self.web_driver.find_elements(
+        # btn_skip_save_login_info = self.wait.optional_element(
         #     By.XPATH, '//*[@id="root"]/table/tbody/tr/td/div/div[3]/a'
         # )
-        # if len(btn_skip_save_login_info) > 0:
-        #     btn_skip_save_login_info[0].click()
+        # if btn_skip_save_login_info is not None:
+        #     btn_skip_save_login_info.click()
 
+        self.record_page()
         print("Login success")
 
+    def record_page(self, url: Optional[str] = None):
+        """
+        Record the page open in the browser, if recording
+
+        :param url: URL requested, the current URL if None
+        """
+        if self.recorder is None:
+            return
+
+        current_url = self.web_driver.current_url
+        self.recorder.record(
+            url or current_url, self.web_driver.page_source, current_url
+        )
+
+    def restore_session(self) -> bool:
+        """
+        Restore the saved session, and check if it is still logged in
+
+        :return: True if logged in with the saved session
+        """
+        if self.session_file is None or not Path(self.session_file).exists():
+            return False
+
+        print("\nRestore session...")
+
+        # Cookies can only be added to the site currently open
+        self.web_driver.get(f"{self.base_url}/")
+        if not load_cookies(self.web_driver, self.session_file, self._session_secret):
+            print("No valid cookies in saved session")
+            return False
+
+        if self.is_login():
+            print("Session restored")
+            return True
+
+        print("Session expired")
+        self.web_driver.delete_all_cookies()
+        return False
+
+    def save_session(self):
+        """
+        Save the current session, to skip login on the next run
+        """
+        if self.session_file is None:
+            return
+
+        save_cookies(self.web_driver, self.session_file, self._session_secret)
+        print(f"Session saved to {self.session_file}")
+
     def logout(self):
         """
         Logout Facebook
         """
         print("\nLogout...")
-        btn_logout = self.web_driver.find_elements(
-            By.XPATH, '//*[@id="mbasic_logout_button"]'
+        btn_logout = self.wait.optional_element(
+            By.XPATH, '//*[@id="mbasic_logout_button"]', timeout=OPTIONAL_TIMEOUT
         )
-        if len(btn_logout) > 0:
-            sleep(1)  # Wait for new page load
-            btn_logout[0].click()
+        if btn_logout is not None:
+            self.wait.click(btn_logout)
 
-            btn_logout_confirm = self.web_driver.find_elements(
-                By.XPATH, '//*[@id="root"]/table/tbody/tr/td/div/form[2]'
+            btn_logout_confirm = self.wait.optional_element(
+                By.XPATH,
+                '//*[@id="root"]/table/tbody/tr/td/div/form[2]',
+                timeout=OPTIONAL_TIMEOUT,
             )
-            if len(btn_logout_confirm) > 0:
-                sleep(1)  # Wait for new page load
-                btn_logout_confirm[0].click()
+            if btn_logout_confirm is not None:
+                btn_logout_confirm.click()
                 print("\nLogout success")
             else:
                 print("No logout confirm button")
@@ -165,16 +460,56 @@ class FacebookScraper:
         Check if the user is logged in
         """
         try:
-            sleep(1)
-            self.web_driver.get("https://mbasic.facebook.com/")
-            element_live = self.web_driver.find_elements(By.NAME, "view_post")
-            return bool(len(element_live) > 0)
+            self.web_driver.get(f"{self.base_url}/")
+
+            # Home page shows posts if logged in, the login form otherwise
+            index, _ = self.wait.first_of(
+                (By.NAME, "view_post"), (By.CSS_SELECTOR, "#m_login_email")
+            )
+            self.record_page(f"{self.base_url}/")
+            return index == 0
         except Exception as exception:
             print("View Facebook post error")
             print(exception)
             print(traceback.format_exc())
             return False
 
+    def with_driver(self, web_driver: webdriver) -> "FacebookScraper":
+        """
+        Get a copy of this scraper using another driver, sharing its storage
+
+        :param web_driver: The driver to use, already logged in
+        :return: Scraper using the driver
+        """
+        scraper = copy.copy(self)
+        scraper.web_driver = web_driver
+        scraper.wait = Waiter(web_driver, timeout=LOAD_TIMEOUT)
+        scraper.pool = None
+
+        return scraper
+
+    def with_http(self, pool: DriverPool) -> "FacebookScraper":
+        """
+        Get a copy of this scraper with its own HTTP client, sharing its storage.
+        Pages needing a browser are opened by a driver of the pool.
+
+        :param pool: Pool of drivers, already logged in
+        :return: Scraper using the HTTP client
+        """
+        scraper = copy.copy(self)
+        scraper.http = self.http.copy()
+        scraper.pool = pool
+
+        return scraper
+
+    def use_http(self):
+        """
+        Fetch pages over HTTP with the session of the driver, instead of loading
+        them in the browser. mbasic pages are rendered by the server, so this
+        skips the browser for almost every page.
+        """
+        self.http = HttpClient.from_driver(self.web_driver)
+
     def set_storage(self, output_folder: str):
         """
         Set storage for scraped data
@@ -182,75 +517,509 @@ class FacebookScraper:
         self.output_folder = output_folder
         Path(output_folder).mkdir(parents=True, exist_ok=True)
 
-    def scrape_group(self, group_id: str, max_posts: int, media_types: list):
+    def scrape_group(
+        self,
+        group_id: str,
+        max_posts: int,
+        media_types: list,
+        deadline: Optional[float] = None,
+    ) -> Iterator[dict]:
         """
         Scrape posts from a group
+
+        :param group_id: ID of group
+        :param max_posts: Maximum number of posts to scrape
+        :param media_types: Media types of posts to keep, or "all"
+        :param deadline: Time from time.monotonic() to stop at, see scrape_posts()
+        :return: Iterator of posts, see scrape_posts()
         """
         print(f"\nScrape group {group_id}...")
 
-        # Open group site
-        self.web_driver.get(f"https://mbasic.facebook.com/groups/{group_id}")
-
-        # Scrape posts
-        self.scrape_posts(max_posts, media_types)
+        return self.scrape_posts(
+            f"{self.base_url}/groups/{group_id}",
+            f"group_{group_id}",
+            max_posts,
+            media_types,
+            source="group",
+            deadline=deadline,
+        )
 
-    def scrape_page(self, page_id: str, max_posts: int, media_types: list):
+    def scrape_page(
+        self,
+        page_id: str,
+        max_posts: int,
+        media_types: list,
+        deadline: Optional[float] = None,
+    ) -> Iterator[dict]:
         """
         Scrape posts from a page
+
+        :param page_id: ID of page
+        :param max_posts: Maximum number of posts to scrape
+        :param media_types: Media types of posts to keep, or "all"
+        :param deadline: Time from time.monotonic() to stop at, see scrape_posts()
+        :return: Iterator of posts, see scrape_posts()
         """
         print(f"\nScrape page {page_id}...")
 
-        # Open page site
-        self.web_driver.get(f"https://mbasic.facebook.com/{page_id}")
-
-        # Scrape posts
-        self.scrape_posts(max_posts, media_types)
+        return self.scrape_posts(
+            f"{self.base_url}/{page_id}",
+            f"page_{page_id}",
+            max_posts,
+            media_types,
+            source="page",
+            deadline=deadline,
+        )
 
-    def scrape_profile(self, profile_id: str, max_posts: int, media_types: list):
+    def scrape_profile(
+        self,
+        profile_id: str,
+        max_posts: int,
+        media_types: list,
+        deadline: Optional[float] = None,
+    ) -> Iterator[dict]:
         """
         Scrape posts from a profile
+
+        :param profile_id: ID of profile
+        :param max_posts: Maximum number of posts to scrape
+        :param media_types: Media types of posts to keep, or "all"
+        :param deadline: Time from time.monotonic() to stop at, see scrape_posts()
+        :return: Iterator of posts, see scrape_posts()
         """
         print(f"\nScrape profile {profile_id}...")
 
-        # Open profile site
-        self.web_driver.get(f"https://mbasic.facebook.com/{profile_id}")
+        return self.scrape_posts(
+            f"{self.base_url}/{profile_id}",
+            f"profile_{profile_id}",
+            max_posts,
+            media_types,
+            source="profile",
+            deadline=deadline,
+        )
+
+    def scrape_target(
+        self,
+        source: str,
+        target_id: str,
+        max_posts: int,
+        media_types: list,
+        budget: Optional[float] = None,
+    ) -> int:
+        """
+        Scrape posts of a group, page or profile
+
+        :param source: "group", "page" or "profile"
+        :param target_id: ID of group, page or profile
+        :param max_posts: Maximum number of posts to scrape
+        :param media_types: Media types of posts to keep, or "all"
+        :param budget: Time in seconds for this target, unlimited if None.
+            Once spent, the target stops and can be resumed by another run.
+        :return: Number of posts scraped by this run
+        """
+        scrape_functions = {
+            "group": self.scrape_group,
+            "page": self.scrape_page,
+            "profile": self.scrape_profile,
+        }
+
+        count = 0
+
+        # Posts are written to storage while iterating
+        deadline = None if budget is None else time.monotonic() + budget
+
+        posts = scrape_functions[source](target_id, max_posts, media_types, deadline)
+        for post in posts:
+            count += 1
+
+            # Files are downloaded in the background while scraping goes on
+            if self.downloader is not None:
+                self.downloader.submit(post["id"], get_media_urls(post, media_types))
+
+        return count
+
+    def scrape_targets(
+        self,
+        targets: List[Tuple[str, str]],
+        max_posts: int,
+        media_types: list,
+        workers: int = 1,
+        budget: Optional[float] = None,
+    ) -> Dict[Tuple[str, str], Union[int, Exception]]:
+        """
+        Scrape posts of many targets. With several workers, or a driver profile
+        other than the default one, targets are scraped by a pool of headless
+        drivers sharing the session of this one, concurrently with several workers.
+
+        :param targets: Targets as (source, id)
+        :param max_posts: Maximum number of posts to scrape for each target
+        :param media_types: Media types of posts to keep, or "all"
+        :param workers: Number of drivers scraping at the same time
+        :param budget: Time in seconds for each target, unlimited if None
+        :return: Dictionary of target: number of posts scraped, or error raised
+        """
+        results = {}
+
+        # The main driver scrapes alone only with the profile it was created with
+        if workers <= 1 and self.driver_profile == "default":
+            for source, target_id in targets:
+                try:
+                    results[(source, target_id)] = self.scrape_target(
+                        source, target_id, max_posts, media_types, budget
+                    )
+                except Exception as exception:  # pylint: disable=broad-except
+                    print(f"Failed to scrape {source} {target_id}: {exception}")
+                    results[(source, target_id)] = exception
+
+            return results
+
+        # Drivers are not thread-safe, so read cookies once before starting
+        cookies = self.web_driver.get_cookies()
+
+        def create_session_driver() -> webdriver:
+            driver = create_driver(
+                headless=True, detach=False, profile=self.driver_profile
+            )
+            driver.get(f"{self.base_url}/")
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+
+            return driver
+
+        def scrape(source: str, target_id: str) -> int:
+            if self.http is not None:
+                return self.with_http(pool).scrape_target(
+                    source, target_id, max_posts, media_types, budget
+                )
+
+            with pool.driver() as driver:
+                return self.with_driver(driver).scrape_target(
+                    source, target_id, max_posts, media_types, budget
+                )
+
+        workers = max(workers, 1)
+        with DriverPool(create_session_driver, size=workers) as pool:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(scrape, *target): target for target in targets
+                }
+
+                for future in as_completed(futures):
+                    source, target_id = futures[future]
+                    try:
+                        results[(source, target_id)] = future.result()
+                    except Exception as exception:  # pylint: disable=broad-except
+                        print(f"Failed to scrape {source} {target_id}: {exception}")
+                        results[(source, target_id)] = exception
+
+        return results
+
+    @Stopwatch(desc="facebook.fetch_page", verbose=False)
+    def fetch_page(self, url: str, source: str = "page") -> Tuple[str, str]:
+        """
+        Get HTML of a page at the rate allowed by the scheduler
+
+        :param url: URL of page
+        :param source: Type of target of page, for the scheduler
+        :return: HTML of page, and URL of page after redirects
+        :raises BlockedError: If Facebook blocks the scraper
+        """
+        if self.scheduler is not None:
+            self.scheduler.acquire(source)
+
+        html, page_url = self.fetch_page_once(url)
+        if self.recorder is not None:
+            self.recorder.record(url, html, page_url)
 
-        # Scrape posts
-        self.scrape_posts(max_posts, media_types)
+        blocked = is_blocked(html, page_url)
+        if self.scheduler is not None:
+            self.scheduler.report(source, blocked)
+        if blocked:
+            raise BlockedError(f"Blocked by Facebook at {page_url}")
 
-    def scrape_posts(self, max_posts: int, media_types: list):
-        """Scrape posts from the current page"""
+        return html, page_url
+
+    def fetch_page_once(self, url: str) -> Tuple[str, str]:
+        """
+        Get HTML of a page, over HTTP if enabled, or in the browser when the page
+        only works there, like security checkpoints
+
+        :param url: URL of page
+        :return: HTML of page, and URL of page after redirects
+        """
+        if self.http is not None:
+            try:
+                html, page_url = self.http.get(url)
+                if not needs_browser(html, page_url):
+                    return html, page_url
+            except requests.RequestException as exception:
+                print(f"HTTP request failed, use browser: {exception}")
+
+        if self.pool is not None:
+            with self.pool.driver() as driver:
+                return self.with_driver(driver).fetch_page_in_browser(url)
+
+        return self.fetch_page_in_browser(url)
+
+    def fetch_page_in_browser(self, url: str) -> Tuple[str, str]:
+        """
+        Get HTML of a page loaded in the browser
+
+        :param url: URL of page
+        :return: HTML of page, and URL of page after redirects
+        """
+        self.web_driver.get(url)
+        self.wait.element(By.ID, "root")
+
+        return self.web_driver.page_source, self.web_driver.current_url
+
+    def scrape_posts(
+        self,
+        url: str,
+        name: str,
+        max_posts: int,
+        media_types: list,
+        source: str = "page",
+        deadline: Optional[float] = None,
+    ) -> Iterator[dict]:
+        """
+        Scrape posts page by page, following the "See more posts" links.
+        Posts are appended to <name>.jsonl in the storage folder, flushed after
+        each page with a checkpoint of where to continue, so a run stopped midway
+        resumes where it stopped.
+
+        With a post store, posts already stored are skipped. Once the target has
+        stored posts, each run first scrapes its new posts from the first page,
+        stopping at the first page ending with a stored post, then resumes the
+        older posts from the checkpoint.
+
+        :param url: URL of the first page of posts
+        :param name: Name of output file
+        :param max_posts: Maximum number of posts to scrape, including the ones
+            scraped by previous runs, or of posts of this run with a post store
+        :param media_types: Media types of posts to keep, or "all"
+        :param source: Type of target of posts, for the scheduler
+        :param deadline: Time from time.monotonic() to stop at, after the current
+            page. The checkpoint lets the next run continue.
+        :return: Iterator of posts scraped by this run
+        """
+        assert self.output_folder is not None, "Call set_storage() first."
+
+        with CheckpointedJsonl(
+            Path(self.output_folder) / f"{name}.jsonl", restart=self.restart
+        ) as writer:
+            if self.store is not None:
+                limit = writer.count + max_posts
+
+                if writer.done or self.store.count(name) > 0:
+                    print(f"Look for new posts of {name}")
+                    stopped = yield from self.scrape_feed(
+                        writer, url, 0, name, media_types, source, limit, deadline
+                    )
+                    if stopped or writer.done:
+                        return
+            else:
+                limit = max_posts
+
+                if writer.done or writer.count >= limit:
+                    print(
+                        f"Already scraped {writer.count} posts of {name}, "
+                        f"use --restart to scrape them again"
+                    )
+                    return
+
+            if writer.cursor is not None:
+                print(f"Resume after {writer.count} posts")
+
+            yield from self.scrape_feed(
+                writer,
+                writer.cursor or url,
+                writer.skip,
+                name,
+                media_types,
+                source,
+                limit,
+                deadline,
+                backfill=True,
+            )
+
+    def scrape_feed(
+        self,
+        writer: CheckpointedJsonl,
+        next_url: str,
+        skip: int,
+        name: str,
+        media_types: list,
+        source: str,
+        limit: int,
+        deadline: Optional[float],
+        backfill: bool = False,
+    ) -> Generator[dict, None, bool]:
+        """
+        Scrape posts of a feed from a page, for scrape_posts()
+
+        :param writer: Output of posts, with its checkpoint
+        :param next_url: URL of page to start from
+        :param skip: Number of posts of the first page already handled
+        :param name: Name of group, page or profile of posts
+        :param media_types: Media types of posts to keep, or "all"
+        :param source: Type of target of posts, for the scheduler
+        :param limit: Number of posts in the output to stop at
+        :param deadline: Time from time.monotonic() to stop at
+        :param backfill: Whether to scrape older posts down to the end of the feed,
+            saving where to continue in the checkpoint. Otherwise only new posts
+            are scraped, down to the first page ending with a stored post.
+        :return: Iterator of posts, returning True if stopped by the limit
+            or the deadline
+        """
+        while next_url is not None:
+            if writer.count >= limit:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"Time budget of {name} spent, stop after {writer.count} posts")
+                return True
+
+            page_request_url = next_url
+            html, page_url = self.fetch_page(page_request_url, source)
+            posts, next_url = parse_page(html, page_url, name)
+
+            # Skip posts of the page handled before the run stopped midway
+            candidates = [
+                (index, post)
+                for index, post in enumerate(posts)
+                if index >= skip
+                and ("all" in media_types or post["media"] in media_types)
+            ]
+            skip = 0
+
+            if self.store is not None and candidates:
+                is_new = self.store.is_new([post for _, post in candidates])
+                # Pinned posts come first, so only the last post tells
+                # whether the rest of the feed is already stored
+                if not backfill and not is_new[-1]:
+                    next_url = None
+                candidates = [item for item, new in zip(candidates, is_new) if new]
+
+            cursor, cursor_skip = next_url, 0
+            written = []
+            for index, post in candidates:
+                if writer.count + writer.pending >= limit:
+                    # Resume from the rest of this page
+                    cursor, cursor_skip = page_request_url, index
+                    break
+
+                writer.write(post)
+                written.append(post)
+                yield post
+
+            if backfill:
+                writer.commit(cursor, done=cursor is None, skip=cursor_skip)
+            else:
+                # New posts do not move the checkpoint of older posts, even when
+                # capped: the new posts left are found again from the first page
+                writer.commit(writer.cursor, done=writer.done, skip=writer.skip)
+
+            # Stored once on disk, so a crash never leaves posts only in the store
+            if self.store is not None:
+                self.store.add_posts(written)
+
+            print(f"Scraped {writer.count} posts")
+
+        return False
 
 
 if __name__ == "__main__":
     args = get_args()
-    load_dotenv(dotenv_path=args.env)
-    assert Path(args.env).exists(), f"File {args.env} does not exist."
 
-    FB_USERNAME = os.getenv("FB_USERNAME")
-    FB_PASSWORD = os.getenv("FB_PASSWORD")
-    FB_KEY_2FA = os.getenv("FB_KEY_2FA")
+    with profile_from_args(args, "facebook_scraper"):
+        replay_server = None
+        if args.replay:
+            # Replayed pages accept any credentials
+            replay_server = ReplayServer(args.replay)
+            replay_server.start()
 
-    # Initialize Facebook Scraper
-    scraper = FacebookScraper(FB_USERNAME, FB_PASSWORD, FB_KEY_2FA)
+            FB_USERNAME, FB_PASSWORD, FB_KEY_2FA = "replay", "replay", REPLAY_KEY_2FA
+        else:
+            load_dotenv(dotenv_path=args.env)
+            assert Path(args.env).exists(), f"File {args.env} does not exist."
 
-    # Set storage
-    scraper.set_storage(args.output)
+            FB_USERNAME = os.getenv("FB_USERNAME")
+            FB_PASSWORD = os.getenv("FB_PASSWORD")
+            FB_KEY_2FA = os.getenv("FB_KEY_2FA")
 
-    # Scrape data
-    if args.source == "all":
-        scraper.scrape_group(args.id, args.max, args.media)
-        scraper.scrape_page(args.id, args.max, args.media)
-        scraper.scrape_profile(args.id, args.max, args.media)
+        # Initialize Facebook Scraper
+        scraper = FacebookScraper(
+            FB_USERNAME,
+            FB_PASSWORD,
+            FB_KEY_2FA,
+            session_file=None if args.no_session or args.replay else args.session,
+            driver_profile=args.driver_profile,
+            base_url=BASE_URL if replay_server is None else replay_server.base_url,
+            recorder=PageRecorder(args.record) if args.record else None,
+            # Replayed pages never need someone to solve a checkpoint
+            headless=bool(args.replay),
+        )
 
-    elif args.source == "group":
-        scraper.scrape_group(args.id, args.max, args.media)
+        # Set storage
+        scraper.set_storage(args.output)
+        scraper.restart = args.restart
 
-    elif args.source == "page":
-        scraper.scrape_page(args.id, args.max, args.media)
+        if args.fetch == "http":
+            scraper.use_http()
 
-    elif args.source == "profile":
-        scraper.scrape_profile(args.id, args.max, args.media)
+        # Scrape data
+        if args.targets:
+            targets = read_targets(args.targets)
+        elif args.source == "all":
+            targets = [(source, args.id) for source in SOURCES]
+        else:
+            targets = [(args.source, args.id)]
+
+        if args.download:
+            scraper.downloader = MediaDownloader(
+                Path(args.output) / "media", per_host=args.download_per_host
+            )
+
+        if not args.no_db:
+            scraper.store = PostStore(args.db or Path(args.output) / "posts.db")
+
+        if args.rate > 0:
+            scraper.scheduler = Scheduler(rate=args.rate, source_rate=args.source_rate)
+
+        try:
+            results = scraper.scrape_targets(
+                targets,
+                args.max,
+                args.media,
+                args.workers,
+                budget=None if args.budget is None else args.budget * 60,
+            )
+        finally:
+            if scraper.downloader is not None:
+                print("\nWait for downloads...")
+                scraper.downloader.close()
+            if scraper.store is not None:
+                scraper.store.close()
+            if scraper.recorder is not None:
+                scraper.recorder.close()
+            if replay_server is not None:
+                replay_server.close()
+
+        print("\n" + "-" * 50)
+        print("SUMMARY")
+        for (source, target_id), result in results.items():
+            if isinstance(result, Exception):
+                print(f"{source} {target_id}: failed, {result}")
+            else:
+                print(f"{source} {target_id}: {result} new posts")
+
+        if scraper.scheduler is not None:
+            print()
+            scraper.scheduler.print_summary()
 
-    # Logout
-    scraper.logout()
+        if args.no_session:
+            # Logout
+            scraper.logout()
+        else:
+            # Keep the session for the next run, with its refreshed cookies
+            scraper.save_session()
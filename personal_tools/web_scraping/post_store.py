@@ -0,0 +1,208 @@
+"""
+SQLite store of scraped posts, with full-text search
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Union
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    key TEXT PRIMARY KEY,
+    id TEXT,
+    source TEXT NOT NULL,
+    url TEXT,
+    author TEXT,
+    time TEXT,
+    text TEXT NOT NULL,
+    media TEXT,
+    data TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_source ON posts (source, scraped_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+    text, author, content='posts', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS posts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, text, author) VALUES (new.rowid, new.text, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, text, author)
+    VALUES ('delete', old.rowid, old.text, old.author);
+END;
+"""
+
+
+def get_args():
+    """
+    Get arguments from command line
+
+    :return: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Search scraped posts")
+    parser.add_argument(
+        "--db", type=str, default="./data/posts.db", help="Path to post store"
+    )
+    parser.add_argument(
+        "--search",
+        type=str,
+        required=True,
+        help='Full-text query, like: word, "exact phrase", word1 OR word2',
+    )
+    parser.add_argument(
+        "--limit", type=int, default=20, help="Maximum number of posts to show"
+    )
+
+    return parser.parse_args()
+
+
+def get_post_key(post: dict) -> str:
+    """
+    Get key of a post in the store: its ID, or its URL, or a hash of its content
+    for posts without any
+
+    :param post: Post as parsed by parse_page()
+    :return: Key of post
+    """
+    if post.get("id"):
+        return post["id"]
+    if post.get("url"):
+        return post["url"]
+
+    content = json.dumps(
+        [post.get("source"), post.get("author"), post.get("time"), post.get("text")]
+    )
+    return "sha1:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class PostStore:
+    """
+    Store of posts in a SQLite database, shared by threads
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Initialize PostStore class
+
+        :param path: Path of database, created if it does not exist
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # Readers do not wait for writers, and commits are cheaper
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the database
+        """
+        self.connection.close()
+
+    def add_posts(self, posts: List[dict]) -> List[bool]:
+        """
+        Add posts not stored yet, in a single transaction
+
+        :param posts: Posts as parsed by parse_page()
+        :return: Whether each post was new
+        """
+        now = time.time()
+        is_new = []
+
+        with self._lock, self.connection:
+            for post in posts:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO posts "
+                    "(key, id, source, url, author, time, text, media, data, scraped_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        get_post_key(post),
+                        post.get("id"),
+                        post["source"],
+                        post.get("url"),
+                        post.get("author"),
+                        post.get("time"),
+                        post.get("text") or "",
+                        post.get("media"),
+                        json.dumps(post, ensure_ascii=False),
+                        now,
+                    ),
+                )
+                is_new.append(cursor.rowcount == 1)
+
+        return is_new
+
+    def is_new(self, posts: List[dict]) -> List[bool]:
+        """
+        Check which posts are not stored yet, without adding them
+
+        :param posts: Posts as parsed by parse_page()
+        :return: Whether each post is new
+        """
+        with self._lock:
+            return [
+                self.connection.execute(
+                    "SELECT 1 FROM posts WHERE key = ?", (get_post_key(post),)
+                ).fetchone()
+                is None
+                for post in posts
+            ]
+
+    def count(self, source: str) -> int:
+        """
+        Count stored posts of a group, page or profile
+
+        :param source: Name of group, page or profile, like "group_<id>"
+        :return: Number of posts
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT COUNT(*) FROM posts WHERE source = ?", (source,)
+            ).fetchone()
+
+        return row[0]
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """
+        Search posts by text and author, best matches first
+
+        :param query: Full-text query in FTS5 syntax
+        :param limit: Maximum number of posts
+        :return: Posts as parsed by parse_page()
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT posts.data FROM posts_fts "
+                "JOIN posts ON posts.rowid = posts_fts.rowid "
+                "WHERE posts_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query, limit),
+            ).fetchall()
+
+        return [json.loads(row["data"]) for row in rows]
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    with PostStore(args.db) as store:
+        for result in store.search(args.search, args.limit):
+            print("\n" + "-" * 50)
+            print(f"{result['source']} | {result['author']} | {result['time']}")
+            print(result["url"])
+            print(result["text"])
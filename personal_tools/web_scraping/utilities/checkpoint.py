@@ -0,0 +1,120 @@
+"""
+Utility class to append records to a JSON Lines file, with a checkpoint to resume
+a long scrape after a crash
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+
+class CheckpointedJsonl:
+    """
+    Append records to a JSON Lines file. Each commit flushes the records to disk
+    and saves a checkpoint of the cursor to continue from, like the URL of the next
+    page. Records written after the last commit are removed on resume, so a crash
+    never duplicates records. A cursor may come with a number of records to skip,
+    when the run stopped in the middle of a page.
+
+    For example:
+
+    with CheckpointedJsonl("posts.jsonl") as writer:
+        url = writer.cursor or first_url
+        while url and not writer.done:
+            for record in scrape(url):
+                writer.write(record)
+            url = next_url()
+            writer.commit(url, done=url is None)
+    """
+
+    def __init__(self, path: Union[str, Path], restart: bool = False):
+        """
+        Initialize CheckpointedJsonl class
+
+        :param path: Path of JSON Lines file. The checkpoint is saved next to it.
+        :param restart: Whether to start over, removing records and checkpoint
+            of previous runs
+        """
+        self.path = Path(path)
+        self.checkpoint_path = self.path.with_name(f"{self.path.stem}.checkpoint.json")
+        self.restart = restart
+
+        self.cursor: Optional[str] = None
+        self.skip = 0
+        self.count = 0
+        self.done = False
+
+        self.file = None
+        self.pending = 0
+
+    def __enter__(self):
+        offset = None
+
+        if self.restart:
+            self.checkpoint_path.unlink(missing_ok=True)
+            offset = 0
+
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+                checkpoint = json.load(file)
+
+            self.cursor = checkpoint["cursor"]
+            self.skip = checkpoint.get("skip", 0)
+            self.count = checkpoint["count"]
+            self.done = checkpoint["done"]
+            offset = checkpoint["offset"]
+
+        self.file = open(self.path, "ab")  # pylint: disable=consider-using-with
+
+        # Remove records written after the last checkpoint
+        if offset is not None and self.file.tell() > offset:
+            self.file.truncate(offset)
+            self.file.seek(offset)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        self.file = None
+
+    def write(self, record: dict):
+        """
+        Append a record, kept on disk at the next commit
+
+        :param record: Record serializable to JSON
+        """
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self.file.write(line.encode("utf-8"))
+        self.pending += 1
+
+    def commit(self, cursor: Optional[str], done: bool = False, skip: int = 0):
+        """
+        Flush written records to disk, then save a checkpoint
+
+        :param cursor: Where to continue from on resume
+        :param done: Whether there is nothing left to write
+        :param skip: Number of records at the cursor already written
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.cursor = cursor
+        self.skip = skip
+        self.count += self.pending
+        self.done = done
+        self.pending = 0
+
+        checkpoint = {
+            "cursor": self.cursor,
+            "skip": self.skip,
+            "count": self.count,
+            "done": self.done,
+            "offset": self.file.tell(),
+        }
+
+        # Write next to the checkpoint then rename, so it is never half written
+        temp_path = self.checkpoint_path.with_name(f"{self.checkpoint_path.name}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file)
+        os.replace(temp_path, self.checkpoint_path)
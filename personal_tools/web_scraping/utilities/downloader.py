@@ -0,0 +1,325 @@
+"""
+Utility class to download media files concurrently in the background,
+while the scraper keeps navigating
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import aiohttp
+
+# Size of each chunk written to disk while downloading
+CHUNK_SIZE = 64 * 1024
+
+# Status codes worth retrying, since the server may recover
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def get_extension(url: str, content_type: Optional[str]) -> str:
+    """
+    Get file extension of a downloaded file
+
+    :param url: URL of file
+    :param content_type: Content type of response
+    :return: File extension with dot, or an empty string if unknown
+    """
+    extension = Path(urlparse(url).path).suffix.lower()
+    if extension and len(extension) <= 5:
+        return extension
+
+    return mimetypes.guess_extension(content_type or "") or ""
+
+
+class MediaDownloader:
+    """
+    Download files on an asyncio event loop running in a background thread.
+
+    Files are named by the SHA-256 of their content, so a file posted many times
+    is stored once. Each download is recorded in manifest.jsonl, mapping posts
+    to files.
+
+    For example:
+
+    with MediaDownloader("data/media") as downloader:
+        for post in scraper.scrape_group(group_id, 100, "all"):
+            downloader.submit(post["id"], post["images"])
+    """
+
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        per_host: int = 4,
+        total: int = 16,
+        retries: int = 3,
+        timeout: float = 300,
+    ):
+        """
+        Initialize MediaDownloader class
+
+        :param folder: Folder to store files and manifest in
+        :param per_host: Maximum number of downloads from the same host at a time
+        :param total: Maximum number of downloads at a time
+        :param retries: Number of retries of a failed download
+        :param timeout: Time in seconds for a download before it fails
+        """
+        self.folder = Path(folder)
+        self.temp_folder = self.folder / "tmp"
+        self.temp_folder.mkdir(parents=True, exist_ok=True)
+
+        self.retries = retries
+        self.stats = Counter()
+
+        # pylint: disable-next=consider-using-with
+        self.manifest = open(self.folder / "manifest.jsonl", "a", encoding="utf-8")
+        self._manifest_lock = threading.Lock()
+
+        # Threads writing files, not to block downloads on the event loop
+        self.io_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=total, thread_name_prefix="media-writer"
+        )
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="media-downloader", daemon=True
+        )
+        self.thread.start()
+
+        self.session = self.run(self.create_session(per_host, total, timeout))
+
+        # Downloads by URL, only used in the event loop
+        self.downloads: Dict[str, asyncio.Task] = {}
+
+        self.futures = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, coroutine):
+        """
+        Run a coroutine in the event loop and wait for its result
+
+        :param coroutine: Coroutine to run
+        :return: Result of coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def run_io(self, func, *args, **kwargs):
+        """
+        Run blocking file I/O in a writer thread
+
+        :param func: Function to run
+        :param args: Arguments of function
+        :param kwargs: Keyword arguments of function
+        :return: Result of function
+        """
+        return await self.loop.run_in_executor(
+            self.io_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    @staticmethod
+    async def create_session(
+        per_host: int, total: int, timeout: float
+    ) -> aiohttp.ClientSession:
+        """
+        Create the HTTP session, inside the event loop
+
+        :param per_host: Maximum number of connections to the same host
+        :param total: Maximum number of connections
+        :param timeout: Time in seconds for a request before it fails
+        :return: HTTP session
+        """
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=total, limit_per_host=per_host),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+
+    def submit(self, post_id: Optional[str], urls: Iterable[str]):
+        """
+        Download files of a post in the background. Safe to call from any thread.
+
+        :param post_id: ID of post, recorded in the manifest
+        :param urls: URLs of files
+        """
+        for url in urls:
+            future = asyncio.run_coroutine_threadsafe(
+                self.download_for_post(post_id, url), self.loop
+            )
+
+            with self._lock:
+                self.futures.add(future)
+            future.add_done_callback(self.discard_future)
+
+    def discard_future(self, future: concurrent.futures.Future):
+        """
+        Forget a finished download
+
+        :param future: Future of download
+        """
+        with self._lock:
+            self.futures.discard(future)
+
+    async def download_for_post(self, post_id: Optional[str], url: str):
+        """
+        Download a file of a post, once for all posts sharing its URL,
+        and record it in the manifest
+
+        :param post_id: ID of post
+        :param url: URL of file
+        """
+        if url not in self.downloads:
+            self.downloads[url] = asyncio.ensure_future(self.download(url))
+
+        record = {"post": post_id, "url": url}
+        try:
+            path, digest, size = await asyncio.shield(self.downloads[url])
+            record.update(
+                file=str(path.relative_to(self.folder)), sha256=digest, size=size
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as exception:
+            record["error"] = f"{type(exception).__name__}: {exception}"
+
+        await self.run_io(self.write_manifest, record)
+
+    def write_manifest(self, record: dict):
+        """
+        Append a record to the manifest. Runs in a writer thread.
+
+        :param record: Record of a download
+        """
+        line = json.dumps(record) + "\n"
+
+        with self._manifest_lock:
+            self.manifest.write(line)
+            self.manifest.flush()
+
+    async def download(self, url: str) -> Tuple[Path, str, int]:
+        """
+        Download a file, retrying with exponential backoff
+
+        :param url: URL of file
+        :return: Path of file, its SHA-256 and its size
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.fetch(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                is_retryable = not isinstance(
+                    exception, aiohttp.ClientResponseError
+                ) or (exception.status in RETRY_STATUSES)
+
+                if attempt == self.retries or not is_retryable:
+                    self.stats["failed"] += 1
+                    print(f"Failed to download {url}: {exception}")
+                    raise
+
+                self.stats["retried"] += 1
+                await asyncio.sleep(2**attempt * random.uniform(0.5, 1.5))
+
+        raise AssertionError("Unreachable")
+
+    async def fetch(self, url: str) -> Tuple[Path, str, int]:
+        """
+        Stream a file to disk, hashing it on the way, then move it to its place
+
+        :param url: URL of file
+        :return: Path of file, its SHA-256 and its size
+        """
+        fd, temp_path = await self.run_io(tempfile.mkstemp, dir=self.temp_folder)
+        file = os.fdopen(fd, "wb")
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                extension = get_extension(url, response.content_type)
+
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    digest.update(chunk)
+                    await self.run_io(file.write, chunk)
+                    size += len(chunk)
+
+            await self.run_io(file.close)
+
+            name = digest.hexdigest()
+            path = self.folder / name[:2] / f"{name}{extension}"
+
+            if await self.run_io(self.move_file, temp_path, path):
+                self.stats["downloaded"] += 1
+                self.stats["bytes"] += size
+            else:
+                self.stats["duplicated"] += 1
+        except BaseException:
+            await self.run_io(self.remove_file, file, temp_path)
+            raise
+
+        return path, name, size
+
+    @staticmethod
+    def move_file(temp_path: str, path: Path) -> bool:
+        """
+        Move a downloaded file to its place, unless the same file is there already
+
+        :param temp_path: Path of downloaded file
+        :param path: Path of file named by its content
+        :return: True if moved, False if it was a duplicate
+        """
+        path.parent.mkdir(exist_ok=True)
+
+        if path.exists():
+            os.unlink(temp_path)
+            return False
+
+        os.replace(temp_path, path)
+        return True
+
+    @staticmethod
+    def remove_file(file, temp_path: str):
+        """
+        Remove a failed download
+
+        :param file: File object of download, closed if still open
+        :param temp_path: Path of downloaded file
+        """
+        file.close()
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+    def close(self):
+        """
+        Wait for all downloads, then stop the event loop
+        """
+        with self._lock:
+            futures = list(self.futures)
+        concurrent.futures.wait(futures)
+
+        self.run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.io_executor.shutdown()
+
+        self.manifest.close()
+
+        print(
+            f"Downloaded {self.stats['downloaded']} files "
+            f"({self.stats['bytes'] / 1024 / 1024:.1f} MB), "
+            f"skipped {self.stats['duplicated']} duplicated files, "
+            f"failed {self.stats['failed']} files"
+        )
@@ -3,6 +3,7 @@ Utility functions for working with selenium driver
 """
 
 import os
+from dataclasses import dataclass, field
 from typing import List
 
 from selenium import webdriver
@@ -11,19 +12,81 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
 
-def create_driver(headless: bool = True, detach: bool = False) -> webdriver:
+@dataclass
+class DriverProfile:
+    """
+    Settings of a Chrome driver for a kind of work
+
+    :param window_size: Size of window as "width,height".
+    :param maximized: Whether to open the window maximized, instead of its size.
+    :param page_load_strategy: "normal" waits for all resources of pages,
+        "eager" returns once the DOM is ready, without waiting for images and styles.
+    :param load_images: Whether to load images.
+    :param blocked_urls: URL patterns never requested, with * as wildcard,
+        like fonts and media only needed to display pages.
+    :param arguments: Extra command line arguments of Chrome.
+    """
+
+    window_size: str = "1000,2000"
+    maximized: bool = True
+    page_load_strategy: str = "normal"
+    load_images: bool = True
+    blocked_urls: List[str] = field(default_factory=list)
+    arguments: List[str] = field(default_factory=list)
+
+
+DRIVER_PROFILES = {
+    # Full browser, for pages meant to be seen like login and checkpoints
+    "default": DriverProfile(),
+    # Only what is needed to parse pages, loading faster with less memory
+    "lean": DriverProfile(
+        window_size="800,600",
+        maximized=False,
+        page_load_strategy="eager",
+        load_images=False,
+        blocked_urls=[
+            "*.css",
+            "*.woff",
+            "*.woff2",
+            "*.ttf",
+            "*.otf",
+            "*.mp4",
+            "*.webm",
+            "*.m3u8",
+            "*.mp3",
+        ],
+        arguments=[
+            "--blink-settings=imagesEnabled=false",
+            "--disable-background-networking",
+            "--disable-extensions",
+            "--disable-remote-fonts",
+            "--mute-audio",
+        ],
+    ),
+}
+
+
+def create_driver(
+    headless: bool = True, detach: bool = False, profile: str = "default"
+) -> webdriver:
     """
     Initialize chrome driver with profile
     :param headless: Whether to run the chrome driver in headless mode.
         If True, the chrome driver will not be visible.
     :param detach: Whether to detach the chrome driver from the terminal.
         If True, the chrome driver will not be closed when the terminal is closed.
+    :param profile: Name of driver profile in DRIVER_PROFILES
     :return: A Chrome driver
     """
-    window_size = "1000,2000"
+    settings = DRIVER_PROFILES[profile]
+
+    window_size = settings.window_size
     prefs = {"profile.default_content_setting_values.notifications": 2}
+    if not settings.load_images:
+        prefs["profile.managed_default_content_settings.images"] = 2
 
     chrome_options = Options()
+    chrome_options.page_load_strategy = settings.page_load_strategy
 
     chrome_options.add_argument("disable-infobars")
 
@@ -47,9 +110,14 @@ def create_driver(headless: bool = True, detach: bool = False) -> webdriver:
     chrome_options.add_argument("--no-default-browser-check")
     chrome_options.add_argument("--no-first-run")
     chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--start-maximized")  # open Browser in maximized mode
+    if settings.maximized:
+        chrome_options.add_argument(
+            "--start-maximized"
+        )  # open Browser in maximized mode
     chrome_options.add_argument(f"--window-size={window_size}")
     chrome_options.add_argument("--verbose")
+    for argument in settings.arguments:
+        chrome_options.add_argument(argument)
 
     chrome_options.add_experimental_option("detach", detach)
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -57,9 +125,33 @@ def create_driver(headless: bool = True, detach: bool = False) -> webdriver:
     chrome_options.add_experimental_option("useAutomationExtension", False)
 
     driver = webdriver.Chrome(options=chrome_options)
+
+    if settings.blocked_urls:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": settings.blocked_urls}
+        )
+
     return driver
 
 
+def xpath_literal(value: str) -> str:
+    """
+    Quote a string for XPath. XPath 1.0 has no escapes, so strings with both
+    quote characters are built with concat()
+
+    :param value: String to quote
+    :return: XPath expression of string
+    """
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+
+    parts = value.split("'")
+    return "concat(" + ', "\'", '.join(f"'{part}'" for part in parts) + ")"
+
+
 def find_elements_by_text(driver: webdriver, text: str) -> List[WebElement]:
     """
     Find elements by text
@@ -67,7 +159,9 @@ def find_elements_by_text(driver: webdriver, text: str) -> List[WebElement]:
     :param text: The text to search for
     :return: A list of elements that match the search text
     """
-    return driver.find_elements(By.XPATH, f"//*[contains(text(), '{text}')]")
+    return driver.find_elements(
+        By.XPATH, f"//*[contains(text(), {xpath_literal(text)})]"
+    )
 
 
 def find_elements_by_attribute(
@@ -80,4 +174,4 @@ def find_elements_by_attribute(
     :param value: The value of the attribute to search for
     :return: A list of elements that match the search attribute and value
     """
-    return driver.find_elements(By.XPATH, f"//*[@{attribute}='{value}']")
+    return driver.find_elements(By.XPATH, f"//*[@{attribute}={xpath_literal(value)}]")
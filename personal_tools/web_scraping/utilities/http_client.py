@@ -0,0 +1,104 @@
+"""
+Utility class to fetch pages over HTTP with the session of a selenium driver,
+much faster than loading them in a browser
+"""
+
+from typing import List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """
+    HTTP client keeping connections alive, with the cookies of a logged in driver
+    """
+
+    def __init__(
+        self,
+        cookies: List[dict],
+        user_agent: Optional[str] = None,
+        pool_size: int = 10,
+        timeout: float = 15,
+        retries: int = 3,
+    ):
+        """
+        Initialize HttpClient class
+
+        :param cookies: Cookies as returned by driver.get_cookies()
+        :param user_agent: User agent to send, the one of the driver for the session
+            to look the same
+        :param pool_size: Number of connections kept alive for each host
+        :param timeout: Time in seconds to wait for a response
+        :param retries: Number of retries on connection errors and server errors
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+            ),
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+            )
+
+    @classmethod
+    def from_driver(cls, driver: webdriver, **kwargs) -> "HttpClient":
+        """
+        Create a client with the session of a driver
+
+        :param driver: The driver, already logged in
+        :param kwargs: Other arguments of HttpClient
+        :return: HTTP client
+        """
+        user_agent = driver.execute_script("return navigator.userAgent")
+
+        return cls(driver.get_cookies(), user_agent, **kwargs)
+
+    def copy(self) -> "HttpClient":
+        """
+        Create a client with the same session, for another thread
+
+        :return: HTTP client
+        """
+        client = HttpClient(
+            [], pool_size=self.pool_size, timeout=self.timeout, retries=self.retries
+        )
+        client.session.headers.update(self.session.headers)
+        client.session.cookies.update(self.session.cookies)
+
+        return client
+
+    def get(self, url: str) -> Tuple[str, str]:
+        """
+        Get a page
+
+        :param url: URL of page
+        :return: HTML of page, and URL of page after redirects
+        :raises requests.RequestException: If the page cannot be fetched
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+
+        return response.text, response.url
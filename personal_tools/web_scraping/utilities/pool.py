@@ -0,0 +1,173 @@
+"""
+Utility class to share a pool of selenium drivers between threads
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+
+def is_healthy(driver: webdriver) -> bool:
+    """
+    Check if a driver still responds, since browsers may crash or hang
+
+    :param driver: The driver to check
+    :return: True if the driver can run scripts
+    """
+    try:
+        return driver.execute_script("return 1") == 1
+    except WebDriverException:
+        return False
+
+
+class DriverPool:
+    """
+    Pool of drivers, created when first needed. Each driver is used by one thread
+    at a time, checked before use, and replaced once broken or used many times,
+    since browsers grow in memory over time.
+
+    For example:
+
+    with DriverPool(create_driver, size=4) as pool:
+        with pool.driver() as driver:
+            driver.get(url)
+    """
+
+    def __init__(self, create: Callable[[], webdriver], size: int, max_uses: int = 20):
+        """
+        Initialize DriverPool class
+
+        :param create: Function creating a new driver
+        :param size: Maximum number of drivers
+        :param max_uses: Number of uses before a driver is replaced
+        """
+        self.create = create
+        self.size = size
+        self.max_uses = max_uses
+
+        self.idle = queue.Queue()
+        self.uses: Dict[int, int] = {}
+        self.count = 0
+
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def driver(self):
+        """
+        Use a driver of the pool. Drivers raising WebDriverException are replaced.
+
+        :return: Context giving a driver
+        """
+        driver = self.acquire()
+
+        try:
+            yield driver
+        except WebDriverException:
+            self.discard(driver)
+            raise
+        except BaseException:
+            self.release(driver)
+            raise
+        else:
+            self.release(driver)
+
+    def acquire(self) -> webdriver:
+        """
+        Take a healthy driver, creating one if the pool is not full,
+        or waiting for one to be released otherwise
+
+        :return: The driver
+        """
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self.count < self.size
+                    if can_create:
+                        self.count += 1
+
+                if can_create:
+                    return self.new_driver()
+
+                try:
+                    # Time out to create a driver if a broken one was discarded
+                    driver = self.idle.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+            if is_healthy(driver):
+                return driver
+
+            print("Replace driver not responding")
+            self.discard(driver)
+
+    def new_driver(self) -> webdriver:
+        """
+        Create a driver for a place reserved in the pool
+
+        :return: The driver
+        """
+        try:
+            driver = self.create()
+        except BaseException:
+            with self._lock:
+                self.count -= 1
+            raise
+
+        with self._lock:
+            self.uses[id(driver)] = 0
+
+        return driver
+
+    def release(self, driver: webdriver):
+        """
+        Give back a driver, replacing it if used too many times
+
+        :param driver: The driver taken with acquire()
+        """
+        with self._lock:
+            self.uses[id(driver)] += 1
+            is_worn = self.uses[id(driver)] >= self.max_uses
+
+        if is_worn:
+            self.discard(driver)
+        else:
+            self.idle.put(driver)
+
+    def discard(self, driver: webdriver):
+        """
+        Quit a driver and free its place in the pool
+
+        :param driver: The driver taken with acquire()
+        """
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+        with self._lock:
+            self.uses.pop(id(driver), None)
+            self.count -= 1
+
+    def close(self):
+        """
+        Quit all idle drivers
+        """
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+
+            self.discard(driver)
@@ -0,0 +1,434 @@
+"""
+Utilities to record the pages visited by a scraper, and serve them back offline,
+to test and benchmark the scraper without an account or a network.
+
+A recording is a folder with:
+
+- index.jsonl: one line per visit, with URL, URL after redirects and HTML file
+- pages/<SHA-1>.html: HTML of pages, stored once per content
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+
+from personal_tools.utilities.timer import Stopwatch, recorder
+from personal_tools.web_scraping.facebook_parser import parse_page
+
+# Any valid key works, since replayed pages accept any 2FA code
+REPLAY_KEY_2FA = "A" * 32
+
+
+def get_args():
+    """
+    Get arguments from command line
+
+    :return: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve a recording of pages, or benchmark parsing it"
+    )
+    parser.add_argument(
+        "--folder", type=str, required=True, help="Folder of the recording"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Serve the recording until stopped, instead of benchmarking",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Port of server, with --serve"
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=0.0,
+        help="Time in seconds added to each page, to simulate the network",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of rounds of the benchmark"
+    )
+
+    return parser.parse_args()
+
+
+def get_replay_key(url: str) -> str:
+    """
+    Get key of a page in a recording: its path and query, whatever the host,
+    so pages recorded from Facebook are found on the replay server too
+
+    :param url: URL of page
+    :return: Key of page
+    """
+    parts = urlsplit(url)
+    path = parts.path or "/"
+
+    return f"{path}?{parts.query}" if parts.query else path
+
+
+def load_recording(folder: Union[str, Path]) -> List[dict]:
+    """
+    Load visits of a recording, in order
+
+    :param folder: Folder of the recording
+    :return: Visits, with url, final_url and file
+    """
+    with open(Path(folder) / "index.jsonl", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class PageRecorder:
+    """
+    Recorder of visited pages, shared by threads
+    """
+
+    def __init__(self, folder: Union[str, Path]):
+        """
+        Initialize PageRecorder class
+
+        :param folder: Folder of the recording, appended to if it exists
+        """
+        self.folder = Path(folder)
+        (self.folder / "pages").mkdir(parents=True, exist_ok=True)
+
+        # pylint: disable-next=consider-using-with
+        self.index = open(self.folder / "index.jsonl", "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the index of the recording
+        """
+        self.index.close()
+
+    def record(self, url: str, html: str, final_url: str):
+        """
+        Record a visit of a page
+
+        :param url: URL requested
+        :param html: HTML of page
+        :param final_url: URL of page after redirects
+        """
+        data = html.encode("utf-8")
+        file = Path("pages") / f"{hashlib.sha1(data).hexdigest()}.html"
+
+        with self._lock:
+            if not (self.folder / file).exists():
+                (self.folder / file).write_bytes(data)
+
+            record = {"url": url, "final_url": final_url, "file": file.as_posix()}
+            self.index.write(json.dumps(record) + "\n")
+            self.index.flush()
+
+
+class ReplayClient:
+    """
+    Stub of HttpClient serving pages of a recording, without any network.
+    When a page was visited many times, its latest visit is served.
+    """
+
+    def __init__(self, folder: Union[str, Path], delay: float = 0.0):
+        """
+        Initialize ReplayClient class
+
+        :param folder: Folder of the recording
+        :param delay: Time in seconds added to each page, to simulate the network
+        """
+        self.folder = Path(folder)
+        self.delay = delay
+
+        self.visits = load_recording(folder)
+        self.pages: Dict[str, dict] = {}
+        for visit in self.visits:
+            self.pages[get_replay_key(visit["url"])] = visit
+            self.pages[get_replay_key(visit["final_url"])] = visit
+
+        self._html: Dict[str, str] = {}
+
+    def copy(self) -> "ReplayClient":
+        """
+        Get a client for another thread, this one since it is read only
+
+        :return: Replay client
+        """
+        return self
+
+    def find(self, url: str) -> Optional[dict]:
+        """
+        Find the latest visit of a page
+
+        :param url: URL of page, on any host
+        :return: Visit, or None if the page is not recorded
+        """
+        return self.pages.get(get_replay_key(url))
+
+    def read(self, visit: dict) -> str:
+        """
+        Read HTML of a visit, cached after the first read
+
+        :param visit: Visit of recording
+        :return: HTML of page
+        """
+        if visit["file"] not in self._html:
+            path = self.folder / visit["file"]
+            self._html[visit["file"]] = path.read_text(encoding="utf-8")
+
+        return self._html[visit["file"]]
+
+    def get(self, url: str) -> Tuple[str, str]:
+        """
+        Get a recorded page
+
+        :param url: URL of page, on any host
+        :return: HTML of page, and URL of page after redirects
+        :raises requests.HTTPError: If the page is not recorded
+        """
+        if self.delay:
+            time.sleep(self.delay)
+
+        visit = self.find(url)
+        if visit is None:
+            raise requests.HTTPError(f"404 Client Error: Not recorded: {url}")
+
+        return self.read(visit), visit["final_url"]
+
+
+class ReplayServer:
+    """
+    Local HTTP server serving pages of a recording, for a browser or HttpClient
+    to replay a run. Links to the recorded site are rewritten to the server,
+    and form submissions lead to the page visited after the last page served,
+    so the login flow replays in the recorded order.
+
+    For example:
+
+    with ReplayServer("data/recording") as server:
+        scraper = FacebookScraper(..., base_url=server.base_url)
+    """
+
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        delay: float = 0.0,
+    ):
+        """
+        Initialize ReplayServer class
+
+        :param folder: Folder of the recording
+        :param host: Host to listen on
+        :param port: Port to listen on, any free port if 0
+        :param delay: Time in seconds added to each page, to simulate the network
+        """
+        self.client = ReplayClient(folder, delay)
+        self.last_visit = -1
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self.create_handler())
+        self.base_url = f"http://{host}:{self.server.server_port}"
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Serve in a background thread
+        """
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="replay-server", daemon=True
+        )
+        self.thread.start()
+
+    def close(self):
+        """
+        Stop the server
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def find_visit(self, key: str) -> Optional[int]:
+        """
+        Find the visit to serve for a page: the next visit of it after the last
+        page served, or its latest visit
+
+        :param key: Key of page
+        :return: Index of visit, or None if the page is not recorded
+        """
+        visits = self.client.visits
+        matches = [
+            index
+            for index, visit in enumerate(visits)
+            if key in (get_replay_key(visit["url"]), get_replay_key(visit["final_url"]))
+        ]
+        if not matches:
+            return None
+
+        with self._lock:
+            index = next(
+                (index for index in matches if index > self.last_visit), matches[-1]
+            )
+            self.last_visit = index
+
+        return index
+
+    def rewrite(self, html: str, visit: dict) -> str:
+        """
+        Point links to the recorded site to the server
+
+        :param html: HTML of page
+        :param visit: Visit of page
+        :return: HTML with links to the server
+        """
+        parts = urlsplit(visit["final_url"])
+
+        return html.replace(f"{parts.scheme}://{parts.netloc}", self.base_url)
+
+    def create_handler(self) -> type:
+        """
+        Create the request handler class of the server
+
+        :return: Handler class
+        """
+        replay = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            """
+            Handler of requests to the replay server
+            """
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                key = get_replay_key(self.path)
+                index = replay.find_visit(key)
+                if index is None:
+                    self.send_error(404, "Not recorded")
+                    return
+
+                visit = replay.client.visits[index]
+                final_key = get_replay_key(visit["final_url"])
+                if final_key != key:
+                    self.redirect(302, final_key)
+                    return
+
+                if replay.client.delay:
+                    time.sleep(replay.client.delay)
+
+                html = replay.rewrite(replay.client.read(visit), visit)
+                data = html.encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+                next_visit = replay.last_visit + 1
+                if next_visit >= len(replay.client.visits):
+                    self.send_error(404, "No page recorded after this one")
+                    return
+
+                self.redirect(
+                    303, get_replay_key(replay.client.visits[next_visit]["url"])
+                )
+
+            def redirect(self, status: int, key: str):
+                self.send_response(status)
+                self.send_header("Location", replay.base_url + key)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        return ReplayHandler
+
+
+def benchmark(folder: Union[str, Path], repeat: int = 5, delay: float = 0.0):
+    """
+    Benchmark parsing of recorded pages, then pagination of recorded feeds
+    from their first page, and print statistics
+
+    :param folder: Folder of the recording
+    :param repeat: Number of rounds
+    :param delay: Time in seconds added to each page, to simulate the network
+    """
+    client = ReplayClient(folder, delay)
+    urls = list(dict.fromkeys(visit["final_url"] for visit in client.visits))
+
+    # Feeds start at pages which are not the next page of another page
+    next_keys = set()
+    for url in urls:
+        _, next_url = parse_page(client.read(client.find(url)), url, "replay")
+        if next_url is not None:
+            next_keys.add(get_replay_key(next_url))
+    first_urls = [url for url in urls if get_replay_key(url) not in next_keys]
+
+    recorder.enabled = True
+    pages = posts = 0
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for first_url in first_urls:
+            next_url = first_url
+            seen = set()
+
+            while next_url is not None and client.find(next_url) is not None:
+                # Recorded feeds may loop, like a last page linking to itself
+                if get_replay_key(next_url) in seen:
+                    break
+                seen.add(get_replay_key(next_url))
+
+                with Stopwatch(desc="replay.get", verbose=False):
+                    html, page_url = client.get(next_url)
+                with Stopwatch(desc="replay.parse_page", verbose=False):
+                    page_posts, next_url = parse_page(html, page_url, "replay")
+
+                pages += 1
+                posts += len(page_posts)
+
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(urls)} recorded pages, {len(first_urls)} feeds, {repeat} rounds: "
+        f"{pages} pages and {posts} posts in {elapsed:.2f}s, "
+        f"{pages / elapsed:.1f} pages/s, {posts / elapsed:.1f} posts/s\n"
+    )
+    recorder.print_summary()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    if args.serve:
+        replay_server = ReplayServer(args.folder, port=args.port, delay=args.delay)
+        print(f"Serving {args.folder} at {replay_server.base_url}")
+        try:
+            replay_server.server.serve_forever()
+        except KeyboardInterrupt:
+            replay_server.server.server_close()
+    else:
+        benchmark(args.folder, args.repeat, args.delay)
@@ -0,0 +1,225 @@
+"""
+Utility classes to limit the rate of requests to a site, slowing down when the
+site starts blocking and speeding up again while it does not
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket shared by threads. Each request takes a token, and tokens come
+    back at a steady rate, allowing short bursts.
+    """
+
+    def __init__(self, rate: float, burst: float = 3):
+        """
+        Initialize TokenBucket class
+
+        :param rate: Maximum rate in requests per minute
+        :param burst: Number of requests allowed at once after a pause
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+        self._lock = threading.Lock()
+
+    def refill(self, now: float):
+        """
+        Add tokens earned since the last update
+
+        :param now: Current time from time.monotonic()
+        """
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate / 60
+        )
+        self.updated = now
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available
+
+        :return: Time waited in seconds
+        """
+        start = time.monotonic()
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.refill(now)
+
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+
+                wait = max(self.paused_until - now, (1 - self.tokens) * 60 / self.rate)
+
+            time.sleep(wait)
+
+    def slow_down(self, factor: float, pause: float, min_rate: float):
+        """
+        Reduce the rate, and pause all requests for a while
+
+        :param factor: Factor to multiply the rate by, from 0 to 1
+        :param pause: Time in seconds without any request
+        :param min_rate: Minimum rate in requests per minute
+        """
+        with self._lock:
+            self.rate = max(self.rate * factor, min_rate)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self.tokens = min(self.tokens, 1)
+
+    def speed_up(self, step: float):
+        """
+        Increase the rate, up to its maximum
+
+        :param step: Requests per minute to add
+        """
+        with self._lock:
+            self.rate = min(self.rate + step, self.max_rate)
+
+
+class Scheduler:
+    """
+    Rate limit of requests of an account, and of each type of target,
+    with adaptive backoff. When the site blocks a request, the rates are halved
+    and requests pause for a cooldown doubling with each block in a row.
+    Each successful request raises the rates a little, back to their maximum.
+
+    For example:
+
+    scheduler = Scheduler(rate=30)
+    scheduler.acquire("group")
+    html = fetch(url)
+    scheduler.report("group", blocked=is_blocked(html))
+    """
+
+    def __init__(
+        self,
+        rate: float = 30,
+        source_rate: Optional[float] = None,
+        burst: float = 3,
+        cooldown: float = 60,
+        max_cooldown: float = 1800,
+    ):
+        """
+        Initialize Scheduler class
+
+        :param rate: Maximum requests per minute of the account
+        :param source_rate: Maximum requests per minute of each type of target,
+            same as rate if None
+        :param burst: Number of requests allowed at once after a pause
+        :param cooldown: Pause in seconds after the first block
+        :param max_cooldown: Longest pause in seconds after blocks in a row
+        """
+        self.source_rate = source_rate or rate
+        self.burst = burst
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.account = TokenBucket(rate, burst)
+        self.sources: Dict[str, TokenBucket] = {}
+        self.blocks_in_row = 0
+
+        self.start_time = time.monotonic()
+        self.requests = Counter()
+        self.blocks = Counter()
+        self.waited = Counter()
+
+        self._lock = threading.Lock()
+
+    def get_bucket(self, source: str) -> TokenBucket:
+        """
+        Get token bucket of a type of target
+
+        :param source: Type of target, like "group"
+        :return: Token bucket
+        """
+        with self._lock:
+            if source not in self.sources:
+                self.sources[source] = TokenBucket(self.source_rate, self.burst)
+
+            return self.sources[source]
+
+    def acquire(self, source: str):
+        """
+        Wait until a request to a type of target is allowed
+
+        :param source: Type of target, like "group"
+        """
+        # Take the narrower token first, not to hold one of the account meanwhile
+        waited = self.get_bucket(source).acquire()
+        waited += self.account.acquire()
+
+        with self._lock:
+            self.requests[source] += 1
+            self.waited[source] += waited
+
+    def report(self, source: str, blocked: bool):
+        """
+        Report the result of a request, to adapt the rates
+
+        :param source: Type of target, like "group"
+        :param blocked: Whether the site blocked the request
+        """
+        buckets = [self.account, self.get_bucket(source)]
+
+        if not blocked:
+            with self._lock:
+                self.blocks_in_row = 0
+            for bucket in buckets:
+                bucket.speed_up(step=bucket.max_rate / 20)
+            return
+
+        with self._lock:
+            self.blocks[source] += 1
+            pause = min(self.cooldown * 2**self.blocks_in_row, self.max_cooldown)
+            self.blocks_in_row += 1
+
+        print(f"Blocked while scraping {source}, pause for {pause:.0f}s")
+        for bucket in buckets:
+            bucket.slow_down(factor=0.5, pause=pause, min_rate=1)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        Get metrics of requests by type of target
+
+        :return: Dictionary of type: requests, requests per minute, blocks,
+            time waited for the rate limit and current rate
+        """
+        minutes = max(time.monotonic() - self.start_time, 1e-6) / 60
+
+        with self._lock:
+            return {
+                source: {
+                    "requests": self.requests[source],
+                    "requests_per_min": self.requests[source] / minutes,
+                    "blocks": self.blocks[source],
+                    "waited_s": self.waited[source],
+                    "rate": min(bucket.rate, self.account.rate),
+                }
+                for source, bucket in self.sources.items()
+            }
+
+    def print_summary(self):
+        """
+        Print metrics of requests by type of target
+        """
+        print(
+            f"{'Target':<10} {'Requests':>9} {'Req/min':>8} {'Blocks':>7} "
+            f"{'Waited s':>9} {'Rate/min':>9}"
+        )
+        for source, stats in self.get_stats().items():
+            print(
+                f"{source:<10} {stats['requests']:>9} "
+                f"{stats['requests_per_min']:>8.1f} {stats['blocks']:>7} "
+                f"{stats['waited_s']:>9.1f} {stats['rate']:>9.1f}"
+            )
@@ -0,0 +1,93 @@
+"""
+Utility functions to save the cookies of a selenium driver to an encrypted file,
+and restore them in a new driver to reuse its login session
+"""
+
+import base64
+import json
+import os
+import time
+from pathlib import Path
+from typing import Union
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from selenium import webdriver
+
+SALT_SIZE = 16
+KDF_ITERATIONS = 480_000
+
+
+def get_cipher(secret: str, salt: bytes) -> Fernet:
+    """
+    Create a cipher with a key derived from a secret
+
+    :param secret: Secret to derive key from, like the password of account
+    :param salt: Random salt stored with encrypted data
+    :return: Cipher
+    """
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS
+    )
+    key = base64.urlsafe_b64encode(kdf.derive(secret.encode("utf-8")))
+
+    return Fernet(key)
+
+
+def save_cookies(driver: webdriver, path: Union[str, Path], secret: str):
+    """
+    Save cookies of the current site of driver to an encrypted file,
+    readable only by the current user
+
+    :param driver: The driver to use
+    :param path: Path of session file
+    :param secret: Secret to encrypt cookies with
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    salt = os.urandom(SALT_SIZE)
+    data = get_cipher(secret, salt).encrypt(
+        json.dumps(driver.get_cookies()).encode("utf-8")
+    )
+
+    # Write next to the file then rename, so a crash never leaves half a session
+    temp_path = path.with_name(f"{path.name}.tmp")
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(salt + data)
+    os.replace(temp_path, path)
+
+
+def load_cookies(driver: webdriver, path: Union[str, Path], secret: str) -> bool:
+    """
+    Add cookies from an encrypted file to the current site of driver.
+    Expired cookies are skipped.
+
+    :param driver: The driver to use, already on the site of cookies
+    :param path: Path of session file
+    :param secret: Secret cookies were encrypted with
+    :return: True if any cookie was added
+    """
+    path = Path(path)
+    if not path.exists():
+        return False
+
+    content = path.read_bytes()
+    try:
+        data = get_cipher(secret, content[:SALT_SIZE]).decrypt(content[SALT_SIZE:])
+    except InvalidToken:
+        print(f"Session file {path} cannot be decrypted, ignore it")
+        return False
+
+    now = time.time()
+    count = 0
+    for cookie in json.loads(data):
+        if cookie.get("expiry") is not None and cookie["expiry"] <= now:
+            continue
+
+        driver.add_cookie(cookie)
+        count += 1
+
+    return count > 0
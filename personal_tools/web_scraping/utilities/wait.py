@@ -0,0 +1,182 @@
+"""
+Utility class to wait for pages of selenium driver, instead of sleeping a fixed time
+
+Each wait returns as soon as its condition is met. Polls are jittered,
+so requests of the driver do not follow a fixed rhythm.
+"""
+
+import random
+from typing import Callable, Optional, Tuple, TypeVar
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+T = TypeVar("T")
+
+# Locator of elements, as (By.*, selector)
+Locator = Tuple[str, str]
+
+
+class JitteredWait(WebDriverWait):
+    """
+    WebDriverWait sleeping a random time around its poll frequency between polls
+    """
+
+    def __init__(self, driver: webdriver, timeout: float, poll: float, jitter: float):
+        """
+        Initialize JitteredWait class
+
+        :param driver: The driver to use
+        :param timeout: Time in seconds before giving up
+        :param poll: Average time in seconds between polls
+        :param jitter: Relative deviation of time between polls, from 0 to 1
+        """
+        self._base_poll = poll
+        self.jitter = jitter
+        super().__init__(driver, timeout, poll_frequency=poll)
+
+    @property
+    def _poll(self) -> float:
+        """
+        Time to sleep before the next poll, read by WebDriverWait.until()
+        """
+        return self._base_poll * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @_poll.setter
+    def _poll(self, value: float):
+        self._base_poll = value
+
+
+class Waiter:
+    """
+    Wait for conditions on the pages of a driver, with a timeout for each step
+
+    For example:
+
+    wait = Waiter(driver)
+    wait.element(By.CSS_SELECTOR, "#email").send_keys(email)
+    wait.click(wait.element(By.CSS_SELECTOR, "#submit", clickable=True))
+    """
+
+    def __init__(
+        self,
+        driver: webdriver,
+        timeout: float = 15,
+        poll: float = 0.2,
+        jitter: float = 0.5,
+    ):
+        """
+        Initialize Waiter class
+
+        :param driver: The driver to use
+        :param timeout: Default time in seconds before a step fails
+        :param poll: Average time in seconds between polls
+        :param jitter: Relative deviation of time between polls, from 0 to 1
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.poll = poll
+        self.jitter = jitter
+
+    def until(
+        self,
+        condition: Callable[[webdriver], T],
+        timeout: Optional[float] = None,
+        message: str = "",
+    ) -> T:
+        """
+        Wait until a condition returns a truthy value
+
+        :param condition: Function of driver, like the ones of expected_conditions
+        :param timeout: Time in seconds before giving up, default timeout if None
+        :param message: Message of TimeoutException
+        :return: Last value returned by condition
+        :raises TimeoutException: If the condition is not met in time
+        """
+        wait = JitteredWait(
+            self.driver,
+            self.timeout if timeout is None else timeout,
+            self.poll,
+            self.jitter,
+        )
+
+        return wait.until(condition, message)
+
+    def element(
+        self,
+        by: str,
+        selector: str,
+        timeout: Optional[float] = None,
+        clickable: bool = False,
+    ) -> WebElement:
+        """
+        Wait for an element to be visible, or clickable
+
+        :param by: Locator strategy, one of By.*
+        :param selector: Selector of element
+        :param timeout: Time in seconds before giving up, default timeout if None
+        :param clickable: Whether to also wait for the element to be enabled
+        :return: The element
+        :raises TimeoutException: If the element does not appear in time
+        """
+        if clickable:
+            condition = EC.element_to_be_clickable((by, selector))
+        else:
+            condition = EC.visibility_of_element_located((by, selector))
+
+        return self.until(condition, timeout, f"Element not found: {selector}")
+
+    def optional_element(
+        self, by: str, selector: str, timeout: float = 3
+    ) -> Optional[WebElement]:
+        """
+        Wait for an element which may not appear at all, like a dialog
+
+        :param by: Locator strategy, one of By.*
+        :param selector: Selector of element
+        :param timeout: Time in seconds before giving up
+        :return: The element, or None if it does not appear in time
+        """
+        try:
+            return self.element(by, selector, timeout)
+        except TimeoutException:
+            return None
+
+    def first_of(
+        self, *locators: Locator, timeout: Optional[float] = None
+    ) -> Tuple[int, WebElement]:
+        """
+        Wait for the first of several elements to be present,
+        like the content of a page or the error shown instead
+
+        :param locators: Locators of elements, as (By.*, selector)
+        :param timeout: Time in seconds before giving up, default timeout if None
+        :return: Index of the locator found, and the element
+        :raises TimeoutException: If no element appears in time
+        """
+
+        def find_any(driver: webdriver):
+            for index, (by, selector) in enumerate(locators):
+                elements = driver.find_elements(by, selector)
+                if elements:
+                    return index, elements[0]
+
+            return False
+
+        return self.until(find_any, timeout, f"Elements not found: {locators}")
+
+    def click(self, element: WebElement, timeout: Optional[float] = None):
+        """
+        Click an element which opens a new page, then wait for the current page
+        to be replaced, so the next step does not find elements of the old page
+
+        :param element: Element to click
+        :param timeout: Time in seconds before giving up, default timeout if None
+        :raises TimeoutException: If the page is not replaced in time
+        """
+        element.click()
+
+        self.until(EC.staleness_of(element), timeout, "Page was not replaced")
@@ -0,0 +1,254 @@
+"""
+Tests of the Facebook scraper on replayed pages, without a browser or an account.
+
+Run from the root of the repository with: python -m pytest tests
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from personal_tools.web_scraping import facebook_scraper
+from personal_tools.web_scraping.facebook_parser import parse_page
+from personal_tools.web_scraping.facebook_scraper import BASE_URL, FacebookScraper
+from personal_tools.web_scraping.post_store import PostStore
+from personal_tools.web_scraping.utilities.http_client import HttpClient
+from personal_tools.web_scraping.utilities.replay import (
+    PageRecorder,
+    ReplayClient,
+    ReplayServer,
+)
+
+# Recording of a group feed saved from mbasic Facebook, of two pages
+MBASIC_GROUP = Path(__file__).parent / "data" / "mbasic_group"
+
+GROUP_ID = "123"
+
+GROUP_URL = f"{BASE_URL}/groups/{GROUP_ID}"
+
+# Number of posts on each page of generated feeds
+POSTS_PER_PAGE = 2
+
+
+class StubDriver:
+    """
+    Stub of selenium driver, which only remembers how it was created
+    """
+
+    def __init__(self, headless: bool = True, detach: bool = False, profile="default"):
+        self.headless = headless
+        self.detach = detach
+        self.profile = profile
+
+    def get(self, url: str):
+        pass
+
+    def get_cookies(self) -> List[dict]:
+        return []
+
+    def add_cookie(self, cookie: dict):
+        pass
+
+    def execute_script(self, script: str):
+        return 1
+
+    def quit(self):
+        pass
+
+
+def make_page(post_ids: List[int], next_url: Optional[str]) -> str:
+    """
+    Make HTML of a mbasic page of posts
+
+    :param post_ids: IDs of posts on the page
+    :param next_url: URL of next page, or None for the last page
+    :return: HTML of page
+    """
+    articles = "".join(
+        f'<article data-ft=\'{{"top_level_post_id":"{post_id}"}}\'>'
+        f"<header><h3><a href='/user{post_id}'>User {post_id}</a></h3></header>"
+        f'<div data-ft=\'{{"tn":"*s"}}\'>Post {post_id}</div>'
+        f"<a href='/groups/{GROUP_ID}/permalink/{post_id}/'>Full Story</a>"
+        f"</article>"
+        for post_id in post_ids
+    )
+    more = (
+        ""
+        if next_url is None
+        else f"<div id='m_more_item'><a href='{next_url}'>See More Posts</a></div>"
+    )
+
+    return f'<html><body><div id="root">{articles}{more}</div></body></html>'
+
+
+def record_feed(folder: Path, post_ids: List[int]) -> ReplayClient:
+    """
+    Record a group feed of posts, newest first
+
+    :param folder: Folder of the recording
+    :param post_ids: IDs of posts of the feed
+    :return: Client replaying the feed
+    """
+    pages = [
+        post_ids[start : start + POSTS_PER_PAGE]
+        for start in range(0, len(post_ids), POSTS_PER_PAGE)
+    ]
+    urls = [GROUP_URL] + [
+        f"{GROUP_URL}?cursor={index}" for index in range(1, len(pages))
+    ]
+
+    with PageRecorder(folder) as recorder:
+        for index, (url, page_ids) in enumerate(zip(urls, pages)):
+            next_url = urls[index + 1] if index + 1 < len(urls) else None
+            recorder.record(url, make_page(page_ids, next_url), url)
+
+    return ReplayClient(folder)
+
+
+@pytest.fixture(name="scraper")
+def fixture_scraper(monkeypatch, tmp_path) -> FacebookScraper:
+    # No browser: every page is fetched from a recording
+    monkeypatch.setattr(facebook_scraper, "create_driver", StubDriver)
+    monkeypatch.setattr(FacebookScraper, "restore_session", lambda self: True)
+
+    scraper = FacebookScraper("replay", "replay", "")
+    scraper.set_storage(str(tmp_path / "output"))
+    scraper.store = PostStore(tmp_path / "posts.db")
+    yield scraper
+
+    scraper.store.close()
+
+
+def count_fetches(scraper: FacebookScraper) -> List[str]:
+    """
+    Record URLs of pages fetched by a scraper
+
+    :param scraper: Scraper, fetching over HTTP
+    :return: List of fetched URLs, filled while scraping
+    """
+    fetched = []
+    get = scraper.http.get
+
+    def get_counted(url: str):
+        fetched.append(url)
+        return get(url)
+
+    scraper.http.get = get_counted
+
+    return fetched
+
+
+def read_checkpoint(scraper: FacebookScraper) -> dict:
+    """
+    Read checkpoint of the test group
+
+    :param scraper: Scraper
+    :return: Checkpoint
+    """
+    path = Path(scraper.output_folder) / f"group_{GROUP_ID}.checkpoint.json"
+
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def test_capped_new_posts_keep_completed_checkpoint(scraper, tmp_path):
+    # First run scrapes the whole feed
+    scraper.http = record_feed(tmp_path / "first", [6, 5, 4, 3, 2, 1])
+    posts = list(scraper.scrape_group(GROUP_ID, 100, ["all"]))
+    assert [post["id"] for post in posts] == ["6", "5", "4", "3", "2", "1"]
+    assert read_checkpoint(scraper)["done"]
+
+    # Two new posts, but this run is capped to one
+    scraper.http = record_feed(tmp_path / "second", [8, 7, 6, 5, 4, 3, 2, 1])
+    posts = list(scraper.scrape_group(GROUP_ID, 1, ["all"]))
+    assert [post["id"] for post in posts] == ["8"]
+
+    checkpoint = read_checkpoint(scraper)
+    assert checkpoint["done"]
+    assert checkpoint["cursor"] is None
+    assert checkpoint["skip"] == 0
+
+    # Next run finds the new post left without walking the feed again
+    fetched = count_fetches(scraper)
+    posts = list(scraper.scrape_group(GROUP_ID, 100, ["all"]))
+    assert [post["id"] for post in posts] == ["7"]
+    assert len(fetched) == 2
+
+
+def test_fetch_and_parse_saved_pages(scraper):
+    with ReplayServer(MBASIC_GROUP) as server:
+        scraper.base_url = server.base_url
+        scraper.http = HttpClient([])
+
+        html, page_url = scraper.fetch_page(f"{server.base_url}/groups/123", "group")
+        posts, next_url = parse_page(html, page_url, "group_123")
+
+        assert page_url == f"{server.base_url}/groups/123"
+        assert next_url == (
+            f"{server.base_url}/groups/123?bacr=1700000000&multi_permalinks&refid=18"
+        )
+        assert [post["id"] for post in posts] == ["1001", "1002", "1003"]
+        assert [post["media"] for post in posts] == ["photo", "text", "link"]
+
+        photo, text, link = posts
+        assert photo["source"] == "group_123"
+        assert photo["author"] == "Alice Nguyen"
+        assert photo["time"] == "2 hrs"
+        assert photo["text"] == "Sunset at the beach today"
+        assert photo["url"] == f"{server.base_url}/groups/123/permalink/1001/?refid=18"
+        assert photo["images"] == ["https://scontent.example.net/v/5001.jpg"]
+        # A post quoting a block message is not a block
+        assert "temporarily blocked" in text["text"]
+        assert text["url"].startswith(f"{server.base_url}/story.php?story_fbid=1002")
+        assert link["links"] == [
+            "https://lm.facebook.com/l.php?u=https%3A%2F%2Fexample.org%2Fcaching&h=AT0"
+        ]
+
+        html, page_url = scraper.fetch_page(next_url, "group")
+        posts, next_url = parse_page(html, page_url, "group_123")
+
+        assert next_url is None
+        assert [post["id"] for post in posts] == ["1004", "1005"]
+        assert posts[0]["media"] == "video"
+        assert posts[0]["videos"] == ["https://video.example.net/v/7001.mp4"]
+        assert posts[1]["media"] == "text"
+
+        # And the whole feed through the scraper
+        posts = list(scraper.scrape_group("123", 100, ["all"]))
+        assert [post["id"] for post in posts] == [
+            "1001",
+            "1002",
+            "1003",
+            "1004",
+            "1005",
+        ]
+
+
+@pytest.mark.parametrize("profile", ["default", "lean"])
+def test_single_worker_driver_profile(scraper, monkeypatch, profile):
+    scraper.driver_profile = profile
+    used_drivers = []
+
+    # Pages are opened in the browser, by the driver of the scraper copy
+    client = ReplayClient(MBASIC_GROUP)
+
+    def fetch_page_in_browser(self, url: str):
+        used_drivers.append(self.web_driver)
+        return client.get(url)
+
+    monkeypatch.setattr(FacebookScraper, "fetch_page_in_browser", fetch_page_in_browser)
+
+    results = scraper.scrape_targets([("group", "123")], 100, ["all"], workers=1)
+    assert results == {("group", "123"): 5}
+
+    if profile == "default":
+        # The main driver scrapes with its own profile
+        assert all(driver is scraper.web_driver for driver in used_drivers)
+    else:
+        # Never the main driver, which always uses the default profile
+        assert used_drivers
+        for driver in used_drivers:
+            assert driver is not scraper.web_driver
+            assert driver.profile == profile
+            assert driver.headless
@@ -0,0 +1,76 @@
+"""
+Tests of resumable conversion of folders of images.
+
+Run from the root of the repository with: python -m pytest tests
+"""
+
+from pathlib import Path
+
+from PIL import Image
+
+from personal_tools.file_tools.conversion.convert_image import FolderConverter
+
+# Colour of each source image, to tell which source an output comes from
+COLORS = {
+    "a.bmp": (255, 0, 0),
+    "a.tiff": (0, 255, 0),
+    "b.bmp": (0, 0, 255),
+}
+
+
+def save_source(input_dir: Path, name: str):
+    """
+    Save a source image of a single colour
+
+    :param input_dir: Folder of source images
+    :param name: File name of image, a key of COLORS
+    """
+    Image.new("RGB", (8, 8), COLORS[name]).save(input_dir / name)
+
+
+def read_outputs(output_dir: Path) -> dict:
+    """
+    Read colour of each converted image
+
+    :param output_dir: Folder of converted images
+    :return: Dictionary of file name: colour
+    """
+    outputs = {}
+    for path in output_dir.glob("*.png"):
+        with Image.open(path) as image:
+            outputs[path.name] = image.convert("RGB").getpixel((0, 0))
+
+    return outputs
+
+
+def test_same_stem_targets(tmp_path):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+    for name in COLORS:
+        save_source(input_dir, name)
+
+    FolderConverter("png", workers=1).convert(input_dir, output_dir)
+
+    assert read_outputs(output_dir) == {
+        "a_bmp.png": COLORS["a.bmp"],
+        "a_tiff.png": COLORS["a.tiff"],
+        "b.png": COLORS["b.bmp"],
+    }
+
+
+def test_same_stem_targets_resumed(tmp_path):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+
+    # First run only has one of the sources with the same stem
+    save_source(input_dir, "a.tiff")
+    FolderConverter("png", workers=1).convert(input_dir, output_dir)
+    assert read_outputs(output_dir) == {"a.png": COLORS["a.tiff"]}
+
+    # A source sorted before it is added, then the folder is converted again
+    save_source(input_dir, "a.bmp")
+    FolderConverter("png", workers=1).convert(input_dir, output_dir)
+
+    outputs = read_outputs(output_dir)
+    assert outputs["a_bmp.png"] == COLORS["a.bmp"]
+    assert outputs["a_tiff.png"] == COLORS["a.tiff"]
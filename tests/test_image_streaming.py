@@ -0,0 +1,191 @@
+"""
+Round-trip tests of region by region image conversion against Pillow.
+
+Run from the root of the repository with: python -m pytest tests
+"""
+
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from personal_tools.file_tools.conversion import image_streaming
+from personal_tools.file_tools.conversion.convert_image import (
+    ImageConverter,
+    open_image,
+)
+from personal_tools.file_tools.conversion.image_streaming import (
+    RegionReader,
+    reduce_by_region,
+    write_png_by_region,
+    write_tiff_by_region,
+)
+
+# Memory budget small enough to split test images into many bands
+SMALL_BUDGET = 4096
+
+
+def make_image(mode: str = "RGB", size=(97, 61)) -> Image.Image:
+    """
+    Make an image of random pixels, so any misplaced byte changes it
+
+    :param mode: Mode of image
+    :param size: Size of image
+    :return: Image
+    """
+    rgb = Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+    if mode == "P":
+        return rgb.quantize(colors=64)
+
+    return rgb.convert(mode)
+
+
+def save_image(image: Image.Image, img_format: str, **params) -> BytesIO:
+    """
+    Save an image in memory
+
+    :param image: Image to save
+    :param img_format: Format of file
+    :param params: Parameters of encoder
+    :return: File object of saved image, at its start
+    """
+    file = BytesIO()
+    image.save(file, img_format, **params)
+    file.seek(0)
+
+    return file
+
+
+@pytest.mark.parametrize(
+    "mode, img_format",
+    [
+        ("RGB", "TIFF"),
+        ("L", "TIFF"),
+        ("RGB", "BMP"),  # Rows stored bottom-up
+        ("P", "BMP"),
+        ("RGB", "PPM"),
+        ("RGB", "TGA"),
+    ],
+)
+def test_read_rows(mode, img_format):
+    image = make_image(mode)
+    expected = image.convert("RGB")
+
+    with Image.open(save_image(image, img_format)) as opened:
+        reader = RegionReader(opened)
+
+        for top, band in reader.iter_bands(7):
+            box = (0, top, image.width, top + band.height)
+            assert band.tobytes() == expected.crop(box).tobytes()
+
+
+def test_compressed_image_not_supported():
+    with Image.open(save_image(make_image(), "PNG")) as opened:
+        assert not RegionReader.is_supported(opened)
+
+
+@pytest.mark.parametrize("is_big", [False, True])
+def test_write_tiff_round_trip(monkeypatch, is_big):
+    image = make_image()
+    if is_big:
+        monkeypatch.setattr(image_streaming, "BIGTIFF_THRESHOLD", 0)
+    # Several strips per band, and several bands
+    monkeypatch.setattr(image_streaming, "TIFF_STRIP_SIZE", image.width * 3 * 2)
+
+    output = BytesIO()
+    with Image.open(save_image(image, "TIFF")) as opened:
+        write_tiff_by_region(RegionReader(opened), output, SMALL_BUDGET)
+
+    # Version 43 for BigTIFF, 42 for classic TIFF
+    assert output.getvalue()[2:4] == (b"+\0" if is_big else b"*\0")
+
+    output.seek(0)
+    with Image.open(output) as written:
+        assert written.format == "TIFF"
+        assert written.tag_v2[259] == 8  # Deflate
+        assert written.tag_v2[317] == 2  # Horizontal differencing
+        assert written.mode == "RGB"
+        assert written.tobytes() == image.tobytes()
+
+
+def test_write_png_round_trip(monkeypatch):
+    image = make_image()
+    # Several IDAT chunks
+    monkeypatch.setattr(image_streaming, "PNG_CHUNK_SIZE", 1024)
+
+    output = BytesIO()
+    with Image.open(save_image(image, "BMP")) as opened:
+        write_png_by_region(RegionReader(opened), output, SMALL_BUDGET)
+
+    assert output.getvalue().count(b"IDAT") > 1
+
+    output.seek(0)
+    with Image.open(output) as written:
+        assert written.format == "PNG"
+        assert written.mode == "RGB"
+        written.verify()
+
+    output.seek(0)
+    with Image.open(output) as written:
+        assert written.tobytes() == image.tobytes()
+
+
+@pytest.mark.parametrize("factor", [2, 3])
+def test_reduce_round_trip(factor):
+    image = make_image()
+
+    with Image.open(save_image(image, "TIFF")) as opened:
+        reduced = reduce_by_region(RegionReader(opened), factor, SMALL_BUDGET)
+
+    width, height = image.width // factor * factor, image.height // factor * factor
+    expected = image.crop((0, 0, width, height)).reduce(factor)
+    assert reduced.tobytes() == expected.tobytes()
+
+
+def test_open_image_over_limit(monkeypatch):
+    image = make_image()
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", image.width * image.height // 4)
+
+    # Uncompressed images are opened to be converted region by region
+    with open_image(save_image(image, "TIFF")) as opened:
+        assert RegionReader.is_supported(opened)
+
+        # But not decoded as a whole
+        with pytest.raises(Image.DecompressionBombError):
+            ImageConverter().convert(opened, "jpeg")
+
+    # Compressed images cannot be converted
+    with pytest.raises(Image.DecompressionBombError):
+        open_image(save_image(image, "PNG"))
+
+    # Pillow's limit is left unchanged
+    assert Image.MAX_IMAGE_PIXELS == image.width * image.height // 4
+
+
+@pytest.mark.parametrize("img_format", ["png", "tiff"])
+def test_convert_over_budget_by_region(monkeypatch, img_format):
+    image = make_image()
+    converter = ImageConverter()
+    monkeypatch.setattr(converter, "memory_budget", SMALL_BUDGET)
+
+    with open_image(save_image(image, "TIFF")) as opened:
+        data = converter.convert(opened, img_format)
+
+    with Image.open(BytesIO(data)) as written:
+        assert written.tobytes() == image.tobytes()
+
+
+def test_convert_over_budget_rejected(monkeypatch):
+    converter = ImageConverter()
+    monkeypatch.setattr(converter, "memory_budget", SMALL_BUDGET)
+
+    # Compressed images larger than the budget are not decoded
+    with open_image(save_image(make_image(), "PNG")) as opened:
+        with pytest.raises(Image.DecompressionBombError):
+            converter.convert(opened, "tiff")
+
+    # Nor uncompressed images written to formats without region support
+    with open_image(save_image(make_image(), "TIFF")) as opened:
+        with pytest.raises(Image.DecompressionBombError):
+            converter.convert(opened, "jpeg")
@@ -0,0 +1,131 @@
+"""
+Check that concurrent browser sessions of the web app never share their state.
+
+Needs the requirements of the web app. Run from the root of the repository with:
+python -m pytest tests
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+from personal_tools.file_tools.conversion.convert_image import ImageConverter
+from web.utils.jobs import JobQueue
+from web.utils.store import ResultStore
+
+IMAGE_PAGE = Path(__file__).parents[1] / "web" / "pages" / "🖼️_Image_Converter.py"
+
+# Format selected by each concurrent session
+SESSION_FORMATS = ["BMP", "GIF", "JPG", "PNG", "PPM", "TIFF", "WEBP", "ICO"]
+
+# Number of reruns of each session, like a user changing widgets
+RERUNS = 3
+
+# Number of conversions submitted by each session to the shared job queue
+JOBS_PER_SESSION = 4
+
+# Lowest number of jobs per second of all sessions, and highest time in seconds
+# from submitting a job to its result. Small images take milliseconds each,
+# so these only fail when jobs wait on each other, like a lock held too long.
+MIN_JOBS_PER_SECOND = 20
+MAX_JOB_LATENCY = 2.0
+
+
+def test_concurrent_sessions_isolated():
+    # AppTest runs scripts against a global runtime, so sessions cannot run
+    # in parallel threads. Their reruns are interleaved in one server process
+    # instead, which shares module globals and cached resources the same way.
+    apps = [
+        AppTest.from_file(str(IMAGE_PAGE), default_timeout=60) for _ in SESSION_FORMATS
+    ]
+    for app in apps:
+        app.run()
+    for app, raw_format in zip(apps, SESSION_FORMATS):
+        app.sidebar.selectbox[0].select(raw_format).run()
+    for _ in range(RERUNS):
+        for app in apps:
+            app.run()
+
+    for app in apps:
+        assert not app.exception
+
+    renderers = [app.session_state["image_renderer"] for app in apps]
+
+    # Every session has its own renderer
+    assert len({id(renderer) for renderer in renderers}) == len(renderers)
+    assert len({renderer.temp_dir for renderer in renderers}) == len(renderers)
+
+    # Config of other sessions never leaks into this one
+    for raw_format, renderer in zip(SESSION_FORMATS, renderers):
+        assert renderer.config["raw_format"] == raw_format
+
+    # Cache of a session is not seen by others
+    renderers[0].cache["converted_images"] = [("a.png", Path("a.png"))]
+    for renderer in renderers[1:]:
+        assert "converted_images" not in renderer.cache
+
+
+def test_concurrent_jobs_isolated(tmp_path):
+    # Sessions share the job queue and result store, but jobs never share
+    # their converter, like jobs of the image page
+    queue = JobQueue(max_workers=4)
+    store = ResultStore(tmp_path, max_size=64 * 1024 * 1024)
+    start = threading.Barrier(len(SESSION_FORMATS))
+    latencies = []
+
+    def run_session(index: int) -> list:
+        jobs = []
+
+        start.wait()
+        for job_index in range(JOBS_PER_SESSION):
+            pixels = os.urandom(32 * 24 * 3)
+            image = Image.frombytes("RGB", (32, 24), pixels)
+            key = store.make_key(f"session {index}", f"job {job_index}")
+
+            def convert(job, converter, image=image, key=key):
+                job.set_progress(0.5)
+                return store.get_or_create(
+                    key, partial(converter.write, image, "png"), ".png"
+                )
+
+            submitted = time.perf_counter()
+            job = queue.submit(f"session {index}", convert, ImageConverter())
+            jobs.append((pixels, job, submitted))
+
+        # Wait like the page polls its job
+        results = []
+        for pixels, job, submitted in jobs:
+            while not job.is_finished():
+                time.sleep(0.01)
+            assert job.status == "done", job.error
+
+            latencies.append(time.perf_counter() - submitted)
+            results.append((pixels, job.result))
+        return results
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(SESSION_FORMATS)) as executor:
+        sessions = list(executor.map(run_session, range(len(SESSION_FORMATS))))
+    elapsed = time.perf_counter() - start_time
+
+    job_count = len(SESSION_FORMATS) * JOBS_PER_SESSION
+    jobs_per_second = job_count / elapsed
+    print(
+        f"{job_count} jobs of {len(SESSION_FORMATS)} sessions in {elapsed:.2f}s: "
+        f"{jobs_per_second:.1f} jobs/s, latency max {max(latencies):.3f}s"
+    )
+    assert jobs_per_second >= MIN_JOBS_PER_SECOND
+    assert max(latencies) <= MAX_JOB_LATENCY
+
+    # Every job result holds the image of the session which submitted it
+    for results in sessions:
+        for pixels, path in results:
+            with Image.open(BytesIO(path.read_bytes())) as written:
+                assert written.tobytes() == pixels
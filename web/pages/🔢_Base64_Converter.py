@@ -6,28 +6,50 @@ Page for demo Base64 Converter
 # Note: Streamlit page names is created from filename
 
 from binascii import Error as BinasciiError
+from functools import partial
 from pathlib import Path
 
-import streamlit as st
-
 from personal_tools.file_tools.conversion.convert_base64 import Base64Converter
+from web.utils.files import get_unique_name, write_zip
+from web.utils.page import Page
+from web.utils.session import get_session_object
+from web.utils.store import get_result_store
+
+# Number of base64 characters shown in the preview
+PREVIEW_SIZE = 100_000
 
-from ..utils.page import Page
 
-st.set_page_config(
-    page_title="Base64 Converter",
-    page_icon="🔢",
-    layout="wide",
-)
+def render_download_button(placeholder, path: Path, file_name: str, key: str):
+    """
+    Render download button of a file on disk
 
-tool = Base64Converter()
-page = Page()
+    :param placeholder: Placeholder for download button
+    :param path: Path of file
+    :param file_name: Name of file for downloading
+    :param key: Key of button
+    """
+    with open(path, "rb") as file:
+        placeholder.download_button(
+            label=f"Download {file_name}",
+            data=file,
+            file_name=file_name,
+            key=key,
+        )
 
 
 def app():
     """
     Create app for demo Base64 Converter
     """
+    page = Page(
+        page_config=dict(
+            page_title="Base64 Converter",
+            page_icon="🔢",
+            layout="wide",
+        )
+    )
+    tool = get_session_object("base64_converter", Base64Converter)
+
     page.render_header(
         title="Base64 Converter", caption="Convert files to Base64 and vice versa"
     )
@@ -62,51 +84,76 @@ def app():
             button_1 = col_1.button("Encode")
             button_2 = col_2.button("Decode")
 
-            if button_1:
-                # Encode file
-                base64_data = tool.encode(raw_data)
-
-                # Create new filename for saving
-                new_filename = Path(file.name).stem + "_base64.txt"
-
-                # Show base64 text
-                page.main.text_area(
-                    label=new_filename, height=200, value=base64_data.decode("utf-8")
-                )
-
-                # Create download button
-                page.main.download_button(
-                    label="Download",
-                    data=base64_data,
-                    file_name=new_filename,
-                    mime="text/plain",
-                    key="base64_download_button",
-                )
-
-            elif button_2:
-                base64_data = file.getvalue()
-
-                try:
-                    # Only decode if data is valid
-                    raw_data = tool.decode(base64_data)
-                except BinasciiError:
-                    page.main.error("File is not valid for Base64 decoding")
-                    return
-
-                # Create new filename for saving
-                new_filename = Path(file.name).stem.strip("_base64")
-
-                # Add file extension to filename
-                if decode_type in decode_options and decode_type != "Raw":
-                    new_filename = new_filename + "." + decode_type.lower()
-
-                # Create download button
-                page.main.download_button(
-                    label="Download",
-                    data=raw_data,
-                    file_name=new_filename,
-                    key="raw_download_button",
-                )
+            if button_1 or button_2:
+                # Results are kept in the result store shared by all processes
+                store = get_result_store()
+                results = []
+                result_names = set()
+
+                for file in uploaded_files:
+                    if button_1:
+                        stem, extension = Path(file.name).stem + "_base64", "txt"
+                    else:
+                        stem = Path(file.name).stem.removesuffix("_base64")
+
+                        # Add file extension to filename
+                        extension = "" if decode_type == "Raw" else decode_type.lower()
+
+                    key = store.make_key(
+                        store.hash_file(file), "encode" if button_1 else "decode"
+                    )
+
+                    try:
+                        # Convert chunk by chunk, to never hold whole files
+                        if button_1:
+                            result_path = store.get_or_create(
+                                key, partial(tool.encode_file, file), ".txt"
+                            )
+                        else:
+                            result_path = store.get_or_create(
+                                key, partial(tool.decode_file, file)
+                            )
+                    except BinasciiError:
+                        page.main.error(f"File is not valid for Base64: {file.name}")
+                        continue
+
+                    new_filename = get_unique_name(result_names, stem, extension)
+                    results.append((new_filename, result_path))
+
+                # Show base64 text of a single file
+                if button_1 and len(results) == 1:
+                    new_filename, result_path = results[0]
+                    with open(result_path, "rb") as result_file:
+                        preview = result_file.read(PREVIEW_SIZE)
+
+                    page.main.text_area(
+                        label=new_filename,
+                        height=200,
+                        value=preview.decode("utf-8"),
+                    )
+                    if result_path.stat().st_size > PREVIEW_SIZE:
+                        page.main.caption("Text is truncated, download the file")
+
+                # Create download buttons
+                if group_all and len(results) > 1:
+                    key = store.make_key(
+                        "base64_files.zip",
+                        *(f"{name}:{path.name}" for name, path in results),
+                    )
+                    zip_path = store.get_or_create(
+                        key, partial(write_zip, files=results), ".zip"
+                    )
+                    render_download_button(
+                        page.main, zip_path, "base64_files.zip", "zip_download_button"
+                    )
+                else:
+                    for index, (new_filename, result_path) in enumerate(results):
+                        render_download_button(
+                            page.main,
+                            result_path,
+                            new_filename,
+                            f"download_button_{index}",
+                        )
 
 
 if __name__ == "__main__":
@@ -4,16 +4,23 @@ Page for demo Image Converter
 
 # pylint: disable=invalid-name,non-ascii-file-name
 # Note: Streamlit page names is created from filename
-import shutil
+from functools import partial
 from pathlib import Path
 
 import PIL
 import streamlit as st
 from PIL import Image
 
-from personal_tools.file_tools.conversion.convert_image import ImageConverter
-
-from ..utils.render import BaseRenderer
+from personal_tools.file_tools.conversion.convert_image import (
+    ImageConverter,
+    OutputOptions,
+    open_image,
+)
+from web.utils.files import get_unique_name, spool_upload, write_zip
+from web.utils.jobs import Job, get_job_queue, poll
+from web.utils.render import BaseRenderer, DownloadPayload
+from web.utils.session import get_session_id, get_session_object
+from web.utils.store import ResultStore, get_result_store
 
 st.set_page_config(
     page_title="Image Converter",
@@ -21,8 +28,6 @@ st.set_page_config(
     layout="wide",
 )
 
-tool = ImageConverter()
-
 
 class ImageRenderer(BaseRenderer):
     """
@@ -58,14 +63,6 @@ class ImageRenderer(BaseRenderer):
     }
     supported_formats = sorted(supported_formats + extensions_additional)
 
-    def __init__(self, main_func: callable):
-        """
-        Initialize ImageRenderer class
-        """
-        super().__init__()
-
-        self.main_func = main_func
-
     def render_config(self, placeholder):
         """
         Render the config section of page
@@ -88,6 +85,46 @@ class ImageRenderer(BaseRenderer):
             self.config["format"] = self.config["raw_format"]
         self.config["format"] = self.config["format"].lower()
 
+        # Add size and quality options
+        options_expander = placeholder.expander("Output options", expanded=False)
+        max_width = options_expander.number_input(
+            "Max width", min_value=0, value=0, help="0 means no limit"
+        )
+        max_height = options_expander.number_input(
+            "Max height", min_value=0, value=0, help="0 means no limit"
+        )
+        quality = None
+        max_size_kb = 0
+        if self.config["format"] in ImageConverter.quality_formats:
+            # Default to Pillow's default quality of each format
+            quality = options_expander.slider(
+                "Quality",
+                min_value=1,
+                max_value=100,
+                value=75 if self.config["format"] == "jpeg" else 80,
+            )
+            max_size_kb = options_expander.number_input(
+                "Max size (KB)",
+                min_value=0,
+                value=0,
+                help="Lower the quality until each image fits. 0 means no limit",
+            )
+        optimize = options_expander.checkbox(
+            "Optimize", value=False, help="Spend more time to compress better"
+        )
+        progressive = False
+        if self.config["format"] == "jpeg":
+            progressive = options_expander.checkbox("Progressive", value=False)
+
+        self.config["options"] = OutputOptions(
+            max_width=max_width,
+            max_height=max_height,
+            quality=quality,
+            optimize=optimize,
+            progressive=progressive,
+            max_size_kb=max_size_kb,
+        )
+
         # Add visualization
         self.config["vis"] = placeholder.checkbox("Visualize image", value=False)
         self.config["vis_columns"] = 3
@@ -106,45 +143,180 @@ class ImageRenderer(BaseRenderer):
             "Upload image", accept_multiple_files=True
         )
 
+        # Drop results of previous files, since the cache lives across reruns
+        file_ids = [file.file_id for file in self.cache["files"] or []]
+        if file_ids != self.cache.get("file_ids"):
+            self.cache["file_ids"] = file_ids
+            self.clear_results()
+
         return self.cache["files"]
 
+    def clear_results(self):
+        """
+        Cancel the conversion job and remove its results from cache.
+        Files of results stay in the result store for other sessions.
+        """
+        if self.cache.get("job_id"):
+            get_job_queue().remove(self.cache.pop("job_id"))
+
+        self.cache.pop("warnings", None)
+        self.cache.pop("converted_images", None)
+        self.cache.pop("output", None)
+
     def render_processing(self, placeholder):
         """
-        Render the processing section of page
+        Render the processing section of page.
+        Images are converted in a background job, so the page stays responsive
+        and the conversion continues when the user leaves the page.
 
         :param placeholder: Placeholder for processing section
         """
         files = self.cache.get("files")
 
         if files:
-            converted_images = []
-
             convert_button = placeholder.button("Convert")
 
-            # Convert images
             if convert_button:
-                progress_bar = placeholder.progress(0, text="Converting images...")
-                for i, file in enumerate(files):
-                    converted_image = None
+                # Cancel the previous conversion, its results would be replaced
+                self.clear_results()
+
+                # Copy files to disk now, uploaded files belong to this script run
+                # and the job should not keep another copy of them in memory
+                uploads = [
+                    (file.name, spool_upload(file, self.temp_dir / "uploads"))
+                    for file in files
+                ]
+
+                # Each job has its own converter, since a cancelled job may still
+                # be running when the next one starts
+                job = get_job_queue().submit(
+                    get_session_id(),
+                    self.convert_files,
+                    ImageConverter(),
+                    uploads,
+                    self.config["format"],
+                    self.config["raw_format"].lower(),
+                    self.config["options"],
+                    get_result_store(),
+                )
+                self.cache["job_id"] = job.id
+
+                # Rerun now so the page drops the output of the previous conversion
+                st.rerun()
+
+            if self.cache.get("job_id"):
+                with placeholder:
+                    poll(self.render_job)
+
+            for warning in self.cache.get("warnings", []):
+                placeholder.warning(warning)
+
+    @staticmethod
+    def convert_files(
+        job: Job,
+        converter: ImageConverter,
+        uploads: list,
+        img_format: str,
+        extension: str,
+        options: OutputOptions,
+        store: ResultStore,
+    ) -> tuple:
+        """
+        Convert images. Runs in a background job.
+        Converted images are written to the result store shared by all processes,
+        so an image already converted with the same options is not converted again.
+
+        :param job: Job running the conversion, to report progress
+        :param converter: Converter used only by this job
+        :param uploads: List of (file name, temporary file of uploaded image)
+        :param img_format: Format to convert to
+        :param extension: File extension of converted images
+        :param options: Options for size and quality of converted images
+        :param store: Result store to write converted images to
+        :return: Tuple of converted images as (file name, path), None if failed,
+            and warnings
+        """
+        converted_images = []
+        converted_names = set()
+        warnings = []
+
+        try:
+            for i, (file_name, upload) in enumerate(uploads):
+                job.set_progress(i / len(uploads), f"Converting {file_name}...")
 
-                    try:
-                        image = Image.open(file)
+                converted_image = None
 
-                        converted_image = self.main_func(image, self.config["format"])
-                    except PIL.UnidentifiedImageError:
-                        placeholder.warning(f"Cannot read image: {file.name}")
+                try:
+                    upload_hash = store.hash_file(upload)
+                    image = open_image(upload)
 
-                    converted_images.append(converted_image)
+                    # Multi-frame images are converted to an archive of frames
+                    converted_extension = extension
+                    if ImageConverter.is_archive_output(image, img_format):
+                        converted_extension = "zip"
 
-                    progress_bar.progress(
-                        (i + 1) / len(files), f"Converting {file.name}..."
+                    key = store.make_key(
+                        upload_hash, img_format, converted_extension, repr(options)
+                    )
+                    converted_path = store.get_or_create(
+                        key,
+                        partial(converter.write, image, img_format, options=options),
+                        f".{converted_extension}",
                     )
 
-                progress_bar.empty()
+                    converted_name = get_unique_name(
+                        converted_names, Path(file_name).stem, converted_extension
+                    )
+                    converted_image = (converted_name, converted_path)
+                except PIL.UnidentifiedImageError:
+                    warnings.append(f"Cannot read image: {file_name}")
+                except Image.DecompressionBombError:
+                    warnings.append(f"Image is too large: {file_name}")
+                finally:
+                    # Free the temporary file as soon as it is converted
+                    upload.close()
+
+                converted_images.append(converted_image)
+        finally:
+            # Remove temporary files of images not converted, if cancelled
+            for _, upload in uploads:
+                upload.close()
+
+        return converted_images, warnings
+
+    def render_job(self) -> bool:
+        """
+        Render progress of the conversion job, and take its results once finished
 
-                # Add images to cache
-                if converted_images:
-                    self.cache["converted_images"] = converted_images
+        :return: True while the job is not finished
+        """
+        queue = get_job_queue()
+        job = queue.get(self.cache.get("job_id"))
+
+        if job is None or job.is_finished():
+            self.cache.pop("job_id", None)
+
+            if job is not None:
+                queue.remove(job.id)
+
+                if job.status == "done":
+                    (
+                        self.cache["converted_images"],
+                        self.cache["warnings"],
+                    ) = job.result
+                elif job.status == "failed":
+                    self.cache["warnings"] = [f"Conversion failed: {job.error}"]
+
+            return False
+
+        st.progress(job.progress, text=job.message or "Waiting for other jobs...")
+        if st.button("Cancel", key="cancel_job"):
+            queue.remove(job.id)
+            self.cache.pop("job_id", None)
+
+            return False
+
+        return True
 
     def render_output(self, placeholder):
         """
@@ -159,70 +331,68 @@ class ImageRenderer(BaseRenderer):
 
             columns = vis_expander.columns(self.config["vis_columns"])
 
-            for i, image in enumerate(self.cache["converted_images"]):
-                if not image:
+            for i, converted_image in enumerate(self.cache["converted_images"]):
+                if not converted_image or converted_image[1].suffix == ".zip":
                     continue
 
-                columns[i % self.config["vis_columns"]].image(image)
+                columns[i % self.config["vis_columns"]].image(str(converted_image[1]))
 
     def create_download_data(self):
-        converted_count = sum(
-            image is not None for image in self.cache["converted_images"]
-        )
-
-        if converted_count >= 1:
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-            self.temp_dir.mkdir(exist_ok=True)
-
-            # Create temporary directory for images
-            temp_image_dir = self.temp_dir / "images"
-            temp_image_dir.mkdir(exist_ok=True)
-
-            filenames = [Path(file.name).stem for file in self.cache["files"]]
-            file_format = self.config["raw_format"].lower()
-
-            # Save images to temporary directory
-            for index, image in enumerate(self.cache["converted_images"]):
-                if not image:
-                    continue
+        """
+        Set a ZIP file of converted images to download, once per conversion
+        """
+        if "output" in self.cache:
+            return
 
-                image_filepath = temp_image_dir / f"{filenames[index]}.{file_format}"
+        if any(self.cache["converted_images"]):
+            self.cache["output"] = DownloadPayload(self.create_archive)
+        else:
+            self.cache["output"] = None
 
-                write_index = 1
-                while image_filepath.exists():
-                    image_filename = f"{filenames[index]} ({write_index}).{file_format}"
-                    image_filepath = temp_image_dir / image_filename
-                    write_index += 1
+    def create_archive(self) -> Path:
+        """
+        Create a ZIP file of converted images in the result store
 
-                with open(image_filepath, "wb") as image_file:
-                    image_file.write(image)
+        :return: Path of ZIP file
+        """
+        store = get_result_store()
+        converted_images = []
 
-            # Create zip file
-            zip_path = self.temp_dir / "images.zip"
-            shutil.make_archive(str(zip_path).rstrip(".zip"), "zip", temp_image_dir)
+        for converted_image in self.cache["converted_images"]:
+            if not converted_image:
+                continue
 
-            with open(zip_path, "rb") as zip_file:
-                self.cache["output"] = zip_file.read()
+            # Converted images unused for long may have been removed from the store
+            converted_path = converted_image[1]
+            if store.get(converted_path.stem, converted_path.suffix) is None:
+                st.warning(f"Converted image expired: {converted_image[0]}")
+                continue
 
-            shutil.rmtree(self.temp_dir)
-        else:
-            self.cache["output"] = None
+            converted_images.append(converted_image)
 
+        key = store.make_key(
+            "images.zip",
+            *(f"{name}:{path.name}" for name, path in converted_images),
+        )
 
-renderer = ImageRenderer(main_func=tool.convert)
+        return store.get_or_create(
+            key, partial(write_zip, files=converted_images), ".zip"
+        )
 
 
 def app():
     """
     Create app for demo Image Converter
     """
+    renderer = get_session_object("image_renderer", ImageRenderer)
+
     sidebar = st.sidebar.container()
     header = st.container()
     main = st.container()
 
     section_input = main.container()
     section_middle = main.container()
-    section_output = main.container()
+    section_output = main.empty()
 
     renderer.render_header(
         header,
@@ -234,6 +404,11 @@ def app():
     renderer.render_config(sidebar)
     renderer.render_input(section_input)
 
+    # Remove the previous output from the page right away: it stays visible until
+    # replaced, and polling a job reruns the script before this section is reached
+    if not renderer.cache.get("converted_images"):
+        section_output.empty()
+
     # if not st.session_state.get("files") or \
     #         renderer.cache.get("files") != st.session_state.get("files"):
     #     st.session_state["files"] = renderer.cache.get("files")
@@ -243,9 +418,10 @@ def app():
 
     print(len(renderer.cache.get("converted_images", [])))
     if renderer.cache.get("converted_images"):
-        renderer.render_output(section_output)
+        output = section_output.container()
+        renderer.render_output(output)
         renderer.create_download_data()
-        renderer.render_download_button(section_output, "images.zip")
+        renderer.render_download_button(output, "images.zip")
 
 
 if __name__ == "__main__":
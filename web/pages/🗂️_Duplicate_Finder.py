@@ -0,0 +1,305 @@
+"""
+Page for demo Duplicate Finder
+"""
+
+# pylint: disable=invalid-name,non-ascii-file-name
+# Note: Streamlit page names is created from filename
+import math
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import PIL
+import streamlit as st
+from PIL import Image
+
+from personal_tools.file_tools.cleaning.check_duplicated import DuplicatingChecker
+from web.utils.files import get_scan_roots, is_in_roots
+from web.utils.jobs import Job, get_job_queue, poll
+from web.utils.render import BaseRenderer
+from web.utils.session import get_session_id, get_session_object
+
+st.set_page_config(
+    page_title="Duplicate Finder",
+    page_icon="🗂️",
+    layout="wide",
+)
+
+# Thumbnails are only created for the groups of the current page
+GROUPS_PER_PAGE = 10
+FILES_PER_ROW = 6
+THUMBNAIL_SIZE = 160
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def get_thumbnail(filepath: str, mtime: float) -> Optional[bytes]:
+    """
+    Create a JPEG thumbnail of an image file
+
+    :param filepath: Path to file
+    :param mtime: Modification time of file, to create it again once changed
+    :return: Thumbnail, or None if the file is not an image or not allowed
+    """
+    # Scanned folders may link to files outside of them
+    if not is_in_roots(filepath, get_scan_roots()):
+        return None
+
+    try:
+        with Image.open(filepath) as image:
+            # Decode a smaller version directly if the format supports it
+            image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image = image.convert("RGB")
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+
+            with BytesIO() as thumbnail:
+                image.save(thumbnail, "JPEG")
+
+                return thumbnail.getvalue()
+    except (PIL.UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return None
+
+
+class DuplicateRenderer(BaseRenderer):
+    """
+    Renderer for Duplicate Finder page
+    """
+
+    def render_config(self, placeholder):
+        """
+        Render the config section of page
+
+        :param placeholder: Placeholder for config section
+        """
+        placeholder.title("Config")
+
+        self.config["roots"] = get_scan_roots()
+        folders = placeholder.text_area(
+            "Folders",
+            help="One folder on the server per line, inside: "
+            f"{', '.join(str(root) for root in self.config['roots'])}. "
+            "Priority increases from top to bottom, "
+            "the file in the folder of highest priority is kept as original",
+        )
+        self.config["folders"] = [
+            folder.strip() for folder in folders.splitlines() if folder.strip()
+        ]
+        self.config["methods"] = placeholder.multiselect(
+            "Methods", ["checksum", "name"], default=["checksum"]
+        )
+
+    def render_processing(self, placeholder):
+        """
+        Render the processing section of page.
+        Folders are scanned in a background job, and duplicated files are shown
+        while the scan is running.
+
+        :param placeholder: Placeholder for processing section
+        """
+        if placeholder.button("Scan"):
+            invalid_folders = [
+                folder for folder in self.config["folders"] if not Path(folder).is_dir()
+            ]
+            forbidden_folders = [
+                folder
+                for folder in self.config["folders"]
+                if not is_in_roots(folder, self.config["roots"])
+            ]
+
+            if not self.config["folders"] or not self.config["methods"]:
+                placeholder.error("Enter folders and choose methods to scan")
+            elif forbidden_folders:
+                placeholder.error(
+                    f"Not inside allowed folders: {', '.join(forbidden_folders)}"
+                )
+            elif invalid_folders:
+                placeholder.error(f"Not a folder: {', '.join(invalid_folders)}")
+            else:
+                self.start_scan()
+
+        if self.cache.get("scan"):
+            with placeholder:
+                if self.cache.get("job_id"):
+                    poll(self.render_scan)
+                else:
+                    self.render_scan()
+
+    def start_scan(self):
+        """
+        Submit a job scanning the configured folders, replacing the previous scan
+        """
+        if self.cache.get("job_id"):
+            get_job_queue().remove(self.cache.pop("job_id"))
+
+        checker = DuplicatingChecker(methods=self.config["methods"])
+        self.cache["scan"] = {
+            "checker": checker,
+            "groups": {},
+            "start": time.time(),
+            "end": None,
+            "error": None,
+        }
+
+        job = get_job_queue().submit(
+            get_session_id(),
+            self.scan_folders,
+            checker,
+            self.config["folders"],
+            self.cache["scan"]["groups"],
+        )
+        self.cache["job_id"] = job.id
+
+    @staticmethod
+    def scan_folders(
+        job: Job, checker: DuplicatingChecker, folders: list, groups: dict
+    ):
+        """
+        Scan folders for duplicated files. Runs in a background job.
+
+        :param job: Job running the scan, to report progress
+        :param checker: Checker scanning the folders
+        :param folders: Folders to scan
+        :param groups: Dictionary filled with groups of duplicated files
+            as (method, key): files, while scanning
+        """
+
+        def report_progress():
+            job.set_progress(
+                checker.scanned_bytes / max(checker.total_bytes, 1),
+                f"Hashed {checker.scanned_files}/{checker.total_files} files",
+            )
+
+        for method, key, group in checker.iter_duplicates(folders, report_progress):
+            # Copy the group, the page reads it while the checker extends it
+            groups[(method, key)] = list(group)
+
+    def render_scan(self) -> bool:
+        """
+        Render status of the scan and duplicated files found so far
+
+        :return: True while the scan is not finished
+        """
+        scan = self.cache["scan"]
+        checker = scan["checker"]
+
+        queue = get_job_queue()
+        job = queue.get(self.cache.get("job_id"))
+        is_running = job is not None and not job.is_finished()
+
+        if not is_running and self.cache.get("job_id"):
+            self.cache.pop("job_id")
+            scan["end"] = time.time()
+
+            if job is not None:
+                queue.remove(job.id)
+                scan["end"] = job.finished_at
+
+                if job.status == "failed":
+                    scan["error"] = f"Scan failed: {job.error}"
+
+        if is_running:
+            st.progress(
+                checker.scanned_bytes / max(checker.total_bytes, 1),
+                text=job.message or "Listing files...",
+            )
+            if st.button("Cancel", key="cancel_job"):
+                queue.remove(job.id)
+                self.cache.pop("job_id")
+                scan["end"] = time.time()
+                is_running = False
+
+        elapsed = max((scan["end"] or time.time()) - scan["start"], 1e-6)
+        columns = st.columns(4)
+        columns[0].metric(
+            "Files hashed", f"{checker.scanned_files}/{checker.total_files}"
+        )
+        columns[1].metric("Files/s", f"{checker.scanned_files / elapsed:.1f}")
+        columns[2].metric(
+            "MB/s", f"{checker.scanned_bytes / elapsed / 1024 / 1024:.1f}"
+        )
+        columns[3].metric("Duplicate groups", len(scan["groups"]))
+
+        if scan["error"]:
+            st.error(scan["error"])
+
+        self.render_groups(scan["groups"], is_running)
+
+        return is_running
+
+    @staticmethod
+    def render_groups(groups: dict, is_running: bool):
+        """
+        Render one page of groups of duplicated files, with thumbnails of images
+
+        :param groups: Groups of duplicated files as (method, key): files
+        :param is_running: Whether the scan is still running
+        """
+        # Copy, since the scan job may add groups meanwhile
+        groups = list(groups.items())
+
+        if not groups:
+            st.info("Searching..." if is_running else "No duplicated files found")
+            return
+
+        page_count = math.ceil(len(groups) / GROUPS_PER_PAGE)
+        page = st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key="groups_page",
+        )
+        start = (page - 1) * GROUPS_PER_PAGE
+
+        for (method, key), files in groups[start : start + GROUPS_PER_PAGE]:
+            st.markdown(f"**Same {method}**: `{key}` ({len(files)} files)")
+
+            columns = st.columns(FILES_PER_ROW)
+            for index, filepath in enumerate(files[:FILES_PER_ROW]):
+                try:
+                    thumbnail = get_thumbnail(str(filepath), filepath.stat().st_mtime)
+                except OSError:
+                    thumbnail = None
+
+                if thumbnail:
+                    columns[index].image(thumbnail)
+                label = "Original" if index == 0 else "Duplicate"
+                columns[index].caption(f"{label}: {filepath}")
+
+            if len(files) > FILES_PER_ROW:
+                st.caption(f"And {len(files) - FILES_PER_ROW} more files")
+
+            st.divider()
+
+
+def app():
+    """
+    Create app for demo Duplicate Finder
+    """
+    renderer = get_session_object("duplicate_renderer", DuplicateRenderer)
+
+    sidebar = st.sidebar.container()
+    header = st.container()
+    main = st.container()
+
+    renderer.render_header(
+        header,
+        title="Duplicate Finder",
+        caption="Find duplicated files inside folders and across folders, "
+        "by checksum or by name.",
+    )
+
+    # Any visitor could read files of the server, so the server must allow it
+    if not get_scan_roots():
+        main.info(
+            "Scanning is disabled on this server. "
+            "Start the app with --scan-root FOLDER to allow scanning a folder."
+        )
+        return
+
+    renderer.render_config(sidebar)
+    renderer.render_processing(main)
+
+
+if __name__ == "__main__":
+    app()
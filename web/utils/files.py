@@ -0,0 +1,100 @@
+"""
+Helpers to keep uploaded files and results on disk instead of memory,
+and to read files of the server
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Set, Tuple, Union
+
+# Environment variable to configure folders of the server that pages may read,
+# separated by os.pathsep, set by the launcher
+SCAN_ROOTS_ENV = "TOOLBOX_SCAN_ROOTS"
+
+# Size of each read when copying files
+CHUNK_SIZE = 1024 * 1024
+
+
+def spool_upload(file: BinaryIO, directory: Path = None) -> BinaryIO:
+    """
+    Copy an uploaded file to a temporary file on disk, so jobs never hold a second
+    copy of uploads in memory, however many files a batch has.
+    The temporary file is deleted when it is closed.
+
+    :param file: Uploaded file
+    :param directory: Directory of temporary file. Default is the system one
+    :return: Temporary file, positioned at its beginning
+    """
+    if directory is not None:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    temp_file = tempfile.TemporaryFile(dir=directory)
+
+    file.seek(0)
+    shutil.copyfileobj(file, temp_file, CHUNK_SIZE)
+    temp_file.seek(0)
+
+    return temp_file
+
+
+def get_unique_name(names: Set[str], stem: str, extension: str) -> str:
+    """
+    Get a file name not in a set of names, adding a number to it if needed.
+    The new name is added to the set.
+
+    :param names: Names already used
+    :param stem: Name of file without extension
+    :param extension: Extension of file, without dot
+    :return: Unique name
+    """
+    name = f"{stem}.{extension}" if extension else stem
+
+    index = 1
+    while name in names:
+        name = f"{stem} ({index}).{extension}" if extension else f"{stem} ({index})"
+        index += 1
+
+    names.add(name)
+
+    return name
+
+
+def get_scan_roots() -> List[Path]:
+    """
+    Get folders of the server that pages may read files from.
+    There are none unless configured, since any visitor of the app could read them.
+
+    :return: Resolved paths of folders
+    """
+    roots = os.environ.get(SCAN_ROOTS_ENV) or ""
+
+    return [Path(root).resolve() for root in roots.split(os.pathsep) if root]
+
+
+def is_in_roots(path: Union[str, Path], roots: List[Path]) -> bool:
+    """
+    Check if a path is inside one of the given folders, once symbolic links
+    and ".." are resolved
+
+    :param path: Path to check
+    :param roots: Resolved paths of folders
+    :return: True if the path is inside a folder
+    """
+    path = Path(path).resolve()
+
+    return any(path.is_relative_to(root) for root in roots)
+
+
+def write_zip(zip_file: Union[Path, BinaryIO], files: Iterable[Tuple[str, Path]]):
+    """
+    Write files into a ZIP archive. Files are read from disk chunk by chunk.
+
+    :param zip_file: Path or file object of archive
+    :param files: Iterable of (name in archive, path of file)
+    """
+    with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, path in files:
+            archive.write(path, name)
@@ -0,0 +1,246 @@
+"""
+Background jobs shared by all sessions of the Streamlit app
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional
+
+import streamlit as st
+
+
+class JobCancelledError(Exception):
+    """
+    Raised inside a job when it has been cancelled
+    """
+
+
+class Job:
+    """
+    Job running a function in background.
+    The function receives the job as first argument to report its progress.
+    """
+
+    def __init__(self, owner: str, func: Callable, args: tuple, kwargs: dict):
+        """
+        Initialize Job class
+
+        :param owner: ID of the session which submitted the job
+        :param func: Function to run
+        :param args: Positional arguments of function, after the job
+        :param kwargs: Keyword arguments of function
+        """
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+        self._cancelled = threading.Event()
+
+    def set_progress(self, progress: float, message: str = ""):
+        """
+        Report progress of job. Called by the job function.
+
+        :param progress: Progress from 0 to 1
+        :param message: Message describing the current step
+        """
+        if self._cancelled.is_set():
+            raise JobCancelledError()
+
+        self.progress = progress
+        self.message = message
+
+    def cancel(self):
+        """
+        Ask job to stop at its next progress report
+        """
+        self._cancelled.set()
+
+    def is_finished(self) -> bool:
+        """
+        Check if job is finished
+
+        :return: True if job is done, failed or cancelled
+        """
+        return self.status in ["done", "failed", "cancelled"]
+
+    def run(self):
+        """
+        Run job function and store its result or error
+        """
+        try:
+            # Job may be cancelled while waiting in queue
+            if self._cancelled.is_set():
+                raise JobCancelledError()
+
+            self.status = "running"
+            self.result = self.func(self, *self.args, **self.kwargs)
+            self.status = "done"
+        except JobCancelledError:
+            self.status = "cancelled"
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            self.error = exception
+            self.status = "failed"
+            print(f"Job {self.id} failed")
+            print(traceback.format_exc())
+        finally:
+            self.finished_at = time.time()
+
+
+class JobQueue:
+    """
+    Queue of jobs run by a bounded pool of worker threads.
+
+    Pending jobs are grouped by owner and workers take them from owners in
+    round-robin order, so a session queuing many jobs does not starve others.
+    """
+
+    def __init__(self, max_workers: int = None, keep_seconds: int = 3600):
+        """
+        Initialize JobQueue class
+
+        :param max_workers: Number of jobs running at the same time.
+            By default, one core is left for interactive reruns.
+        :param keep_seconds: Time to keep finished jobs whose results are not fetched
+        """
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.keep_seconds = keep_seconds
+
+        self._condition = threading.Condition()
+        self._pending: Dict[str, Deque[Job]] = OrderedDict()
+        self._jobs: Dict[str, Job] = {}
+
+        for index in range(self.max_workers):
+            threading.Thread(
+                target=self._work, name=f"job-worker-{index}", daemon=True
+            ).start()
+
+    def submit(self, owner: str, func: Callable, *args, **kwargs) -> Job:
+        """
+        Submit a job
+
+        :param owner: ID of the session submitting the job
+        :param func: Function to run. It receives the job as first argument
+        :param args: Positional arguments of function
+        :param kwargs: Keyword arguments of function
+        :return: Submitted job
+        """
+        job = Job(owner, func, args, kwargs)
+
+        with self._condition:
+            self._remove_expired()
+            self._jobs[job.id] = job
+            self._pending.setdefault(owner, deque()).append(job)
+            self._condition.notify()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Get a job
+
+        :param job_id: ID of job
+        :return: Job, or None if it does not exist
+        """
+        return self._jobs.get(job_id)
+
+    def remove(self, job_id: str):
+        """
+        Remove a job, cancelling it if it is not finished
+
+        :param job_id: ID of job
+        """
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+
+        if job is not None:
+            job.cancel()
+
+    def _remove_expired(self):
+        """
+        Remove finished jobs that have not been fetched for too long
+        """
+        now = time.time()
+
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and now - job.finished_at > self.keep_seconds:
+                del self._jobs[job_id]
+
+    def _next_job(self) -> Job:
+        """
+        Take the next pending job, rotating between owners
+
+        :return: Next job
+        """
+        owner, jobs = self._pending.popitem(last=False)
+        job = jobs.popleft()
+
+        # Move the owner to the end of the rotation
+        if jobs:
+            self._pending[owner] = jobs
+
+        return job
+
+    def _work(self):
+        """
+        Run pending jobs forever
+        """
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                job = self._next_job()
+
+            job.run()
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """
+    Get job queue shared by all sessions
+
+    :return: Job queue
+    """
+    return JobQueue()
+
+
+def poll(render: Callable[[], bool], interval: float = 1.0):
+    """
+    Render the status of background work and refresh it until it is finished.
+
+    With st.fragment, only the status is rerun. Older Streamlit versions
+    rerun the whole script after the interval instead.
+
+    :param render: Function rendering the status with st.* calls.
+        It returns True while the work is not finished.
+    :param interval: Time between refreshes in seconds
+    """
+    fragment = getattr(st, "fragment", None) or getattr(
+        st, "experimental_fragment", None
+    )
+
+    if fragment is None:
+        if render():
+            time.sleep(interval)
+            st.rerun()
+        return
+
+    @fragment(run_every=interval)
+    def render_fragment():
+        # Rerun the whole script to show the results once finished
+        if not render():
+            st.rerun()
+
+    render_fragment()
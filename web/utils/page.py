@@ -24,3 +24,22 @@ class Page:
         self.section_input = self.main.container()
         self.section_middle = self.main.container()
         self.section_output = self.main.container()
+
+    def render_header(self, title: str, caption: str = None):
+        """
+        Render header
+
+        :param title: Title for header
+        :param caption: Caption for header
+        """
+        self.header.title(title)
+        if caption:
+            self.header.caption(caption)
+
+    def render_sidebar(self, title: str):
+        """
+        Render sidebar
+
+        :param title: Title for sidebar
+        """
+        self.sidebar.title(title)
@@ -2,9 +2,99 @@
 Render class
 """
 
+import shutil
+import tempfile
+import uuid
 from pathlib import Path
+from typing import Callable
 
 import magic
+import streamlit as st
+
+
+@st.cache_resource
+def get_mime_detector() -> magic.Magic:
+    """
+    Get MIME type detector shared by all sessions.
+    Loading the magic database is slow, so it is loaded once per server.
+
+    :return: MIME type detector
+    """
+    return magic.Magic(mime=True)
+
+
+class DownloadPayload:
+    """
+    File to download, created only when the user asks for it.
+
+    Its MIME type is detected once, and its content is loaded once and given
+    as the same object on every rerun, so Streamlit keeps serving the same file.
+    """
+
+    # Number of bytes read to detect MIME type
+    header_size = 2048
+
+    def __init__(self, create: Callable[[], Path]):
+        """
+        Initialize DownloadPayload class
+
+        :param create: Function creating the file to download if it does not
+            exist, and returning its path
+        """
+        self.create = create
+        self.path = None
+
+        self._mime = None
+        self._data = None
+
+    @property
+    def mime(self) -> str:
+        """
+        MIME type of file, detected from its beginning
+        """
+        if self._mime is None:
+            with open(self.get_path(), "rb") as file:
+                self._mime = get_mime_detector().from_buffer(
+                    file.read(self.header_size)
+                )
+
+        return self._mime
+
+    def is_loaded(self) -> bool:
+        """
+        Check if the content of file is loaded
+
+        :return: True if the content is loaded
+        """
+        return self._data is not None
+
+    def get_path(self) -> Path:
+        """
+        Get path of file, creating the file if it does not exist
+
+        :return: Path of file
+        """
+        if self.path is None or not self.path.exists():
+            self.path = self.create()
+
+        return self.path
+
+    def get_data(self) -> bytes:
+        """
+        Get content of file, creating the file on first use
+
+        :return: Content of file
+        """
+        if self._data is None:
+            self._data = self.get_path().read_bytes()
+
+        return self._data
+
+    def release(self):
+        """
+        Free the loaded content. The file is kept to load it again quickly.
+        """
+        self._data = None
 
 
 class BaseRenderer:
@@ -18,7 +108,17 @@ class BaseRenderer:
         """
         self.config = {}
         self.cache = {}
-        self.temp_dir = Path(__file__).parent.resolve() / "temp"
+        # Each renderer has its own temporary directory, so sessions never collide.
+        # Uploads and results are kept there instead of in memory.
+        self.temp_dir = (
+            Path(tempfile.gettempdir()) / "personal-toolbox" / uuid.uuid4().hex
+        )
+
+    def __del__(self):
+        """
+        Remove temporary files when the session of renderer ends
+        """
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
 
     @staticmethod
     def render_header(placeholder, title: str, caption: str = None):
@@ -35,7 +135,8 @@ class BaseRenderer:
 
     def create_download_data(self):
         """
-        Create file byte data to cache["output"] for downloading
+        Set cache["output"] to a DownloadPayload, or None if there is nothing
+        to download. Its file should only be created by the payload.
         """
         raise NotImplementedError("This method must be implemented")
 
@@ -46,17 +147,29 @@ class BaseRenderer:
         :param placeholder: Placeholder for download button
         :param file_name: Name of file for downloading
         """
-        download_data = self.cache.get("output")
+        payload = self.cache.get("output")
+
+        if payload:
+            if not isinstance(payload, DownloadPayload):
+                raise AttributeError('cache["output"] must be a DownloadPayload')
 
-        if download_data:
-            if not isinstance(download_data, bytes):
-                raise AttributeError('cache["output"] must be bytes')
+            # Create and load the file only when the user asks for it
+            if not payload.is_loaded():
+                if not placeholder.button("Prepare download", key="prepare_button"):
+                    return
+
+                with placeholder, st.spinner("Preparing download..."):
+                    payload.get_data()
 
             # Add download button
-            placeholder.download_button(
+            downloaded = placeholder.download_button(
                 label="Download",
-                data=download_data,
+                data=payload.get_data(),
                 file_name=file_name,
-                mime=magic.from_buffer(download_data, mime=True),
+                mime=payload.mime,
                 key="download_button",
             )
+
+            # Free memory once downloaded, Streamlit drops its copy on next rerun
+            if downloaded:
+                payload.release()
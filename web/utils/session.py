@@ -0,0 +1,34 @@
+"""
+Helpers to keep objects in the state of a browser session
+"""
+
+import uuid
+from typing import Callable, TypeVar
+
+import streamlit as st
+
+T = TypeVar("T")
+
+
+def get_session_object(key: str, factory: Callable[[], T]) -> T:
+    """
+    Get an object stored in the state of the current browser session,
+    creating it on first use. Objects are never shared between sessions.
+
+    :param key: Key of object in session state
+    :param factory: Function to create the object
+    :return: Object of the current session
+    """
+    if key not in st.session_state:
+        st.session_state[key] = factory()
+
+    return st.session_state[key]
+
+
+def get_session_id() -> str:
+    """
+    Get a random ID of the current browser session
+
+    :return: ID of the current session
+    """
+    return get_session_object("session_id", lambda: uuid.uuid4().hex)
@@ -0,0 +1,320 @@
+"""
+Result store on local disk, shared by all processes of the Streamlit app
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Union
+
+import streamlit as st
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Environment variables to configure the store, set by the launcher
+RESULT_DIR_ENV = "TOOLBOX_RESULT_DIR"
+RESULT_SIZE_ENV = "TOOLBOX_RESULT_SIZE_MB"
+
+DEFAULT_RESULT_DIR = Path(tempfile.gettempdir()) / "personal-toolbox-results"
+DEFAULT_RESULT_SIZE_MB = 2048
+
+# Size of each read when hashing files
+CHUNK_SIZE = 1024 * 1024
+
+# Part of the size limit a full store is reduced to, so it is not scanned again
+# on the next write
+EVICT_TARGET = 0.9
+
+
+class FileLock:
+    """
+    Exclusive lock between processes, held on a lock file
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize FileLock class
+
+        :param path: Path of lock file, created if it does not exist
+        """
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a+b")  # pylint: disable=consider-using-with
+
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+
+        return self
+
+    def __exit__(self, *args):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+        self.file.close()
+        self.file = None
+
+
+class ResultStore:
+    """
+    Content-addressed store of result files on local disk.
+
+    Results are named by a key derived from everything they depend on, so any
+    process computing the same result finds it. Files are written atomically
+    under a lock of their key, and the least recently used ones are removed
+    once the store is larger than its size limit.
+
+    The size of the store is tracked from the results written by this process,
+    and the store is only scanned when it looks too large, or after some writes
+    to account for the results of other processes.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_size: int,
+        keep_seconds: int = 600,
+        scan_every: int = 100,
+    ):
+        """
+        Initialize ResultStore class
+
+        :param root: Directory of store
+        :param max_size: Size limit of store in bytes
+        :param keep_seconds: Results used more recently than this are never removed,
+            since a page may still read them
+        :param scan_every: Number of results written by this process after which
+            the store is scanned again
+        """
+        self.root = Path(root)
+        self.max_size = max_size
+        self.keep_seconds = keep_seconds
+        self.scan_every = scan_every
+
+        # Size left by the last scan, and plus results written since by this process.
+        # None before any scan.
+        self.scan_size = None
+        self.size = None
+        self.writes_since_scan = 0
+        self._size_lock = threading.Lock()
+
+        (self.root / "locks").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Union[str, bytes]) -> str:
+        """
+        Make a key from all values a result depends on
+
+        :param parts: Values, like hashes of input files and options
+        :return: Key of result
+        """
+        key = hashlib.sha256()
+
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+
+            # Prefix the length, so parts cannot be shifted into each other
+            key.update(f"{len(part)}:".encode("utf-8"))
+            key.update(part)
+
+        return key.hexdigest()
+
+    @staticmethod
+    def hash_file(fp: BinaryIO) -> str:
+        """
+        Hash the content of a file object, chunk by chunk
+
+        :param fp: Seekable file object, moved back to its beginning afterwards
+        :return: SHA-256 of content
+        """
+        digest = hashlib.sha256()
+
+        fp.seek(0)
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+        fp.seek(0)
+
+        return digest.hexdigest()
+
+    def get_path(self, key: str, suffix: str = "") -> Path:
+        """
+        Get path of a result, whether it exists or not
+
+        :param key: Key of result
+        :param suffix: File extension of result, with dot
+        :return: Path of result
+        """
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str = "") -> Optional[Path]:
+        """
+        Get path of an existing result, marking it as recently used
+
+        :param key: Key of result
+        :param suffix: File extension of result, with dot
+        :return: Path of result, or None if it does not exist
+        """
+        path = self.get_path(key, suffix)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def get_lock_path(self, key: str) -> Path:
+        """
+        Get path of the lock file of a result
+
+        :param key: Key of result
+        :return: Path of lock file
+        """
+        return self.root / "locks" / f"{key}.lock"
+
+    def get_or_create(
+        self, key: str, create: Callable[[BinaryIO], None], suffix: str = ""
+    ) -> Path:
+        """
+        Get path of a result, creating it if it does not exist.
+        Processes creating the same result wait for each other, so it is only
+        created once. Creating other results does not wait.
+
+        :param key: Key of result
+        :param create: Function writing the result to a file object
+        :param suffix: File extension of result, with dot
+        :return: Path of result
+        """
+        path = self.get(key, suffix)
+        if path is not None:
+            return path
+
+        path = self.get_path(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+
+        with FileLock(self.get_lock_path(key)):
+            if self.get(key, suffix) is not None:
+                return path
+
+            # Write to a temporary file first, so nobody reads a partial result
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    create(file)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+        self.add_size(path.stat().st_size)
+
+        return path
+
+    def add_size(self, size: int):
+        """
+        Count a result written by this process, and evict results if the store
+        may be larger than its size limit
+
+        :param size: Size of result in bytes
+        """
+        with self._size_lock:
+            self.writes_since_scan += 1
+            if self.size is not None:
+                self.size += size
+
+                # If the last scan could not make the store fit, because all of
+                # its results were used recently, scanning again right away is useless
+                is_full = self.size > self.max_size >= self.scan_size
+                if not is_full and self.writes_since_scan < self.scan_every:
+                    return
+
+            self.writes_since_scan = 0
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the store fits its size limit
+        """
+        with FileLock(self.root / "locks" / "evict.lock"):
+            total_size = self.remove_old_results()
+
+        with self._size_lock:
+            self.scan_size = self.size = total_size
+
+    def remove_old_results(self) -> int:
+        """
+        Scan the store and, if it is larger than its size limit, remove the least
+        recently used results until it fits a part of it. Called under the eviction lock.
+
+        :return: Size of store afterwards in bytes
+        """
+        entries = []
+        total_size = 0
+
+        for directory in self.root.iterdir():
+            if directory.name == "locks" or not directory.is_dir():
+                continue
+
+            for entry in os.scandir(directory):
+                # Skip files being written
+                if entry.name.endswith(".tmp"):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return total_size
+
+        target_size = self.max_size * EVICT_TARGET
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total_size <= target_size or now - mtime < self.keep_seconds:
+                break
+
+            # Also remove its lock file. A process still holding the lock only
+            # makes another one create the same result again, atomically too.
+            key = Path(path).name.split(".")[0]
+            for file in [Path(path), self.get_lock_path(key)]:
+                try:
+                    os.unlink(file)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+
+        return total_size
+
+
+@st.cache_resource
+def get_result_store() -> ResultStore:
+    """
+    Get result store of this process. All processes using the same directory
+    share their results.
+
+    :return: Result store
+    """
+    root = os.environ.get(RESULT_DIR_ENV) or DEFAULT_RESULT_DIR
+    max_size_mb = int(os.environ.get(RESULT_SIZE_ENV) or DEFAULT_RESULT_SIZE_MB)
+
+    return ResultStore(Path(root), max_size_mb * 1024 * 1024)